@@ -102,100 +102,98 @@ def calculateGridPositionFromRangeBearing(easting, northing, distance, bearing):
     
     return [xfinal, yfinal]
 
-def calculateRangeBearingFromGeographicals(longitude1, latitude1,  longitude2,  latitude2 ) :
-        """ 
-        Returns s, the distance between two geographic points on the ellipsoid
-        and alpha1, alpha2, the forward and reverse azimuths between these points.
-        lats, longs and azimuths are in decimal degrees, distance in metres 
+def calculateRangeBearingFromGeographicalsArray(longitude1, latitude1, longitude2, latitude2, maxiterations=200) :
+        """
+        numpy version of calculateRangeBearingFromGeographicals, Vincenty's inverse formula for arrays of points, e.g. a whole navigation track in one call.
+        the inputs broadcast against each other.  The iteration runs over every point at once, and points drop out of it as they converge.
+        lats, longs and azimuths are in decimal degrees, distance in metres
 
-        Returns ( s, alpha1Tp2,  alpha21 ) as a tuple
+        Returns ( s, alpha1Tp2,  alpha21 ) as a tuple of arrays
         """
         f = 1.0 / 298.257223563		# WGS84
         a = 6378137.0 			# metres
-
-        if (abs( latitude2 - latitude1 ) < 1e-8) and ( abs( longitude2 - longitude1) < 1e-8 ) :
-                return 0.0, 0.0, 0.0
-
-        piD4   = math.atan( 1.0 )
-        two_pi = piD4 * 8.0
-
-        latitude1    = latitude1 * piD4 / 45.0
-        longitude1 = longitude1 * piD4 / 45.0		# unfortunately lambda is a key word!
-        latitude2    = latitude2 * piD4 / 45.0
-        longitude2 = longitude2 * piD4 / 45.0
-
         b = a * (1.0 - f)
-
-        TanU1 = (1-f) * math.tan( latitude1 )
-        TanU2 = (1-f) * math.tan( latitude2 )
-
-        U1 = math.atan(TanU1)
-        U2 = math.atan(TanU2)
-
-        lembda = longitude2 - longitude1
-        last_lembda = -4000000.0		# an impossibe value
-        omega = lembda
-
-        # Iterate the following equations, 
-        #  until there is no significant change in lembda 
-
-        while ( last_lembda < -3000000.0 or lembda != 0 and abs( (last_lembda - lembda)/lembda) > 1.0e-9 ) :
-
-                sqr_sin_sigma = pow( math.cos(U2) * math.sin(lembda), 2) + \
-                        pow( (math.cos(U1) * math.sin(U2) - \
-                        math.sin(U1) *  math.cos(U2) * math.cos(lembda) ), 2 )
-
-                Sin_sigma = math.sqrt( sqr_sin_sigma )
-
-                Cos_sigma = math.sin(U1) * math.sin(U2) + math.cos(U1) * math.cos(U2) * math.cos(lembda)
-        
-                sigma = math.atan2( Sin_sigma, Cos_sigma )
-
-                Sin_alpha = math.cos(U1) * math.cos(U2) * math.sin(lembda) / math.sin(sigma)
-                alpha = math.asin( Sin_alpha )
-
-                Cos2sigma_m = math.cos(sigma) - (2 * math.sin(U1) * math.sin(U2) / pow(math.cos(alpha), 2) )
-
-                C = (f/16) * pow(math.cos(alpha), 2) * (4 + f * (4 - 3 * pow(math.cos(alpha), 2)))
-
-                last_lembda = lembda
-
-                lembda = omega + (1-C) * f * math.sin(alpha) * (sigma + C * math.sin(sigma) * \
-                        (Cos2sigma_m + C * math.cos(sigma) * (-1 + 2 * pow(Cos2sigma_m, 2) )))
-
-        u2 = pow(math.cos(alpha),2) * (a*a-b*b) / (b*b)
-
+        two_pi = 2.0 * np.pi
+
+        # work on flat copies of the broadcast inputs, so scalars and arrays of any shape go through the same masked updates
+        longitude1, latitude1, longitude2, latitude2 = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in (longitude1, latitude1, longitude2, latitude2)])
+        shape = longitude1.shape
+        longitude1, latitude1, longitude2, latitude2 = [x.ravel() for x in (longitude1, latitude1, longitude2, latitude2)]
+        coincident = (np.abs(latitude2 - latitude1) < 1e-8) & (np.abs(longitude2 - longitude1) < 1e-8)
+
+        U1 = np.arctan((1-f) * np.tan(np.radians(latitude1)))
+        U2 = np.arctan((1-f) * np.tan(np.radians(latitude2)))
+        sinU1 = np.sin(U1)
+        cosU1 = np.cos(U1)
+        sinU2 = np.sin(U2)
+        cosU2 = np.cos(U2)
+
+        omega = np.radians(longitude2) - np.radians(longitude1)
+        lembda = omega.copy()
+        sqr_sin_sigma = np.zeros(omega.shape)
+        Sin_sigma = np.zeros(omega.shape)
+        Cos_sigma = np.ones(omega.shape)
+        sigma = np.zeros(omega.shape)
+        cos_sq_alpha = np.ones(omega.shape)
+        Cos2sigma_m = np.zeros(omega.shape)
+
+        # Iterate the following equations over the points which have not converged,
+        #  until there is no significant change in lembda
+        active = ~coincident
+        for iteration in range(maxiterations):
+                if not active.any():
+                        break
+                lem = lembda[active]
+                sin_lem = np.sin(lem)
+                cos_lem = np.cos(lem)
+                sq = (cosU2[active] * sin_lem) ** 2 + (cosU1[active] * sinU2[active] - sinU1[active] * cosU2[active] * cos_lem) ** 2
+                sin_sigma = np.sqrt(sq)
+                cos_sigma = sinU1[active] * sinU2[active] + cosU1[active] * cosU2[active] * cos_lem
+                sig = np.arctan2(sin_sigma, cos_sigma)
+                sin_alpha = cosU1[active] * cosU2[active] * sin_lem / sin_sigma
+                cos_sq = 1.0 - sin_alpha ** 2
+                # a line along the equator has cos_sq of zero, where cos2sigma_m is zero
+                cos2sigma_m = np.where(cos_sq != 0, cos_sigma - 2 * sinU1[active] * sinU2[active] / np.where(cos_sq != 0, cos_sq, 1), 0.0)
+                C = (f/16) * cos_sq * (4 + f * (4 - 3 * cos_sq))
+                new_lembda = omega[active] + (1-C) * f * sin_alpha * (sig + C * sin_sigma * (cos2sigma_m + C * cos_sigma * (-1 + 2 * cos2sigma_m ** 2)))
+
+                sqr_sin_sigma[active] = sq
+                Sin_sigma[active] = sin_sigma
+                Cos_sigma[active] = cos_sigma
+                sigma[active] = sig
+                cos_sq_alpha[active] = cos_sq
+                Cos2sigma_m[active] = cos2sigma_m
+                converged = (new_lembda == 0) | (np.abs((lem - new_lembda) / np.where(new_lembda != 0, new_lembda, 1)) <= 1.0e-9)
+                lembda[active] = new_lembda
+                active[np.flatnonzero(active)[converged]] = False
+
+        u2 = cos_sq_alpha * (a*a-b*b) / (b*b)
         A = 1 + (u2/16384) * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
-
         B = (u2/1024) * (256 + u2 * (-128+ u2 * (74 - 47 * u2)))
-
         delta_sigma = B * Sin_sigma * (Cos2sigma_m + (B/4) * \
-                (Cos_sigma * (-1 + 2 * pow(Cos2sigma_m, 2) ) - \
+                (Cos_sigma * (-1 + 2 * Cos2sigma_m ** 2) - \
                 (B/6) * Cos2sigma_m * (-3 + 4 * sqr_sin_sigma) * \
-                (-3 + 4 * pow(Cos2sigma_m,2 ) )))
-
+                (-3 + 4 * Cos2sigma_m ** 2)))
         s = b * A * (sigma - delta_sigma)
 
-        alpha1Tp2 = math.atan2( (math.cos(U2) * math.sin(lembda)), \
-                (math.cos(U1) * math.sin(U2) - math.sin(U1) * math.cos(U2) * math.cos(lembda)))
-
-        alpha21 = math.atan2( (math.cos(U1) * math.sin(lembda)), \
-                (-math.sin(U1) * math.cos(U2) + math.cos(U1) * math.sin(U2) * math.cos(lembda)))
+        alpha1Tp2 = np.arctan2(cosU2 * np.sin(lembda), cosU1 * sinU2 - sinU1 * cosU2 * np.cos(lembda)) % two_pi
+        alpha21 = (np.arctan2(cosU1 * np.sin(lembda), -sinU1 * cosU2 + cosU1 * sinU2 * np.cos(lembda)) + two_pi / 2.0) % two_pi
 
-        if ( alpha1Tp2 < 0.0 ) : 
-                alpha1Tp2 =  alpha1Tp2 + two_pi
-        if ( alpha1Tp2 > two_pi ) : 
-                alpha1Tp2 = alpha1Tp2 - two_pi
+        s = np.where(coincident, 0.0, s)
+        alpha1Tp2 = np.where(coincident, 0.0, np.degrees(alpha1Tp2))
+        alpha21 = np.where(coincident, 0.0, np.degrees(alpha21))
+        return s.reshape(shape), alpha1Tp2.reshape(shape), alpha21.reshape(shape)
 
-        alpha21 = alpha21 + two_pi / 2.0
-        if ( alpha21 < 0.0 ) : 
-                alpha21 = alpha21 + two_pi
-        if ( alpha21 > two_pi ) : 
-                alpha21 = alpha21 - two_pi
+def calculateRangeBearingFromGeographicals(longitude1, latitude1,  longitude2,  latitude2 ) :
+        """ 
+        Returns s, the distance between two geographic points on the ellipsoid
+        and alpha1, alpha2, the forward and reverse azimuths between these points.
+        lats, longs and azimuths are in decimal degrees, distance in metres 
 
-        alpha1Tp2    = alpha1Tp2    * 45.0 / piD4
-        alpha21    = alpha21    * 45.0 / piD4
-        return s, alpha1Tp2,  alpha21 
+        Returns ( s, alpha1Tp2,  alpha21 ) as a tuple
+        """
+        s, alpha1Tp2, alpha21 = calculateRangeBearingFromGeographicalsArray(longitude1, latitude1, longitude2, latitude2)
+        return float(s), float(alpha1Tp2), float(alpha21)
 
    # END of Vincenty's Inverse formulae 
 
@@ -211,93 +209,91 @@ def calculateRangeBearingFromGeographicals(longitude1, latitude1,  longitude2,
 # 										|
 #-------------------------------------------------------------------------------
 
-def calculateGeographicalPositionFromRangeBearing(latitude1, longitude1, alpha1To2, s ) :
+def calculateGeographicalPositionFromRangeBearingArray(latitude1, longitude1, alpha1To2, s, maxiterations=200) :
         """
-        Returns the lat and long of projected point and reverse azimuth
-        given a reference point and a distance and azimuth to project.
+        numpy version of calculateGeographicalPositionFromRangeBearing, Vincenty's direct formula for arrays of points, azimuths and distances.
+        the inputs broadcast against each other.  The iteration runs over every point at once, and points drop out of it as they converge.
         lats, longs and azimuths are passed in decimal degrees
 
-        Returns ( latitude2,  longitude2,  alpha2To1 ) as a tuple 
-
+        Returns ( longitude2,  latitude2,  alpha2To1 ) as a tuple of arrays
         """
         f = 1.0 / 298.257223563		# WGS84
         a = 6378137.0 			# metres
-
-        piD4 = math.atan( 1.0 )
-        two_pi = piD4 * 8.0
-
-        latitude1    = latitude1    * piD4 / 45.0
-        longitude1 = longitude1 * piD4 / 45.0
-        alpha1To2 = alpha1To2 * piD4 / 45.0
-        if ( alpha1To2 < 0.0 ) : 
-                alpha1To2 = alpha1To2 + two_pi
-        if ( alpha1To2 > two_pi ) : 
-                alpha1To2 = alpha1To2 - two_pi
-
         b = a * (1.0 - f)
-
-        TanU1 = (1-f) * math.tan(latitude1)
-        U1 = math.atan( TanU1 )
-        sigma1 = math.atan2( TanU1, math.cos(alpha1To2) )
-        Sinalpha = math.cos(U1) * math.sin(alpha1To2)
+        two_pi = 2.0 * np.pi
+
+        # work on flat copies of the broadcast inputs, so scalars and arrays of any shape go through the same masked updates
+        latitude1, longitude1, alpha1To2, s = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in (latitude1, longitude1, alpha1To2, s)])
+        shape = latitude1.shape
+        latitude1, longitude1, alpha1To2, s = [x.ravel() for x in (latitude1, longitude1, alpha1To2, s)]
+        latitude1 = np.radians(latitude1)
+        longitude1 = np.radians(longitude1)
+        alpha1To2 = np.radians(alpha1To2) % two_pi
+
+        TanU1 = (1-f) * np.tan(latitude1)
+        U1 = np.arctan(TanU1)
+        sinU1 = np.sin(U1)
+        cosU1 = np.cos(U1)
+        sigma1 = np.arctan2(TanU1, np.cos(alpha1To2))
+        Sinalpha = cosU1 * np.sin(alpha1To2)
         cosalpha_sq = 1.0 - Sinalpha * Sinalpha
 
         u2 = cosalpha_sq * (a * a - b * b ) / (b * b)
-        A = 1.0 + (u2 / 16384) * (4096 + u2 * (-768 + u2 * \
-                (320 - 175 * u2) ) )
-        B = (u2 / 1024) * (256 + u2 * (-128 + u2 * (74 - 47 * u2) ) )
+        A = 1.0 + (u2 / 16384) * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = (u2 / 1024) * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
 
         # Starting with the approximation
-        sigma = (s / (b * A))
-
-        last_sigma = 2.0 * sigma + 2.0	# something impossible
-
-        # Iterate the following three equations 
-        #  until there is no significant change in sigma 
-
-        # two_sigma_m , delta_sigma
-        while ( abs( (last_sigma - sigma) / sigma) > 1.0e-9 ) :
-                two_sigma_m = 2 * sigma1 + sigma
-
-                delta_sigma = B * math.sin(sigma) * ( math.cos(two_sigma_m) \
-                        + (B/4) * (math.cos(sigma) * \
-                        (-1 + 2 * math.pow( math.cos(two_sigma_m), 2 ) -  \
-                        (B/6) * math.cos(two_sigma_m) * \
-                        (-3 + 4 * math.pow(math.sin(sigma), 2 )) *  \
-                        (-3 + 4 * math.pow( math.cos (two_sigma_m), 2 ))))) \
-
-                last_sigma = sigma
-                sigma = (s / (b * A)) + delta_sigma
-
-        latitude2 = math.atan2 ( (math.sin(U1) * math.cos(sigma) + math.cos(U1) * math.sin(sigma) * math.cos(alpha1To2) ), \
-                ((1-f) * math.sqrt( math.pow(Sinalpha, 2) +  \
-                pow(math.sin(U1) * math.sin(sigma) - math.cos(U1) * math.cos(sigma) * math.cos(alpha1To2), 2))))
-
-        lembda = math.atan2( (math.sin(sigma) * math.sin(alpha1To2 )), (math.cos(U1) * math.cos(sigma) -  \
-                math.sin(U1) *  math.sin(sigma) * math.cos(alpha1To2)))
-
-        C = (f/16) * cosalpha_sq * (4 + f * (4 - 3 * cosalpha_sq ))
-
-        omega = lembda - (1-C) * f * Sinalpha *  \
-                (sigma + C * math.sin(sigma) * (math.cos(two_sigma_m) + \
-                C * math.cos(sigma) * (-1 + 2 * math.pow(math.cos(two_sigma_m),2) )))
+        sigma = s / (b * A)
+        two_sigma_m = 2 * sigma1 + sigma
+
+        # Iterate the following three equations over the points which have not converged,
+        #  until there is no significant change in sigma
+        active = sigma != 0
+        for iteration in range(maxiterations):
+                if not active.any():
+                        break
+                sig = sigma[active]
+                tsm = 2 * sigma1[active] + sig
+                Ba = B[active]
+                delta_sigma = Ba * np.sin(sig) * (np.cos(tsm) + (Ba/4) * (np.cos(sig) * (-1 + 2 * np.cos(tsm) ** 2) - \
+                        (Ba/6) * np.cos(tsm) * (-3 + 4 * np.sin(sig) ** 2) * (-3 + 4 * np.cos(tsm) ** 2)))
+                new_sigma = s[active] / (b * A[active]) + delta_sigma
+                two_sigma_m[active] = tsm
+                sigma[active] = new_sigma
+                converged = np.abs((sig - new_sigma) / new_sigma) <= 1.0e-9
+                active[np.flatnonzero(active)[converged]] = False
+
+        sin_sigma = np.sin(sigma)
+        cos_sigma = np.cos(sigma)
+        cos_alpha1To2 = np.cos(alpha1To2)
+        latitude2 = np.arctan2(sinU1 * cos_sigma + cosU1 * sin_sigma * cos_alpha1To2, \
+                (1-f) * np.sqrt(Sinalpha ** 2 + (sinU1 * sin_sigma - cosU1 * cos_sigma * cos_alpha1To2) ** 2))
+
+        lembda = np.arctan2(sin_sigma * np.sin(alpha1To2), cosU1 * cos_sigma - sinU1 * sin_sigma * cos_alpha1To2)
+
+        C = (f/16) * cosalpha_sq * (4 + f * (4 - 3 * cosalpha_sq))
+
+        omega = lembda - (1-C) * f * Sinalpha * \
+                (sigma + C * sin_sigma * (np.cos(two_sigma_m) + \
+                C * cos_sigma * (-1 + 2 * np.cos(two_sigma_m) ** 2)))
 
         longitude2 = longitude1 + omega
 
-        alpha21 = math.atan2 ( Sinalpha, (-math.sin(U1) * math.sin(sigma) +  \
-                math.cos(U1) * math.cos(sigma) * math.cos(alpha1To2)))
+        alpha21 = (np.arctan2(Sinalpha, -sinU1 * sin_sigma + cosU1 * cos_sigma * cos_alpha1To2) + two_pi / 2.0) % two_pi
+
+        return np.degrees(longitude2).reshape(shape), np.degrees(latitude2).reshape(shape), np.degrees(alpha21).reshape(shape)
 
-        alpha21 = alpha21 + two_pi / 2.0
-        if ( alpha21 < 0.0 ) :
-                alpha21 = alpha21 + two_pi
-        if ( alpha21 > two_pi ) :
-                alpha21 = alpha21 - two_pi
+def calculateGeographicalPositionFromRangeBearing(latitude1, longitude1, alpha1To2, s ) :
+        """
+        Returns the lat and long of projected point and reverse azimuth
+        given a reference point and a distance and azimuth to project.
+        lats, longs and azimuths are passed in decimal degrees
 
-        latitude2       = latitude2       * 45.0 / piD4
-        longitude2    = longitude2    * 45.0 / piD4
-        alpha21    = alpha21    * 45.0 / piD4
+        Returns ( longitude2,  latitude2,  alpha2To1 ) as a tuple 
 
-        return longitude2, latitude2, alpha21 
+        """
+        longitude2, latitude2, alpha21 = calculateGeographicalPositionFromRangeBearingArray(latitude1, longitude1, alpha1To2, s)
+        return float(longitude2), float(latitude2), float(alpha21)
 
   # END of Vincenty's Direct formulae
 
@@ -0,0 +1,75 @@
+#name:			georeference
+#created:		October 2026
+#description:	python module to compute the geographical position of every beam in one or more pings with numpy, rather than one sounding at a time
+#				See readme.md for more details
+
+import numpy as np
+
+# the mean earth radius used by the spherical destination point
+EARTHRADIUS = 6371000.0
+
+###############################################################################
+def destinationpoints(latitude, longitude, distance, bearing, radius=EARTHRADIUS):
+	'''
+	numpy version of pygsf2cloud.destinationPoint.  compute the positions distance metres from latitude, longitude along bearing (degrees) on a sphere of radius metres.
+	http://www.movable-type.co.uk/scripts/latlong.html
+	the inputs can be scalars or arrays which broadcast against each other, e.g. one position per ping as a column and a row of beams per ping.
+	returns (longitude, latitude) arrays in degrees, normalised to -180..+180
+	'''
+	angulardist = np.asarray(distance, dtype=np.float64) / radius
+	bearing = np.radians(bearing)
+	lat1 = np.radians(latitude)
+	lon1 = np.radians(longitude)
+
+	sinlat1 = np.sin(lat1)
+	coslat1 = np.cos(lat1)
+	sinangulardist = np.sin(angulardist)
+	cosangulardist = np.cos(angulardist)
+
+	sinlat2 = sinlat1 * cosangulardist + coslat1 * sinangulardist * np.cos(bearing)
+	lat2 = np.arcsin(sinlat2)
+	y = np.sin(bearing) * sinangulardist * coslat1
+	x = cosangulardist - sinlat1 * sinlat2
+	lon2 = lon1 + np.arctan2(y, x)
+
+	return (np.degrees(lon2) + 540) % 360 - 180, (np.degrees(lat2) + 540) % 360 - 180
+
+###############################################################################
+def radiusfromlatitude(latitude):
+	'''
+	numpy version of pygsf2cloud.calculateradiusFromLatitude.  given latitudes compute the localised earth radius in metres using the wgs84 ellipsoid
+	https://rechneronline.de/earth-radius/
+	'''
+	r = 6378.137 # semi major axis for wgs84
+	rp = 6356.752 # semi minor axis for wgs 84
+	B = np.radians(latitude)
+	cosB = np.cos(B)
+	sinB = np.sin(B)
+
+	R = (((r**2) * cosB)**2 + ((rp**2) * sinB)**2) / ((r * cosB)**2 + (rp * sinB)**2)
+	return np.sqrt(R) * 1000
+
+###############################################################################
+def georeference(latitude, longitude, heading, acrosstrack, alongtrack, ellipsoidal=False):
+	'''
+	compute the longitude and latitude of every beam from its across and along track offsets (metres) and the ping position and heading (degrees).
+	pass a single ping as scalars and 1-D beam arrays, or a batch of pings as 1-D ping arrays and 2-D (npings, nbeams) beam arrays, e.g. from GSFREADER.read_pings.  NaN beams give NaN positions.
+	the beams are placed on a sphere of the mean earth radius, or with ellipsoidal set, of the local wgs84 radius at the ping latitude.
+	returns (longitude, latitude) arrays the same shape as the beam arrays
+	'''
+	acrosstrack = np.asarray(acrosstrack, dtype=np.float64)
+	alongtrack = np.asarray(alongtrack, dtype=np.float64)
+	latitude = np.asarray(latitude, dtype=np.float64)
+	longitude = np.asarray(longitude, dtype=np.float64)
+	heading = np.asarray(heading, dtype=np.float64)
+	if acrosstrack.ndim == 2 and latitude.ndim == 1:
+		# one position per ping, so broadcast it along the row of beams
+		latitude = latitude[:, np.newaxis]
+		longitude = longitude[:, np.newaxis]
+		heading = heading[:, np.newaxis]
+
+	# given the Dx,Dy soundings, compute a range, bearing so we can correctly map out the soundings
+	bearing = 90 - np.degrees(np.arctan2(alongtrack, acrosstrack)) + heading
+	distance = np.hypot(acrosstrack, alongtrack)
+	radius = radiusfromlatitude(latitude) if ellipsoidal else EARTHRADIUS
+	return destinationpoints(latitude, longitude, distance, bearing, radius)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import struct
+import pytest
+import pygsf
+
+SAMPLEFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generic-sensor-format-master", "data", "surveys", "0175_20150322_232639_EX1502L2_MB.gsf.mb121")
+
+@pytest.fixture
+def samplefile(tmp_path):
+	'''
+	copy the sample survey line into a temporary folder so nothing is written alongside the source tree
+	'''
+	filename = str(tmp_path / "sample.gsf")
+	shutil.copyfile(SAMPLEFILE, filename)
+	return filename
+
+def makeR2Sonicping(beams, time=1500000000):
+	'''
+	make a minimal swath bathymetry record with an R2Sonic time series intensity subrecord.  beams is a list of (samples, bottomdetectsamplenumber)
+	'''
+	header = struct.pack('>llll5hlH3h2Hlllh', time, 250000000, 10000000, 20000000, len(beams), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+	settings = [b'2024', b'123'] + [0] * 30 + [b'']
+	settings[7] = 400000000 # frequency
+	settings[6] = 150000 # sound speed
+	content = struct.pack('>bl16s', 16, 0, b'')
+	content += struct.pack('>12s12slll lllll llllhh lllll lllhh lllll l32s', *settings)
+	for samples, bottomdetectsamplenumber in beams:
+		content += struct.pack('>hh8s', len(samples), bottomdetectsamplenumber, b'')
+		content += struct.pack('>%dH' % len(samples), *samples)
+	subrecord = struct.pack('>L', (21 << 24) | len(content)) + content + bytes((4 - len(content) % 4) % 4)
+	payload = header + subrecord
+	return struct.pack('>LL', len(payload), pygsf.SWATH_BATHYMETRY) + payload
+
+def makeping(depths, time, multiplier=None):
+	'''
+	make a minimal swath bathymetry record with a two byte depth array.  If multiplier is given the ping carries a depth scale factor subrecord
+	'''
+	payload = struct.pack('>llll5hlH3h2Hlllh', time, 0, 10000000, 20000000, len(depths), 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+	if multiplier is not None:
+		payload += struct.pack('>Lllll', (100 << 24) | 16, 1, 1 << 24, multiplier, 0)
+	content = struct.pack('>%dH' % len(depths), *depths)
+	payload += struct.pack('>L', (1 << 24) | len(content)) + content + bytes((4 - len(content) % 4) % 4)
+	return struct.pack('>LL', len(payload), pygsf.SWATH_BATHYMETRY) + payload
+
+def readpings(filename, numpyarrays):
+	'''
+	decode every ping in a file with the readDatagram loop, the reference the other decoders are compared with
+	'''
+	pings = []
+	r = pygsf.GSFREADER(filename, numpyarrays=numpyarrays)
+	while r.moreData():
+		numberofbytes, recordidentifier, datagram = r.readDatagram()
+		if recordidentifier == pygsf.SWATH_BATHYMETRY:
+			datagram.read()
+			pings.append(datagram)
+	r.close()
+	return pings
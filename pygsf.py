@@ -21,6 +21,12 @@ from datetime import datetime
 from datetime import timedelta
 from statistics import mean
 import mmap
+import io
+import gzip
+import bz2
+import lzma
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # for testing only...
 # import matplotlib.pyplot as plt
@@ -46,6 +52,8 @@ SWATH_BATHY_SUMMARY						= 9
 SINGLE_BEAM_SOUNDING					= 10
 HV_NAVIGATION_ERROR						= 11
 ATTITUDE								= 12
+# the record identifiers a valid record can have, used to resynchronise on a damaged file
+RECORDTYPES = set(range(HEADER, ATTITUDE + 1))
 
 SNIPPET_NONE 							= 0  # extract the mean value from the snippet array
 SNIPPET_MEAN 							= 1  # extract the mean value from the snippet array
@@ -60,6 +68,58 @@ ARCIdx = {100000: 0, 200000: 1, 400000: 2}
 REJECT_CLIP = -1
 REJECT_RANGE= -2
 REJECT_INTENSITY= -4
+
+# map the struct datatypes used to decode the beam arrays onto big endian numpy dtypes so we can decode directly from the file buffer
+NUMPYDTYPES = {'B': np.dtype('>u1'), 'b': np.dtype('>i1'), 'H': np.dtype('>u2'), 'h': np.dtype('>i2'), 'L': np.dtype('>u4'), 'l': np.dtype('>i4')}
+
+# the madvise hints for scanning and for indexed access, where the platform supports them
+MADV_SEQUENTIAL = getattr(mmap, 'MADV_SEQUENTIAL', None)
+MADV_RANDOM = getattr(mmap, 'MADV_RANDOM', None)
+
+# precompiled structs for the records we decode for every ping, so we do not parse the formats again and again
+PINGHEADERSTRUCT = struct.Struct('>llll5hlH3h2Hlllh')
+SUBRECORDHEADERSTRUCT = struct.Struct('>l')
+SCALEFACTORSTRUCT = struct.Struct('>lll')
+# the beam array datatype for each (subrecord ID, bytes per value), and the beam array structs for each (number of beams, datatype), filled in as we meet them
+SCALEDATATYPES = {}
+ARRAYSTRUCTS = {}
+
+# the beam array subrecords we decode, and the ping attribute each is decoded into
+PINGSUBRECORDS = {1: 'DEPTH_ARRAY', 2: 'ACROSS_TRACK_ARRAY', 3: 'ALONG_TRACK_ARRAY', 4: 'TRAVEL_TIME_ARRAY', 5: 'BEAM_ANGLE_ARRAY', 6: 'MEAN_CAL_AMPLITUDE_ARRAY', 7: 'MEAN_REL_AMPLITUDE_ARRAY', 9: 'QUALITY_FACTOR_ARRAY', 16: 'BEAM_FLAGS_ARRAY', 18: 'BEAM_ANGLE_FORWARD_ARRAY', 19: 'VERTICAL_ERROR_ARRAY', 20: 'HORIZONTAL_ERROR_ARRAY', 21: 'SNIPPET_SERIES_ARRAY', 22: 'SECTOR_NUMBER_ARRAY'}
+
+# the ping header fields and beam arrays returned by GSFREADER.read_pings
+PINGHEADERFIELDS = ['time', 'longitude', 'latitude', 'numbeams', 'centrebeam', 'pingflags', 'tidecorrector', 'depthcorrector', 'heading', 'pitch', 'roll', 'heave', 'course', 'speed', 'height', 'separation', 'gpstidecorrector']
+PINGARRAYFIELDS = ['DEPTH_ARRAY', 'ACROSS_TRACK_ARRAY', 'ALONG_TRACK_ARRAY', 'TRAVEL_TIME_ARRAY', 'BEAM_ANGLE_ARRAY', 'MEAN_CAL_AMPLITUDE_ARRAY', 'MEAN_REL_AMPLITUDE_ARRAY', 'QUALITY_FACTOR_ARRAY', 'BEAM_FLAGS_ARRAY', 'BEAM_ANGLE_FORWARD_ARRAY', 'VERTICAL_ERROR_ARRAY', 'HORIZONTAL_ERROR_ARRAY', 'SECTOR_NUMBER_ARRAY']
+# every beam array a ping can hold
+PINGARRAYS = set(PINGSUBRECORDS.values()) | set(PINGARRAYFIELDS)
+
+# the fixed 56 byte ping header as stored in the file, and the scaled version returned by GSFREADER.ping_headers
+PINGHEADERRAWDTYPE = np.dtype([('time', '>i4'), ('nanotime', '>i4'), ('longitude', '>i4'), ('latitude', '>i4'), ('numbeams', '>i2'), ('centrebeam', '>i2'), ('pingflags', '>i2'), ('reserved', '>i2'), ('tidecorrector', '>i2'), ('depthcorrector', '>i4'), ('heading', '>u2'), ('pitch', '>i2'), ('roll', '>i2'), ('heave', '>i2'), ('course', '>u2'), ('speed', '>u2'), ('height', '>i4'), ('separation', '>i4'), ('gpstidecorrector', '>i4'), ('spare', '>i2')])
+PINGHEADERDTYPE = np.dtype([('offset', '<u8'), ('time', '<f8'), ('longitude', '<f8'), ('latitude', '<f8'), ('numbeams', '<i4'), ('centrebeam', '<i4'), ('pingflags', '<i4'), ('reserved', '<i4'), ('tidecorrector', '<f8'), ('depthcorrector', '<f8'), ('heading', '<f8'), ('pitch', '<f8'), ('roll', '<f8'), ('heave', '<f8'), ('course', '<f8'), ('speed', '<f8'), ('height', '<f8'), ('separation', '<f8'), ('gpstidecorrector', '<f8'), ('spare', '<i4')])
+
+# the compressed files GSFSTREAMREADER decompresses as it reads
+STREAMEXTENSIONS = ('.gz', '.bz2', '.xz', '.lzma')
+
+# the fixed headers of the other records we decode
+ATTITUDEHEADERSTRUCT = struct.Struct('>llH')	# time, nanoseconds, number of measurements
+SVPHEADERSTRUCT = struct.Struct('>lllllll')	# observation time, nanoseconds, application time, nanoseconds, longitude, latitude, number of points
+NAVIGATIONERRORSTRUCT = struct.Struct('>lllll')
+HVNAVIGATIONERRORSTRUCT = struct.Struct('>lllllH2sH')	# time, nanoseconds, record id, horizontal error, vertical error, separation uncertainty, spare, position type length
+PARAMETERSHEADERSTRUCT = struct.Struct('>llH')	# time, nanoseconds, number of parameters
+# the attitude measurements as stored in the file, with the time as milliseconds from the record time, and the scaled version returned by ATTITUDE_RECORD.read and GSFREADER.loadattitude
+ATTITUDERAWDTYPE = np.dtype([('time', '>u2'), ('pitch', '>i2'), ('roll', '>i2'), ('heave', '>i2'), ('heading', '>u2')])
+ATTITUDEDTYPE = np.dtype([('time', '<f8'), ('pitch', '<f8'), ('roll', '<f8'), ('heave', '<f8'), ('heading', '<f8')])
+
+# the record index is persisted alongside the gsf file in a sidecar file, similar to the libgsf .n index files
+INDEXEXTENSION = ".pyidx"
+INDEXMAGIC = b'PYGSFIDX'
+INDEXVERSION = 1
+INDEXHEADERFMT = '<8sLLqqQ'	# magic, version, spare, filesize, mtime (nanoseconds), record count
+# the record headers returned by GSFREADER.scanrecords.  sizeofdata is the payload size, excluding the record header and checksum
+RECORDDTYPE = np.dtype([('offset', '<u8'), ('recordidentifier', '<u4'), ('sizeofdata', '<u4'), ('haschecksum', '?')])
+INDEXDTYPE = np.dtype([('offset', '<u8'), ('recordidentifier', '<u2'), ('hdrlen', '<u2'), ('numberofbytes', '<u4'), ('time', '<f8')])
+# the records which fail GSFREADER.verifychecksums, with the checksum stored in the file and the one computed from the record
+CHECKSUMDTYPE = np.dtype([('offset', '<u8'), ('recordidentifier', '<u4'), ('stored', '<u4'), ('computed', '<u4')])
 ###############################################################################
 def main():
 
@@ -117,44 +177,41 @@ def testreader(filename):
 	# # ax3 = f3.add_subplot(111)
 
 	print ("pingcount, pingnumber, 100kHz, 200kHz, 400kHz")
-	while r.moreData():
-		# read a datagram.  If we support it, return the datagram type and aclass for that datagram
-		# The user then needs to call the read() method for the class to undertake a fileread and binary decode.  This keeps the read super quick.
-		numberofbytes, recordidentifier, datagram = r.readDatagram()
-		# print(datagram)
-		if recordidentifier == SWATH_BATHYMETRY:
-			print(recordidentifier, end=',')
-			datagram.read()
-			datagram.snippettype = SNIPPET_NONE
-			# print ("%s Lat:%.3f Lon:%.3f Ping:%d Freq:%d Serial %s" % (datagram.currentRecordDateTime(), datagram.latitude, datagram.longitude, datagram.pingnumber, datagram.frequency, datagram.serialnumber))
-
-			# for cross profile plotting
-			# bs = []
-			# for s in datagram.MEAN_REL_AMPLITUDE_ARRAY:
-			# 	if s != 0:
-			# 		bs.append(20 * math.log10(s) - 100)
-			# 	else:
-			# 		bs.append(0)
-
-			# bs = [20 * math.log10(s) - 100 for s in datagram.MEAN_REL_AMPLITUDE_ARRAY]
-			samplearray = datagram.R2Soniccorrection()
-			if datagram.frequency == 100000:
-				freq100 = mean(samplearray)
-			if datagram.frequency == 200000:
-				freq200 = mean(samplearray)
-			if datagram.frequency == 400000:
-				freq400 = mean(samplearray)
-				# print ("%d,%d,%.3f,%.3f,%.3f" %(pingcount, datagram.pingnumber, freq100, freq200, freq400))
-				# print ("%d" %(pingcount))
-				pingcount += 1
-				# if len(bs) > 0:
-				# 	plt.plot(datagram.BEAM_ANGLE_ARRAY, bs, linewidth=0.25, color='blue')
-				# 	plt.ylim([-60,-5])
-				# 	plt.xlim([-60,60])
-				# 	# ax3.plot(datagram.BEAM_ANGLE_ARRAY, datagram.ALONG_TRACK_ARRAY)
-				# 	plt.pause(0.001)
-
-			# datagram.clippolar(-60, 60)
+	# records() yields the datagram for each record we ask for, skipping the others.  If we support it, the datagram is a class for that record type
+	# The user then needs to call the read() method for the class to undertake a fileread and binary decode.  This keeps the read super quick.
+	for numberofbytes, recordidentifier, datagram in r.records(SWATH_BATHYMETRY):
+		print(recordidentifier, end=',')
+		datagram.read()
+		datagram.snippettype = SNIPPET_NONE
+		# print ("%s Lat:%.3f Lon:%.3f Ping:%d Freq:%d Serial %s" % (datagram.currentRecordDateTime(), datagram.latitude, datagram.longitude, datagram.pingnumber, datagram.frequency, datagram.serialnumber))
+
+		# for cross profile plotting
+		# bs = []
+		# for s in datagram.MEAN_REL_AMPLITUDE_ARRAY:
+		# 	if s != 0:
+		# 		bs.append(20 * math.log10(s) - 100)
+		# 	else:
+		# 		bs.append(0)
+
+		# bs = [20 * math.log10(s) - 100 for s in datagram.MEAN_REL_AMPLITUDE_ARRAY]
+		samplearray = datagram.R2Soniccorrection()
+		if datagram.frequency == 100000:
+			freq100 = mean(samplearray)
+		if datagram.frequency == 200000:
+			freq200 = mean(samplearray)
+		if datagram.frequency == 400000:
+			freq400 = mean(samplearray)
+			# print ("%d,%d,%.3f,%.3f,%.3f" %(pingcount, datagram.pingnumber, freq100, freq200, freq400))
+			# print ("%d" %(pingcount))
+			pingcount += 1
+			# if len(bs) > 0:
+			# 	plt.plot(datagram.BEAM_ANGLE_ARRAY, bs, linewidth=0.25, color='blue')
+			# 	plt.ylim([-60,-5])
+			# 	plt.xlim([-60,60])
+			# 	# ax3.plot(datagram.BEAM_ANGLE_ARRAY, datagram.ALONG_TRACK_ARRAY)
+			# 	plt.pause(0.001)
+
+		# datagram.clippolar(-60, 60)
 	# print("Duration %.3fs" % (time.time() - start_time )) # time the process
 	# print ("PingCount:", pingcount)
 	return
@@ -194,43 +251,105 @@ class SCALEFACTOR:
 		'''
 		return pprint.pformat(vars(self))
 	
+class SCALEFACTORTABLE:
+	'''
+	the beam array scale factors held in a 256 slot table indexed on subrecord ID, so finding the scale factor for a subrecord is a single lookup.
+	the table is only changed when a scale factor subrecord (100) is decoded, and is shared by the reader and its pings
+	'''
+	def __init__(self):
+		self.slots = [None] * 256
+		self.count = 0
+		self.source = None		# the offset of the ping whose scale factor subrecord was last decoded into the table
+		self.name = "scaleFactorTable"
+
+	def __len__(self):
+		return self.count
+
+	def __iter__(self):
+		return (sf for sf in self.slots if sf is not None)
+
+	def update(self, sf):
+		'''add a scale factor, replacing any existing scale factor for the same subrecord'''
+		if self.slots[sf.subrecordID] is None:
+			self.count += 1
+		self.slots[sf.subrecordID] = sf
+
+	def clear(self):
+		'''remove every scale factor, in place so anything sharing this table sees the change'''
+		self.slots[:] = [None] * 256
+		self.count = 0
+		self.source = None
+
+	def copyfrom(self, other):
+		'''replace the contents of this table with those of another, in place so anything sharing this table sees the change'''
+		self.slots[:] = other.slots
+		self.count = other.count
+		self.source = other.source
+
+	def lookup(self, ID, bytes_per_value):
+		'''return the multiplier, offset, compression flag and struct datatype for a subrecord'''
+		sf = self.slots[ID]
+		if sf is None:
+			return 1,0,0, 'h'
+		datatype = SCALEDATATYPES.get((ID, bytes_per_value))
+		if datatype is None:
+			datatype = SCALEDATATYPES[(ID, bytes_per_value)] = scaledatatype(ID, bytes_per_value)
+		return sf.multiplier, sf.offset, sf.compressionFlag, datatype
+
+	def __str__(self):
+		'''
+		pretty print this class
+		'''
+		return pprint.pformat(list(self))
+
 class SWATH_BATHYMETRY_PING :
-	def __init__(self, fileptr, numbytes, recordidentifier, hdrlen):
-		self.recordidentifier = recordidentifier	# assign the GSF code for this datagram type
-		self.offset = fileptr.tell()				# remember where this packet resides in the file so we can return if needed
-		self.hdrlen = hdrlen						# remember the header length.  it should be 8 bytes, bout if checksum then it is 12
-		self.numbytes = numbytes					# remember how many bytes this packet contains
-		self.fileptr = fileptr						# remember the file pointer so we do not need to pass from the host process
-		self.fileptr.seek(numbytes, 1)				# move the file pointer to the end of the record so we can skip as the default actions
-		self.scalefactors = []
-		self.DEPTH_ARRAY = []
-		self.ACROSS_TRACK_ARRAY = []
-		self.ALONG_TRACK_ARRAY = []
-		self.TRAVEL_TIME_ARRAY = []
-		self.BEAM_ANGLE_ARRAY = []
-		self.MEAN_CAL_AMPLITUDE_ARRAY = []
-		self.MEAN_REL_AMPLITUDE_ARRAY = []
-		self.QUALITY_FACTOR_ARRAY = []
-		self.BEAM_FLAGS_ARRAY = []
-		self.BEAM_ANGLE_FORWARD_ARRAY = []
-		self.VERTICAL_ERROR_ARRAY = []
-		self.HORIZONTAL_ERROR_ARRAY = []
-		self.SECTOR_NUMBER_ARRAY = []
-		# self.INTENSITY_SERIES_ARRAY = []
-		self.SNIPPET_SERIES_ARRAY = []
+	# a ping has a fixed set of attributes, so use slots rather than a dictionary per ping.  This saves memory and time when streaming many pings
+	__slots__ = ('recordidentifier', 'offset', 'hdrlen', 'numbytes', 'fileptr', 'scalefactors', 'subrecords', 'pendingarrays', 'perbeam', 'snippettype', 'numpyarrays', 'floattype', 'reuse', 'buffers', 'name',
+		'time', 'pingnanotime', 'longitude', 'latitude', 'numbeams', 'centrebeam', 'pingflags', 'reserved', 'tidecorrector', 'depthcorrector', 'heading', 'pitch', 'roll', 'heave', 'course', 'speed', 'height', 'separation', 'gpstidecorrector', 'spare',
+		'DEPTH_ARRAY', 'ACROSS_TRACK_ARRAY', 'ALONG_TRACK_ARRAY', 'TRAVEL_TIME_ARRAY', 'BEAM_ANGLE_ARRAY', 'MEAN_CAL_AMPLITUDE_ARRAY', 'MEAN_REL_AMPLITUDE_ARRAY', 'QUALITY_FACTOR_ARRAY', 'BEAM_FLAGS_ARRAY', 'BEAM_ANGLE_FORWARD_ARRAY', 'VERTICAL_ERROR_ARRAY', 'HORIZONTAL_ERROR_ARRAY', 'SECTOR_NUMBER_ARRAY', 'SNIPPET_SERIES_ARRAY',
+		'SNIPPET_SAMPLES', 'SNIPPET_OFFSETS', 'SNIPPET_LENGTHS', 'SNIPPET_DETECTS', 'numscalefactors',
+		'modelnumber', 'serialnumber', 'pingtime', 'pingnumber', 'pingperiod', 'soundspeed', 'frequency', 'transmitsourcelevel', 'pulsewidth', 'beamwidthvertical', 'beamwidthhorizontal', 'vtxoffset', 'receivergain', 'receiverspreadingloss', 'absorptioncoefficient')
+
+	def __init__(self, fileptr, numbytes, recordidentifier, hdrlen, scalefactors=None):
+		self.reset(fileptr, numbytes, recordidentifier, hdrlen)
+		self.scalefactors = SCALEFACTORTABLE() if scalefactors is None else scalefactors	# the reader passes its own table, so pings share it
+		# the beam arrays are empty lists until the ping is read (see __getattr__)
+		self.subrecords = {}						# the offset and size of each subrecord, keyed on subrecord id
+		self.pendingarrays = {}						# the beam arrays which will be decoded on first access, with the (subrecord id, offset, size, scale factor) of each subrecord to decode them from
 		self.perbeam = True
 		self.snippettype = SNIPPET_MAX
+		self.numpyarrays = False					# decode the beam arrays into numpy arrays rather than python lists
+		self.floattype = np.float64					# the numpy float type used when decoding into numpy arrays
+		self.reuse = False							# reuse this ping object and its numpy buffers for the next ping (see GSFREADER.pings)
+		self.buffers = None							# the numpy buffers the beam arrays are decoded into when reusing the ping
 		self.numbeams = 0
 		self.time = 0
 		self.pingnanotime = 0
 		self.name = "swath bathy ping"
 
+	def reset(self, fileptr, numbytes, recordidentifier, hdrlen):
+		'''
+		point this ping at the record at the file pointer, and move the file pointer to the end of the record.  This lets one ping object be reused for every ping in a file
+		'''
+		self.recordidentifier = recordidentifier	# assign the GSF code for this datagram type
+		self.offset = fileptr.tell()				# remember where this packet resides in the file so we can return if needed
+		self.hdrlen = hdrlen						# remember the header length.  it should be 8 bytes, bout if checksum then it is 12
+		self.numbytes = numbytes					# remember how many bytes this packet contains
+		self.fileptr = fileptr						# remember the file pointer so we do not need to pass from the host process
+		self.fileptr.seek(numbytes, 1)				# move the file pointer to the end of the record so we can skip as the default actions
+
 ###############################################################################
 	def __str__(self):
 		'''
-		pretty print this class
+		pretty print this class.  Beam arrays which have not been decoded yet are not shown, as we do not want printing to decode them
 		'''
-		return pprint.pformat(vars(self))
+		values = {}
+		for name in self.__slots__:
+			try:
+				values[name] = object.__getattribute__(self, name)
+			except AttributeError:
+				pass
+		return pprint.pformat(values)
 ###############################################################################
 	def clippolar(self, leftclipdegrees, rightclipdegrees):
 		'''sets the processing flags to rejected if the beam angle is beyond the clip parameters'''
@@ -269,18 +388,18 @@ class SWATH_BATHYMETRY_PING :
 		return
 
 ###############################################################################
-	def read(self, headeronly=False):
+	def read(self, headeronly=False, lazy=False):
+		'''
+		decode the ping.  headeronly decodes just the ping header.
+		lazy records where each subrecord is, but only decodes the beam arrays when they are first accessed, so callers only pay for the arrays they use.  The scale factors are looked up now, as the shared scale factor table may have changed by the time an array is accessed
+		'''
 		self.fileptr.seek(self.offset + self.hdrlen, 0)   # move the file pointer to the start of the record so we can read from disc			  
 
 		# read ping header
-		hdrfmt = '>llll5hlH3h2Hlllh'
-		hdrlen = struct.calcsize(hdrfmt)
-		rec_unpack = struct.Struct(hdrfmt).unpack
-
-		self.fileptr.seek(self.offset + self.hdrlen , 0)   # move the file pointer to the start of the record so we can read from disc			  
-		data = self.fileptr.read(hdrlen)
-		s = rec_unpack(data)
+		data = self.fileptr.read(PINGHEADERSTRUCT.size)
+		s = PINGHEADERSTRUCT.unpack(data)
 		self.time 			= s[0] 
+		self.pingnanotime	= s[1]
 		self.longitude 		= s[2] / 10000000
 		self.latitude		= s[3] / 10000000
 		self.numbeams 		= s[4]
@@ -300,15 +419,31 @@ class SWATH_BATHYMETRY_PING :
 		self.gpstidecorrector	= s[18] / 100
 		self.spare			= s[19]
 
-		while (self.fileptr.tell() < self.offset + self.numbytes): #dont read past the end of the packet length.  This should never happen!
-			fmt = '>l'
-			fmtlen = struct.calcsize(fmt)
-			rec_unpack = struct.Struct(fmt).unpack
-			data = self.fileptr.read(fmtlen)   # read the record from disc
-			s = rec_unpack(data)
+		if not self.numpyarrays:
+			# python lists are appended to, so start with empty beam arrays so reading a ping twice does not duplicate the beams
+			for name in PINGARRAYS:
+				setattr(self, name, [])
+		elif self.reuse:
+			# numpy arrays are replaced when they are decoded, so we only need to forget the arrays of the last ping, as this ping may not have them
+			for subrecord_id in self.subrecords:
+				self.forgetarray(PINGSUBRECORDS.get(subrecord_id))
+		if self.reuse:
+			# the gathered snippet samples belong to the last ping, so forget them too in case this ping has no snippets
+			for name in ('SNIPPET_SAMPLES', 'SNIPPET_OFFSETS', 'SNIPPET_LENGTHS', 'SNIPPET_DETECTS'):
+				self.forgetarray(name)
+			self.subrecords.clear()
+			self.pendingarrays.clear()
+		else:
+			self.subrecords = {}
+			self.pendingarrays = {}
+		while (self.fileptr.tell() + 4 <= self.offset + self.numbytes): #dont read past the end of the packet length.  The record may be padded to a 4 byte boundary
+			data = self.fileptr.read(SUBRECORDHEADERSTRUCT.size)   # read the record from disc
+			s = SUBRECORDHEADERSTRUCT.unpack(data)
 
 			subrecord_id = (s[0] & 0xFF000000) >> 24
 			subrecord_size = s[0] & 0x00FFFFFF
+			# remember where each subrecord lives so we can decode it later if required
+			self.subrecords[subrecord_id] = (self.fileptr.tell(), subrecord_size)
 
 			# skip the record for performance reasons.  Very handy in some circumstances
 			if headeronly:
@@ -318,71 +453,96 @@ class SWATH_BATHYMETRY_PING :
 					self.fileptr.seek(subrecord_size, 1) #move forwards to the end of teh record
 				continue
 
-			# now decode the subrecord
-			# curr = self.fileptr.tell()
-			scale, offset, compressionFlag, datatype = self.getscalefactor(subrecord_id, subrecord_size / int(self.numbeams))
-			
-			if subrecord_id == 100: 
-				self.readscalefactors()
-			elif subrecord_id == 1: 
-				self.readarray(self.DEPTH_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 2: 
-				self.readarray(self.ACROSS_TRACK_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 3: 
-				self.readarray(self.ALONG_TRACK_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 4: 
-				self.readarray(self.TRAVEL_TIME_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 5: 
-				self.readarray(self.BEAM_ANGLE_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 6: 
-				self.readarray(self.MEAN_CAL_AMPLITUDE_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 7: 
-				self.readarray(self.MEAN_REL_AMPLITUDE_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 9: 
-				self.readarray(self.QUALITY_FACTOR_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 16: 
-				self.readarray(self.BEAM_FLAGS_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 18: 
-				self.readarray(self.BEAM_ANGLE_FORWARD_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 19: 
-				self.readarray(self.VERTICAL_ERROR_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 20: 
-				self.readarray(self.VERTICAL_ERROR_ARRAY, scale, offset, datatype)
-			elif subrecord_id == 21: 
-				before = self.fileptr.tell()
-				self.readintensityarray(self.SNIPPET_SERIES_ARRAY, scale, offset, datatype, self.snippettype)
-				if subrecord_size % 4 > 0:
-					self.fileptr.seek(4 - (subrecord_size % 4), 1) #pkpk we should not need this!!!
-			elif subrecord_id == 22: 
-				self.readarray(self.SECTOR_NUMBER_ARRAY, scale, offset, datatype)
-			else:
-				# read to the end of the record to keep in alignment.  This permits us to not have all the decodes in place
-				self.fileptr.seek(subrecord_size, 1) #move forwards to the end of teh record
+			# defer decoding the beam arrays until they are first accessed
+			if lazy and subrecord_id in PINGSUBRECORDS:
+				self.pendingarrays.setdefault(PINGSUBRECORDS[subrecord_id], []).append((subrecord_id, self.fileptr.tell(), subrecord_size, self.getscalefactor(subrecord_id, subrecord_size / int(self.numbeams))))
+				if subrecord_id == 21:
+					# we still need the sonar settings from the imagery header, and we need to walk the beams to find the real end of the subrecord
+					self.readintensityheader()
+					self.skipintensitybeams()
+					if subrecord_size % 4 > 0:
+						self.fileptr.seek(4 - (subrecord_size % 4), 1) #pkpk we should not need this!!!
+				else:
+					self.fileptr.seek(subrecord_size, 1)
+				continue
+
+			self.readsubrecord(subrecord_id, subrecord_size)
+
+		# remove the deferred arrays so the first access goes through __getattr__ and decodes them
+		for name in self.pendingarrays:
+			self.forgetarray(name)
+		# leave the file pointer at the end of the record so the next datagram read is aligned, even if the record is padded
+		self.fileptr.seek(self.offset + self.numbytes, 0)
+		return
+
+	def forgetarray(self, name):
+		'''
+		remove a beam array from the ping, so the next access goes through __getattr__
+		'''
+		if name is None:
+			return
+		try:
+			delattr(self, name)
+		except AttributeError:
+			pass
+
+	def readsubrecord(self, subrecord_id, subrecord_size, scalefactor=None):
+		'''
+		decode a ping subrecord.  The file pointer needs to be at the start of the subrecord data.
+		scalefactor is the (multiplier, offset, compression flag, datatype) to decode with, looked up from the scale factor table if not given
+		'''
+		if scalefactor is None:
+			scalefactor = self.getscalefactor(subrecord_id, subrecord_size / int(self.numbeams))
+		scale, offset, compressionFlag, datatype = scalefactor
+		
+		if subrecord_id == 100: 
+			self.readscalefactors()
+		elif subrecord_id in PINGSUBRECORDS:
+			name = PINGSUBRECORDS[subrecord_id]
+			setattr(self, name, self.decodesubrecord(subrecord_id, subrecord_size, scalefactor, getattr(self, name)))
+		else:
+			# read to the end of the record to keep in alignment.  This permits us to not have all the decodes in place
+			self.fileptr.seek(subrecord_size, 1) #move forwards to the end of teh record
 		return
 
+	def decodesubrecord(self, subrecord_id, subrecord_size, scalefactor, values):
+		'''
+		decode a beam array subrecord and return the array, without setting it on the ping.  python lists are appended to values, in the same way as when a ping has more than one subrecord for an array
+		'''
+		scale, offset, compressionFlag, datatype = scalefactor
+		if subrecord_id == 21: 
+			values = self.readintensityarray(values, scale, offset, datatype, self.snippettype)
+			if subrecord_size % 4 > 0:
+				self.fileptr.seek(4 - (subrecord_size % 4), 1) #pkpk we should not need this!!!
+			return values
+		return self.readarray(values, scale, offset, datatype, PINGSUBRECORDS[subrecord_id])
+
+	def __getattr__(self, name):
+		'''
+		decode a beam array on first access when the ping was read lazily.  The array is only set on the ping, and removed from the pending arrays, once it has decoded, so a failed decode fails again on the next access
+		'''
+		if name not in PINGARRAYS:
+			raise AttributeError("%s object has no attribute %s" % (type(self).__name__, name))
+		pending = self.pendingarrays.get(name)
+		if pending is None:
+			# the ping does not have this array, so it is empty, as the same type the array would be decoded as
+			values = np.empty(0, self.floattype) if self.numpyarrays else []
+			setattr(self, name, values)
+			return values
+		if getattr(self.fileptr, 'closed', False):
+			raise ValueError("cannot decode %s as this lazily read ping has outlived its reader.  Access the arrays you need before closing the reader" % name)
+		curr = self.fileptr.tell()
+		values = []
+		for subrecord_id, offset, subrecord_size, scalefactor in pending:
+			self.fileptr.seek(offset, 0)
+			values = self.decodesubrecord(subrecord_id, subrecord_size, scalefactor, values)
+		self.fileptr.seek(curr, 0)
+		setattr(self, name, values)
+		del self.pendingarrays[name]
+		return values
+
 	def getscalefactor(self, ID, bytes_per_value):
-		for s in self.scalefactors:
-			if s.subrecordID == ID:			# DEPTH_ARRAY array
-				if bytes_per_value == 1:
-					datatype = 'B' 			#unsigned values
-				elif bytes_per_value == 2:
-					datatype = 'H'			#unsigned values
-					if ID == 2:				#ACROSS_TRACK_ARRAY array
-						datatype = 'h'		#unsigned values
-					if ID == 3:				#ACROSS_TRACK_ARRAY array
-						datatype = 'h'		#unsigned values
-					if ID == 5:				#beam angle array
-						datatype = 'h'		#unsigned values
-				elif bytes_per_value == 4:
-					datatype = 'L'			#unsigned values
-					if ID == 2:				#ACROSS_TRACK_ARRAY array
-						datatype = 'l'		#unsigned values
-					if ID == 5:				#beam angle array
-						datatype = 'l'		#unsigned values
-				else:
-					datatype = 'L'			#unsigned values not sure about this one.  needs test data
-				return s.multiplier, s.offset, s.compressionFlag, datatype
-		return 1,0,0, 'h'
+		return self.scalefactors.lookup(ID, bytes_per_value)
 
 	def readscalefactors(self):
 		# /* First four byte integer contains the number of scale factors */
@@ -395,19 +555,17 @@ class SWATH_BATHYMETRY_PING :
 		s = rec_unpack(data)
 		self.numscalefactors = s[0]
 
-		scalefmt = '>lll'
-		scalelen = struct.calcsize(scalefmt)
-		rec_unpack = struct.Struct(scalefmt).unpack
-
 		for i in range(self.numscalefactors):
-			data = self.fileptr.read(scalelen)
-			s = rec_unpack(data)
+			data = self.fileptr.read(SCALEFACTORSTRUCT.size)
+			s = SCALEFACTORSTRUCT.unpack(data)
 			sf = SCALEFACTOR()
 			sf.subrecordID = (s[0] & 0xFF000000) >> 24;
 			sf.compressionFlag = (s[0] & 0x00FF0000) >> 16;
 			sf.multiplier = s[1]
 			sf.offset = s[2]
-			self.scalefactors.append(sf)
+			# a later scale factor subrecord replaces the scale factors for the same beam array
+			self.scalefactors.update(sf)
+		self.scalefactors.source = self.offset
 		# print (self.scalefactors)
 		return
 
@@ -415,17 +573,9 @@ class SWATH_BATHYMETRY_PING :
 		''' 
 		read the time series intensity array type 21 subrecord
 		'''
-		hdrfmt = '>bl16s'
-		hdrlen = struct.calcsize(hdrfmt)
-		rec_unpack = struct.Struct(hdrfmt).unpack
-		hdr = self.fileptr.read(hdrlen)
-		s = rec_unpack(hdr)
-		bitspersample = s[0]
-		appliedcorrections = s[1]
-
-		# before we decode the intentisty data, read the sensor specific header
-		#for now just read the r2sonic as that is what we need.  For other sensors we need to implement decodes
-		self.decodeR2SonicImagerySpecific()
+		if self.numpyarrays:
+			return self.readnumpyintensityarray(scale, offset, snippettype)
+		self.readintensityheader()
 		
 		for b in range(self.numbeams):
 			hdrfmt = '>hh8s'
@@ -443,9 +593,9 @@ class SWATH_BATHYMETRY_PING :
 			rec_unpack = struct.Struct(fmt).unpack
 			
 			data = self.fileptr.read(l)  
-			raw = rec_unpack(data)
+			samples = rec_unpack(data)
 			# strip out zero values
-			raw = [s for s in raw if s != 0]
+			raw = [s for s in samples if s != 0]
 
 			if snippettype == SNIPPET_NONE:
 				snippets.append(0)
@@ -476,51 +626,148 @@ class SWATH_BATHYMETRY_PING :
 					snippets.append(max(raw) / scale + offset)
 				else:
 					snippets.append(0)
-			elif snippettype == SNIPPET_MEAN:
+			elif snippettype == SNIPPET_DETECT:
 				# populate with a single value as identified by the bottom detect
-				if bottomdetectsamplenumber > 0:
-					snippets.append ((raw[bottomdetectsamplenumber] / scale) + offset)
+				if bottomdetectsamplenumber > 0 and bottomdetectsamplenumber < len(samples):
+					snippets.append ((samples[bottomdetectsamplenumber] / scale) + offset)
 				else:
 					snippets.append (0)
+		return snippets
+
+	def readnumpyintensityarray(self, scale, offset, snippettype):
+		''' 
+		read the time series intensity array type 21 subrecord into numpy arrays.
+		the samples of every beam are gathered into one flat uint16 array, SNIPPET_SAMPLES, with the start and length of each beam in SNIPPET_OFFSETS and SNIPPET_LENGTHS and the bottom detect sample in SNIPPET_DETECTS.
+		the snippet reduction is then computed over all beams at once with reduceat
+		'''
+		self.readintensityheader()
+
+		# walk the beam headers so we know where the samples for each beam are.  This is the only per beam work
+		start = self.fileptr.tell()
+		if isinstance(self.fileptr, mmap.mmap):
+			buf = self.fileptr
+			base = start
+		else:
+			buf = self.fileptr.read(self.offset + self.numbytes - start)
+			base = 0
+		lengths = np.zeros(self.numbeams, dtype=np.int64)
+		detects = np.zeros(self.numbeams, dtype=np.int64)
+		wordoffsets = np.zeros(self.numbeams, dtype=np.int64)
+		position = base
+		for b in range(self.numbeams):
+			numsamples, bottomdetectsamplenumber = struct.unpack_from('>hh', buf, position)
+			numsamples = max(numsamples, 0)
+			lengths[b] = numsamples
+			detects[b] = bottomdetectsamplenumber
+			wordoffsets[b] = (position - base) // 2 + 6 # the 12 byte beam header is 6 words
+			position += 12 + numsamples * 2
+		self.fileptr.seek(start + position - base, 0)
+
+		# gather the samples from every beam into one flat array with a single fancy index
+		offsets = np.zeros(self.numbeams, dtype=np.int64)
+		offsets[1:] = np.cumsum(lengths)[:-1]
+		total = int(lengths.sum())
+		words = np.frombuffer(buf, dtype='>u2', count=(position - base) // 2, offset=base)
+		samples = words[np.arange(total) + np.repeat(wordoffsets - offsets, lengths)].astype(np.uint16)
+		del words
+
+		self.SNIPPET_SAMPLES = samples
+		self.SNIPPET_OFFSETS = offsets
+		self.SNIPPET_LENGTHS = lengths
+		self.SNIPPET_DETECTS = detects
+
+		snippets = np.zeros(self.numbeams)
+		if snippettype == SNIPPET_NONE or total == 0:
+			return snippets.astype(self.floattype)
+
+		# reduceat cannot handle empty beams, so only reduce the beams with samples.  The zero samples are stripped as per the list decode
+		beams = lengths > 0
+		starts = offsets[beams]
+		nonzero = samples != 0
+		counts = np.zeros(self.numbeams)
+		counts[beams] = np.add.reduceat(nonzero.astype(np.int64), starts)
+		valid = counts > 0
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			if snippettype == SNIPPET_MEAN:
+				# populate the array with the mean of all samples
+				sums = np.zeros(self.numbeams)
+				sums[beams] = np.add.reduceat(samples.astype(np.float64), starts)
+				snippets[valid] = sums[valid] / (counts[valid] / scale) + offset
+			elif snippettype == SNIPPET_MAX:
+				# populate the array with the MAX of all samples
+				maxima = np.zeros(self.numbeams)
+				maxima[beams] = np.maximum.reduceat(samples, starts)
+				snippets[valid] = maxima[valid] / scale + offset
+			elif snippettype == SNIPPET_DETECT:
+				# populate with a single value as identified by the bottom detect
+				detected = (detects > 0) & (detects < lengths)
+				snippets[detected] = samples[offsets[detected] + detects[detected]] / scale + offset
+			elif snippettype == SNIPPET_MEAN5DB:
+				# populate the array with the mean of all samples withing a 5dB range of the mean.  As per QPS
+				db = np.where(nonzero, 20.0 * np.log10(samples / scale + offset), 0.0)
+				dbsums = np.zeros(self.numbeams)
+				dbsums[beams] = np.add.reduceat(db, starts)
+				means = dbsums / counts
+				samplemeans = np.repeat(means, lengths)
+				cut = nonzero & (db < samplemeans + 5) & (db > samplemeans - 5)
+				cutcounts = np.zeros(self.numbeams)
+				cutsums = np.zeros(self.numbeams)
+				cutcounts[beams] = np.add.reduceat(cut.astype(np.int64), starts)
+				cutsums[beams] = np.add.reduceat(np.where(cut, db, 0.0), starts)
+				snippets = np.where(cutcounts > 0, cutsums / (cutcounts / scale) + offset, means / scale + offset)
+				snippets[~valid] = 0
+		return snippets.astype(self.floattype)
+
+	def readintensityheader(self):
+		''' 
+		read the header of the time series intensity array type 21 subrecord, including the sensor specific imagery information
+		'''
+		hdrfmt = '>bl16s'
+		hdrlen = struct.calcsize(hdrfmt)
+		rec_unpack = struct.Struct(hdrfmt).unpack
+		hdr = self.fileptr.read(hdrlen)
+		s = rec_unpack(hdr)
+		bitspersample = s[0]
+		appliedcorrections = s[1]
+
+		# before we decode the intentisty data, read the sensor specific header
+		#for now just read the r2sonic as that is what we need.  For other sensors we need to implement decodes
+		self.decodeR2SonicImagerySpecific()
+		return
+
+	def skipintensitybeams(self):
+		''' 
+		move the file pointer past the per beam time series without decoding the samples
+		'''
+		for b in range(self.numbeams):
+			numsamples = struct.unpack('>h', self.fileptr.read(2))[0]
+			self.fileptr.seek(10 + numsamples * 2, 1)
 		return
 
 ###############################################################################
-	def R2Soniccorrection(self):
-		'''entry point for r2sonic backscatter TVG, Gain and footprint correction algorithm'''
+	def R2Soniccorrection(self, correct=False):
+		'''entry point for r2sonic backscatter TVG, Gain and footprint correction algorithm.  The raw samples are returned unless correct is set'''
 		if self.perbeam:
 			samplearray = self.MEAN_REL_AMPLITUDE_ARRAY
-			return samplearray
 		else:
 			samplearray = self.SNIPPET_SERIES_ARRAY
+		if not correct or len(samplearray) == 0:
 			return samplearray
-		# an implementation of the backscatter correction algorithm from Norm Campbell at CSIRO
-		H0_TxPower = self.transmitsourcelevel
-		H0_SoundSpeed = self.soundspeed
-		H0_RxAbsorption = self.absorptioncoefficient
-		H0_TxBeamWidthVert = self.beamwidthvertical
-		H0_TxBeamWidthHoriz = self.beamwidthhorizontal
-		H0_TxPulseWidth = self.pulsewidth
-		H0_RxSpreading = self.receiverspreadingloss
-		H0_RxGain = self.receivergain
-		H0_VTX_Offset = self.vtxoffset
-
-		for i in range(self.numbeams):
-			if self.BEAM_FLAGS_ARRAY[i] < 0:
-				continue
-			S1_angle = self.BEAM_ANGLE_ARRAY[i] #angle in degrees
-			S1_twtt = self.TRAVEL_TIME_ARRAY[i]
-			S1_range = math.sqrt((self.ACROSS_TRACK_ARRAY[i] ** 2) + (self.ALONG_TRACK_ARRAY[i] ** 2))
-			if samplearray[i] != 0:
-				S1_uPa = samplearray[i]
-				# adjusted = 0				
-				# a test on request from Norm....
-				# adjusted = 20 * math.log10(S1_uPa) - 100
-				# the formal adjustment from Norm Campbell...
-				# if i == 127:
-				adjusted = self.backscatteradjustment( S1_angle, S1_twtt, S1_range, S1_uPa, H0_TxPower, H0_SoundSpeed, H0_RxAbsorption, H0_TxBeamWidthVert, H0_TxBeamWidthHoriz, H0_TxPulseWidth, H0_RxSpreading, H0_RxGain, H0_VTX_Offset)
-				
-				samplearray[i] = adjusted
-		return samplearray
+		# an implementation of the backscatter correction algorithm from Norm Campbell at CSIRO, applied to all beams at once
+		samples = np.asarray(samplearray, dtype=np.float64)
+		across = np.asarray(self.ACROSS_TRACK_ARRAY, dtype=np.float64)
+		along = np.asarray(self.ALONG_TRACK_ARRAY, dtype=np.float64)
+		S1_range = np.sqrt((across ** 2) + (along ** 2))
+		adjusted = backscatteradjustmentarray(self.BEAM_ANGLE_ARRAY, self.TRAVEL_TIME_ARRAY, S1_range, samples, self.transmitsourcelevel, self.soundspeed, self.absorptioncoefficient, self.beamwidthvertical, self.beamwidthhorizontal, self.pulsewidth, self.receiverspreadingloss, self.receivergain, self.vtxoffset)
+		# flagged beams and empty samples are passed through untouched
+		keep = samples == 0
+		if len(self.BEAM_FLAGS_ARRAY) > 0:
+			keep |= np.asarray(self.BEAM_FLAGS_ARRAY) < 0
+		adjusted = np.where(keep, samples, adjusted)
+		if self.numpyarrays:
+			return adjusted.astype(self.floattype, copy=False)
+		return adjusted.tolist()
 
 ###############################################################################
 	def backscatteradjustment(self, S1_angle, S1_twtt, S1_range, S1_Magnitude, H0_TxPower, H0_SoundSpeed, H0_RxAbsorption, H0_TxBeamWidthVert, H0_TxBeamWidthHoriz, H0_TxPulseWidth, H0_RxSpreading, H0_RxGain, H0_VTX_Offset):
@@ -674,20 +921,43 @@ class SWATH_BATHYMETRY_PING :
 		spare = raw[32]
 		return		
 
-	def readarray(self, values, scale, offset, datatype):
+	def readarray(self, values, scale, offset, datatype, name=None):
 		''' 
 		read the ping array data
 		'''
-		fmt = '>' + str(self.numbeams) + datatype
-		l = struct.calcsize(fmt)
-		rec_unpack = struct.Struct(fmt).unpack
-		
-		data = self.fileptr.read(l) 
-		raw = rec_unpack(data)
+		if self.numpyarrays:
+			return self.readnumpyarray(scale, offset, datatype, name)
+		key = (self.numbeams, datatype)
+		rec_struct = ARRAYSTRUCTS.get(key)
+		if rec_struct is None:
+			rec_struct = ARRAYSTRUCTS[key] = struct.Struct('>' + str(self.numbeams) + datatype)
+
+		data = self.fileptr.read(rec_struct.size) 
+		raw = rec_struct.unpack(data)
 		for d in raw:
 			values.append((d / scale) + offset)
 		return values
 
+	def readnumpyarray(self, scale, offset, datatype, name=None):
+		''' 
+		read the ping array data into a numpy array.  The raw values are decoded straight from the file buffer and scaled in one vectorised operation.
+		when the ping is reused, the values are scaled into a buffer kept for the named array, so the array is only valid until the next ping is read
+		'''
+		raw = bufferarray(self.fileptr, self.fileptr.tell(), NUMPYDTYPES[datatype], self.numbeams)
+		self.fileptr.seek(raw.nbytes, 1)
+		if self.reuse and name is not None:
+			if self.buffers is None:
+				self.buffers = {}
+			buffer = self.buffers.get(name)
+			if buffer is None or len(buffer) < len(raw) or buffer.dtype != self.floattype:
+				buffer = self.buffers[name] = np.empty(max(len(raw), 512), dtype=self.floattype)
+			values = buffer[:len(raw)]
+			np.divide(raw, scale, out=values)
+			values += offset
+			return values
+		values = (raw / scale) + offset
+		return values.astype(self.floattype, copy=False)
+
 	def currentRecordDateTime(self):
 		return self.from_timestamp(self.time)
 
@@ -728,24 +998,218 @@ class GSFHEADER:
 		return
 
 
+###############################################################################
+class GSF_RECORD:
+	'''
+	the common parts of the record classes.  The record is only decoded when the user calls read(), which each record class provides
+	'''
+	recordname = "record"
+
+	def __init__(self, fileptr, numbytes, recordidentifier, hdrlen):
+		self.recordidentifier = recordidentifier	# assign the GSF code for this datagram type
+		self.offset = fileptr.tell()				# remember where this packet resides in the file so we can return if needed
+		self.hdrlen = hdrlen						# remember the header length.  it should be 8 bytes, bout if checksum then it is 12
+		self.numbytes = numbytes					# remember how many bytes this packet contains
+		self.fileptr = fileptr						# remember the file pointer so we do not need to pass from the host process
+		self.fileptr.seek(numbytes, 1)				# move the file pointer to the end of the record so we can skip as the default actions
+		self.name = self.recordname
+
+	def __str__(self):
+		'''
+		pretty print this class
+		'''
+		return pprint.pformat(vars(self))
+
+###############################################################################
+class ATTITUDE_RECORD(GSF_RECORD):
+	recordname = "Attitude"
+
+	def read(self):
+		'''
+		decode the attitude measurements into a numpy structured array (see ATTITUDEDTYPE) of time, pitch, roll, heave and heading in one step
+		'''
+		self.fileptr.seek(self.offset + self.hdrlen, 0)
+		data = self.fileptr.read(self.numbytes - self.hdrlen)
+		seconds, nanoseconds, self.numbermeasurements = ATTITUDEHEADERSTRUCT.unpack_from(data)
+		self.time = seconds + nanoseconds / 1000000000.0
+		raw = np.frombuffer(data, dtype=ATTITUDERAWDTYPE, count=self.numbermeasurements, offset=ATTITUDEHEADERSTRUCT.size)
+		self.attitude = scaleattitude(raw, self.time)
+		return self.attitude
+
+###############################################################################
+class SOUND_VELOCITY_PROFILE_RECORD(GSF_RECORD):
+	recordname = "SoundVelocityProfile"
+
+	def read(self):
+		'''
+		decode the profile.  the depths (m) and sound speeds (m/s) are decoded into numpy arrays
+		'''
+		self.fileptr.seek(self.offset + self.hdrlen, 0)
+		data = self.fileptr.read(self.numbytes - self.hdrlen)
+		s = SVPHEADERSTRUCT.unpack_from(data)
+		self.time				= s[0] + s[1] / 1000000000.0	# the time the profile was observed
+		self.applicationtime	= s[2] + s[3] / 1000000000.0	# the time the profile was applied to the pings
+		self.longitude			= s[4] / 10000000
+		self.latitude			= s[5] / 10000000
+		self.numberpoints		= s[6]
+		raw = np.frombuffer(data, dtype='>u4', count=self.numberpoints * 2, offset=SVPHEADERSTRUCT.size).reshape(-1, 2)
+		self.depth = raw[:, 0] / 100
+		self.soundspeed = raw[:, 1] / 100
+		return
+
+###############################################################################
+class NAVIGATION_ERROR_RECORD(GSF_RECORD):
+	recordname = "NavigationError"
+
+	def read(self):
+		'''
+		decode the obsolete navigation error record.  the errors are in metres
+		'''
+		self.fileptr.seek(self.offset + self.hdrlen, 0)
+		s = NAVIGATIONERRORSTRUCT.unpack(self.fileptr.read(NAVIGATIONERRORSTRUCT.size))
+		self.time				= s[0] + s[1] / 1000000000.0
+		self.recordid			= s[2]		# the record this error applies to
+		self.longitudeerror		= s[3] / 10
+		self.latitudeerror		= s[4] / 10
+		return
+
+###############################################################################
+class HV_NAVIGATION_ERROR_RECORD(GSF_RECORD):
+	recordname = "HVNavigationError"
+
+	def read(self):
+		'''
+		decode the horizontal and vertical navigation error record.  the errors are in metres
+		'''
+		self.fileptr.seek(self.offset + self.hdrlen, 0)
+		data = self.fileptr.read(self.numbytes - self.hdrlen)
+		s = HVNAVIGATIONERRORSTRUCT.unpack_from(data)
+		self.time				= s[0] + s[1] / 1000000000.0
+		self.recordid			= s[2]		# the record this error applies to
+		self.horizontalerror	= s[3] / 1000
+		self.verticalerror		= s[4] / 1000
+		self.sepuncertainty		= s[5] / 100
+		positiontypelength		= s[7]
+		self.positiontype		= data[HVNAVIGATIONERRORSTRUCT.size:HVNAVIGATIONERRORSTRUCT.size + positiontypelength].decode('utf-8', 'ignore').rstrip('\x00')
+		return
+
+###############################################################################
+class PROCESSING_PARAMETERS_RECORD(GSF_RECORD):
+	recordname = "ProcessingParameters"
+
+	def read(self):
+		'''
+		decode the processing parameters.  each parameter is stored as a "NAME=value" string, which we decode into the parameters dictionary
+		'''
+		self.fileptr.seek(self.offset + self.hdrlen, 0)
+		data = self.fileptr.read(self.numbytes - self.hdrlen)
+		seconds, nanoseconds, numberparameters = PARAMETERSHEADERSTRUCT.unpack_from(data)
+		self.time = seconds + nanoseconds / 1000000000.0
+		self.parameters = {}
+		position = PARAMETERSHEADERSTRUCT.size
+		for i in range(numberparameters):
+			size = struct.unpack_from('>H', data, position)[0]
+			text = data[position + 2:position + 2 + size].decode('utf-8', 'ignore').rstrip('\x00')
+			position += 2 + size
+			name, separator, value = text.partition('=')
+			self.parameters[name.strip()] = value.strip()
+		return
+
+# the classes which decode the other record types, keyed on record identifier
+RECORDCLASSES = {ATTITUDE: ATTITUDE_RECORD, SOUND_VELOCITY_PROFILE: SOUND_VELOCITY_PROFILE_RECORD, NAVIGATION_ERROR: NAVIGATION_ERROR_RECORD, HV_NAVIGATION_ERROR: HV_NAVIGATION_ERROR_RECORD, PROCESSING_PARAMETERS: PROCESSING_PARAMETERS_RECORD}
+
 ###############################################################################
 class GSFREADER:
-	def __init__(self, filename, loadscalefactors=False):
+	def __init__(self, filename, loadscalefactors=False, numpyarrays=False, useindex=True, backend="mmap"):
 		'''
 		class to read generic sensor format files.
+		set numpyarrays to decode the ping beam arrays into numpy arrays instead of python lists
+		set useindex to load the record index from the sidecar file, building and saving it if it is missing or out of date
+		set backend to "mmap" to read through a read only memory map, or "pread" to read through a block cache, which is often faster on network file systems
 		'''
 		if not os.path.isfile(filename):
 			print ("file not found:", filename)
 		self.fileName = filename
 		self.fileSize = os.path.getsize(filename)
-		f = open(filename, 'r+b')		
-		self.fileptr = mmap.mmap(f.fileno(), 0)
+		if backend not in ("mmap", "pread"):
+			raise ValueError("unknown backend %s, use mmap or pread" % backend)
+		self.backend = backend
+		self.access = None
+		self.fileptr = self.openfile()
 		self.hdrfmt = ">LL"
 		self.hdrlen = struct.calcsize(self.hdrfmt)
-		self.scalefactors = []
+		self.scalefactors = SCALEFACTORTABLE()
+		self.numpyarrays = numpyarrays
+		self.index = None
+		self.pingoffsets = None
+		self.pinghdrlens = None
+		self.pingtimes = None
+		self.pingorder = None
+		self.pingscalefactors = None
+		self.pingscalecarriers = None
+		if useindex:
+			self.index = self.loadindex()
 		if loadscalefactors:
 			self.scalefactors = self.loadscalefactors()
 
+	def openfile(self):
+		'''
+		open the file with the reader backend.  An empty file cannot be memory mapped, e.g. one the logger has only just created, so it is read with pread until it grows
+		'''
+		if self.backend == "mmap" and self.fileSize > 0:
+			with open(self.fileName, 'rb') as f:
+				return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		return PREADFILE(self.fileName)
+
+	def refresh(self):
+		'''
+		pick up anything appended to the file since it was opened, e.g. while it is still being logged.  The memory map is closed and replaced by a larger one, and the record index is extended by scanning just the new records.
+		records read before the refresh point at the old map, so decode them before refreshing.  returns the number of bytes the file has grown by
+		'''
+		size = os.path.getsize(self.fileName)
+		if size <= self.fileSize:
+			return 0
+		grown = size - self.fileSize
+		curr = self.fileptr.tell()
+		self.fileSize = size
+		if self.backend == "mmap":
+			try:
+				self.fileptr.close()
+			except BufferError:
+				pass # numpy arrays still view the old map, so it is closed when they are collected
+			self.fileptr = self.openfile()
+			self.access = None
+		else:
+			self.fileptr.size = size
+		self.fileptr.seek(curr, 0)
+
+		if self.index is not None:
+			start = int(self.index['offset'][-1]) + int(self.index['numberofbytes'][-1]) if len(self.index) > 0 else 0
+			self.index = np.concatenate((self.index, self.buildindex(start)))
+		self.pingoffsets = None
+		self.pinghdrlens = None
+		self.pingtimes = None
+		self.pingorder = None
+		self.pingscalefactors = None
+		self.pingscalecarriers = None
+		return grown
+
+	def follow(self, types=None, interval=1.0, timeout=None):
+		'''
+		generator which yields (numberofbytes, recordidentifier, datagram) for every record from the current position, in the same way as records(), and then waits for the file to grow and yields the new records as they are completed.  A partly written record at the end of the file is left until it is complete.
+		the file is checked every interval seconds.  set timeout to stop once the file has not grown for that many seconds, otherwise follow until the caller stops
+		'''
+		lastgrowth = time.time()
+		while True:
+			for record in self.records(types):
+				yield record
+			if self.refresh() > 0:
+				lastgrowth = time.time()
+				continue
+			if timeout is not None and time.time() - lastgrowth >= timeout:
+				return
+			time.sleep(interval)
+
 	def moreData(self):
 		bytesRemaining = self.fileSize - self.fileptr.tell()
 		# print ("current file ptr position: %d size %d" % ( self.fileptr.tell(), self.fileSize))
@@ -759,6 +1223,19 @@ class GSFREADER:
 		close the file
 		'''
 		self.fileptr.close()
+
+	def advise(self, access):
+		'''
+		tell the operating system how we are about to read the file, e.g. mmap.MADV_SEQUENTIAL for a scan or mmap.MADV_RANDOM for indexed access, so it can tune read ahead.
+		this only applies to memory maps on platforms with madvise, and is only passed on when the access pattern changes
+		'''
+		if access is None or access == self.access or not hasattr(self.fileptr, 'madvise'):
+			return
+		try:
+			self.fileptr.madvise(access)
+			self.access = access
+		except (OSError, ValueError):
+			pass
 		
 	def rewind(self):
 		'''
@@ -785,68 +1262,557 @@ class GSFREADER:
 		rewind, load the scale factors array and rewind to the original position.  We can then use these scalefactors for every ping
 		'''
 		curr = self.fileptr.tell()
+		if self.index is not None:
+			pingoffsets = self.index['offset'][self.index['recordidentifier'] == SWATH_BATHYMETRY]
+			if len(pingoffsets) == 0:
+				return None
+			self.fileptr.seek(int(pingoffsets[0]), 0)
+			numberofbytes, recordidentifier, datagram = self.readDatagram()
+			datagram.read(lazy=True)
+			self.fileptr.seek(curr, 0)
+			return datagram.scalefactors
+
 		self.rewind()
 
-		while self.moreData():
-			numberofbytes, recordidentifier, datagram = self.readDatagram()
-			if recordidentifier == SWATH_BATHYMETRY:
-				datagram.read()
-				self.fileptr.seek(curr, 0)
-				return datagram.scalefactors
+		for numberofbytes, recordidentifier, datagram in self.records(SWATH_BATHYMETRY):
+			datagram.read(lazy=True)
+			self.fileptr.seek(curr, 0)
+			return datagram.scalefactors
 		self.fileptr.seek(curr, 0)
 		return None
 	
 	def loadnavigation(self):
 		'''
-		rewind, load the navigation from the bathy records and rewind
+		load the navigation from the ping headers as a list of [time, longitude, latitude]
 		'''
-		navigation = []
-		curr = self.fileptr.tell()
-		self.rewind()
-
-		while self.moreData():
-			numberofbytes, recordidentifier, datagram = self.readDatagram()
-			if recordidentifier == SWATH_BATHYMETRY:
-				datagram.read(True)
-				navigation.append([datagram.time + datagram.pingnanotime/1000000000.0, datagram.longitude, datagram.latitude])
-		self.fileptr.seek(curr, 0)
+		headers = self.ping_headers()
+		navigation = np.column_stack((headers['time'], headers['longitude'], headers['latitude'])).tolist()
 		print ("Navigation records loaded:", len(navigation))
 		return navigation
 		
+	def loadattitude(self):
+		'''
+		load every attitude measurement in the file into one numpy structured array (see ATTITUDEDTYPE) of time, pitch, roll, heave and heading.  Pass it to ATTITUDESTORE to interpolate the motion at any time.
+		the record index tells us where each attitude record is, so the measurements are gathered straight from the file buffer in one step, rather than decoded record by record
+		'''
+		if self.index is None:
+			self.index = self.buildindex()
+		records = self.index[self.index['recordidentifier'] == ATTITUDE]
+		starts = (records['offset'] + records['hdrlen']).astype(np.int64)
+		headers = gatherbytes(self.fileptr, starts[:, np.newaxis] + np.arange(ATTITUDEHEADERSTRUCT.size))
+		counts = headers[:, 8:10].copy().view('>u2').ravel().astype(np.int64)
+		# never read past the end of a record which claims more measurements than it holds
+		counts = np.minimum(counts, (records['numberofbytes'].astype(np.int64) - records['hdrlen'] - ATTITUDEHEADERSTRUCT.size) // ATTITUDERAWDTYPE.itemsize)
+		times = headers[:, :8].copy().view('>i4').astype(np.float64)
+		basetimes = times[:, 0] + times[:, 1] / 1000000000.0
+
+		record = np.repeat(np.arange(len(records)), counts)
+		measurement = np.arange(len(record)) - np.repeat(np.cumsum(counts) - counts, counts)
+		positions = starts[record] + ATTITUDEHEADERSTRUCT.size + measurement * ATTITUDERAWDTYPE.itemsize
+		raw = gatherbytes(self.fileptr, positions[:, np.newaxis] + np.arange(ATTITUDERAWDTYPE.itemsize)).view(ATTITUDERAWDTYPE).ravel()
+		return scaleattitude(raw, basetimes[record])
+
 	def getrecordcount(self):
 		'''
 		rewind, count the number of ping records as fast as possible.  useful for progress bars
 		'''
-		numpings = 0
+		if self.index is not None:
+			return int(np.count_nonzero(self.index['recordidentifier'] == SWATH_BATHYMETRY))
+		return int(np.count_nonzero(self.scanrecords()['recordidentifier'] == SWATH_BATHYMETRY))
+
+	def loadpingtable(self):
+		'''
+		make the table of ping offsets and times from the record index so we can jump straight to any ping.  The times are also sorted so we can bisect on them, even if the pings are not in time order
+		'''
+		if self.index is None:
+			self.index = self.buildindex()
+		pings = self.index[self.index['recordidentifier'] == SWATH_BATHYMETRY]
+		self.pingoffsets = pings['offset']
+		self.pinghdrlens = pings['hdrlen']
+		self.pingtimes = pings['time']
+		self.pingorder = np.argsort(self.pingtimes, kind='stable')
+
+	def loadpingscalefactors(self):
+		'''
+		flag the pings which carry a scale factor subrecord.  GSF writes the scale factors as the first subrecord after the ping header, so we only need to look at one byte per ping
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		sizes = self.index['numberofbytes'][self.index['recordidentifier'] == SWATH_BATHYMETRY].astype(np.int64)
+		positions = (self.pingoffsets + self.pinghdrlens).astype(np.int64) + PINGHEADERRAWDTYPE.itemsize
+		hassubrecord = positions + 4 <= self.pingoffsets.astype(np.int64) + sizes
+		firstsubrecord = gatherbytes(self.fileptr, np.where(hassubrecord, positions, 0)[:, np.newaxis])[:, 0]
+		self.pingscalefactors = hassubrecord & (firstsubrecord == 100)
+		self.pingscalecarriers = scalecarriers(self.pingscalefactors)
+		return self.pingscalefactors
+
+	def loadscalefactorsat(self, i):
+		'''
+		load the scale factors in effect at ping number i, which come from the most recent ping at or before i carrying a scale factor subrecord.  The reader scale factors are updated in place so pings which share them see the change.
+		nothing is decoded if the table already holds the scale factors of that ping, e.g. when reading pings in order.  pings before the first scale factor subrecord have no scale factors, so the table is cleared
+		'''
+		if self.pingscalecarriers is None:
+			self.loadpingscalefactors()
+		carrier = int(self.pingscalecarriers[i])
+		if carrier < 0:
+			if len(self.scalefactors) > 0:
+				self.scalefactors.clear()
+			return self.scalefactors
+		if self.scalefactors.source == int(self.pingoffsets[carrier]):
+			return self.scalefactors
 		curr = self.fileptr.tell()
-		self.rewind()
+		self.fileptr.seek(int(self.pingoffsets[carrier]), 0)
+		numberofbytes, recordidentifier, datagram = self.readDatagram()
+		datagram.scalefactors = SCALEFACTORTABLE()
+		datagram.read(lazy=True)
+		self.fileptr.seek(curr, 0)
+		self.scalefactors.copyfrom(datagram.scalefactors)
+		return self.scalefactors
 
-		while self.moreData():
-			numberofbytes, recordidentifier, datagram = self.readDatagram()
+	def readping(self, offset, headeronly=False, numpyarrays=None, lazy=False):
+		'''
+		decode the ping record at offset in the file and restore the file pointer.  The scale factors in effect at the ping are loaded first, so random access works from anywhere in the file, even if the scale factors change part way through
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		i = int(np.searchsorted(self.pingoffsets, offset))
+		if i < len(self.pingoffsets) and self.pingoffsets[i] == offset:
+			self.loadscalefactorsat(i)
+		elif len(self.scalefactors) == 0:
+			self.scalefactors = self.loadscalefactors() or self.scalefactors
+		self.advise(MADV_RANDOM)
+		curr = self.fileptr.tell()
+		self.fileptr.seek(int(offset), 0)
+		numberofbytes, recordidentifier, datagram = self.readDatagram()
+		if numpyarrays is not None:
+			datagram.numpyarrays = numpyarrays
+		datagram.read(headeronly, lazy)
+		self.fileptr.seek(curr, 0)
+		return datagram
+
+	def ping(self, i, headeronly=False, lazy=False):
+		'''
+		return the decoded ping with ping number i in the file (zero based, negative numbers count from the end of the file)
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		return self.readping(self.pingoffsets[i], headeronly, lazy=lazy)
+
+	def ping_at_time(self, t, headeronly=False):
+		'''
+		return the decoded ping closest in time to t, which can be a unix timestamp or a datetime.  We bisect on the ping times so this is O(log n)
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		if len(self.pingoffsets) == 0:
+			return None
+		if isinstance(t, datetime):
+			t = (t - datetime(1970, 1, 1)).total_seconds()
+		sortedtimes = self.pingtimes[self.pingorder]
+		i = int(np.searchsorted(sortedtimes, t))
+		if i == len(sortedtimes) or (i > 0 and t - sortedtimes[i-1] <= sortedtimes[i] - t):
+			i -= 1
+		return self.readping(self.pingoffsets[self.pingorder[i]], headeronly)
+
+	def pings_between(self, t0, t1, headeronly=False):
+		'''
+		generator which decodes the pings with t0 <= time <= t1 in time order.  t0 and t1 can be unix timestamps or datetimes
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		if isinstance(t0, datetime):
+			t0 = (t0 - datetime(1970, 1, 1)).total_seconds()
+		if isinstance(t1, datetime):
+			t1 = (t1 - datetime(1970, 1, 1)).total_seconds()
+		sortedtimes = self.pingtimes[self.pingorder]
+		first = int(np.searchsorted(sortedtimes, t0, side='left'))
+		last = int(np.searchsorted(sortedtimes, t1, side='right'))
+		for i in self.pingorder[first:last]:
+			yield self.readping(self.pingoffsets[i], headeronly)
+
+	def ping_headers(self, start=0, count=None):
+		'''
+		return the header of every ping as a numpy structured array (see PINGHEADERDTYPE), including the full precision time.
+		the headers are at a fixed position in each ping record, so we gather them straight from the file buffer without decoding any subrecords
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		if count is None:
+			count = len(self.pingoffsets) - start
+		offsets = self.pingoffsets[start:start+count]
+		hdrlens = self.pinghdrlens[start:start+count]
+
+		positions = (offsets + hdrlens).astype(np.int64)[:, np.newaxis] + np.arange(PINGHEADERRAWDTYPE.itemsize)
+		raw = gatherbytes(self.fileptr, positions).view(PINGHEADERRAWDTYPE).ravel()
+
+		headers = np.zeros(len(offsets), dtype=PINGHEADERDTYPE)
+		headers['offset'] = offsets
+		headers['time'] = raw['time'] + raw['nanotime'] / 1000000000.0
+		headers['longitude'] = raw['longitude'] / 10000000
+		headers['latitude'] = raw['latitude'] / 10000000
+		for name in ['numbeams', 'centrebeam', 'pingflags', 'reserved', 'spare']:
+			headers[name] = raw[name]
+		for name in ['tidecorrector', 'depthcorrector', 'heading', 'pitch', 'roll', 'heave', 'course', 'speed', 'height', 'separation', 'gpstidecorrector']:
+			headers[name] = raw[name] / 100
+		return headers
+
+	def read_pings(self, start=0, count=None, fields=None, masked=False, workers=1):
+		'''
+		decode count pings from ping number start into numpy arrays in one call.
+		the header fields are returned as 1-D arrays and the beam arrays listed in fields as 2-D (npings, maxbeams) arrays.
+		beams beyond the number of beams in a ping, or arrays missing from a ping, are NaN.  Set masked to return numpy masked arrays instead
+		set workers to split the pings into ranges which are decoded in parallel by worker processes, each with its own reader.  0 uses all cores
+		returns a dictionary of arrays keyed on the field name
+		'''
+		if self.pingoffsets is None:
+			self.loadpingtable()
+		if start < 0:
+			start += len(self.pingoffsets)
+		if count is None:
+			count = len(self.pingoffsets) - start
+		offsets = self.pingoffsets[start:start+count]
+		if fields is None:
+			fields = PINGARRAYFIELDS
+		npings = len(offsets)
+		if workers == 0:
+			workers = os.cpu_count() or 1
+		if workers > 1 and npings > 1:
+			return self.read_pings_parallel(start, npings, fields, masked, workers)
+
+		# the ping headers give us the number of beams, so we can size the arrays before decoding any pings
+		headers = self.ping_headers(start, count)
+		numbeams = headers['numbeams']
+		maxbeams = int(numbeams.max()) if npings > 0 else 0
+
+		result = {}
+		for name in PINGHEADERFIELDS:
+			result[name] = headers[name]
+		for name in fields:
+			result[name] = np.full((npings, maxbeams), np.nan)
+
+		# the scale factors may change part way through a file, so start from those in effect at the first ping
+		if npings > 0:
+			self.loadscalefactorsat(start)
+		for i, offset in enumerate(offsets):
+			datagram = self.readping(offset, numpyarrays=True, lazy=True)
+			for name in fields:
+				values = getattr(datagram, name)
+				result[name][i, :len(values)] = values
+
+		if masked:
+			mask = np.arange(maxbeams) >= numbeams[:, np.newaxis]
+			for name in fields:
+				result[name] = np.ma.masked_array(result[name], mask=mask | np.isnan(result[name]))
+		return result
+
+	def read_pings_parallel(self, start, count, fields, masked, workers):
+		'''
+		decode a range of pings by splitting it into one contiguous range per worker.  each worker is given the ping offsets of its range and the offset of the ping holding the scale factors in effect at the start of it, so it can open its own reader and decode straight away without indexing the file.  the results are joined back together in ping order
+		'''
+		if self.pingscalecarriers is None:
+			self.loadpingscalefactors()
+		chunks = [c for c in np.array_split(np.arange(start, start + count), min(workers, count)) if len(c) > 0]
+		jobs = []
+		for c in chunks:
+			first, last = int(c[0]), int(c[-1]) + 1
+			carrier = int(self.pingscalecarriers[first])
+			jobs.append((self.fileName, self.pingoffsets[first:last], self.pinghdrlens[first:last], self.pingscalefactors[first:last], int(self.pingoffsets[carrier]) if carrier >= 0 else None, fields))
+		with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+			results = list(executor.map(readpingschunk, *zip(*jobs)))
+
+		maxbeams = max(r[fields[0]].shape[1] for r in results) if len(fields) > 0 else 0
+		result = {}
+		for name in PINGHEADERFIELDS:
+			result[name] = np.concatenate([r[name] for r in results])
+		for name in fields:
+			result[name] = np.full((count, maxbeams), np.nan)
+			row = 0
+			for r in results:
+				values = r[name]
+				result[name][row:row+len(values), :values.shape[1]] = values
+				row += len(values)
+
+		if masked:
+			mask = np.arange(maxbeams) >= result['numbeams'][:, np.newaxis]
+			for name in fields:
+				result[name] = np.ma.masked_array(result[name], mask=mask | np.isnan(result[name]))
+		return result
+
+	def indexfilename(self):
+		'''the name of the sidecar file which holds the record index'''
+		return self.fileName + INDEXEXTENSION
+
+	def loadindex(self):
+		'''
+		load the record index from the sidecar file.  If the sidecar is missing, or the gsf file has changed size or modification time since the index was made, rebuild the index and save it.
+		a sidecar which is short, the wrong size for its record count, or which points past the end of the gsf file is treated as stale
+		'''
+		stat = os.stat(self.fileName)
+		headerlen = struct.calcsize(INDEXHEADERFMT)
+		try:
+			with open(self.indexfilename(), 'rb') as f:
+				s = struct.unpack(INDEXHEADERFMT, f.read(headerlen))
+				if s[0] == INDEXMAGIC and s[1] == INDEXVERSION and s[3] == stat.st_size and s[4] == stat.st_mtime_ns and os.fstat(f.fileno()).st_size == headerlen + s[5] * INDEXDTYPE.itemsize:
+					index = np.fromfile(f, dtype=INDEXDTYPE, count=s[5])
+					if len(index) == s[5] and (len(index) == 0 or int(index['offset'][-1]) + int(index['numberofbytes'][-1]) <= stat.st_size):
+						return index
+		except (OSError, ValueError, struct.error):
+			pass
+
+		index = self.buildindex()
+		self.saveindex(index, stat)
+		return index
+
+	def saveindex(self, index, stat):
+		'''
+		write the record index to the sidecar file.  If we cannot write alongside the gsf file (e.g. a read only archive), keep the index in memory only.
+		the index is written to a temporary file in the same folder and then renamed over the sidecar, so another process loading the index never sees a partly written file
+		'''
+		folder, name = os.path.split(self.indexfilename())
+		tempname = None
+		try:
+			fd, tempname = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=folder or ".")
+			with os.fdopen(fd, 'wb') as f:
+				f.write(struct.pack(INDEXHEADERFMT, INDEXMAGIC, INDEXVERSION, 0, stat.st_size, stat.st_mtime_ns, len(index)))
+				index.tofile(f)
+			os.replace(tempname, self.indexfilename())
+		except OSError as e:
+			print ("unable to save record index:", e)
+			if tempname is not None and os.path.exists(tempname):
+				os.remove(tempname)
+
+	def scanrecords(self, start=0):
+		'''
+		walk the record headers of the whole file in one pass, without moving the file pointer.  This is the fast base layer for the index, record counts and subset files.
+		set start to the offset of a record to scan from there to the end of the file
+		returns a numpy structured array (see RECORDDTYPE) of the offset, record identifier, payload size and checksum flag of every complete record
+		'''
+		self.advise(MADV_SEQUENTIAL)
+		readheader = headerreader(self.fileptr, self.hdrfmt)
+		filesize = self.fileSize
+		hdrlen = self.hdrlen
+		records = []
+		offset = start
+		while offset + hdrlen <= filesize:
+			sizeofdata, recordidentifier = readheader(offset)
+			haschecksum = recordidentifier & 0x80000000
+			numberofbytes = sizeofdata + hdrlen + 4 if haschecksum else sizeofdata + hdrlen
+			if offset + numberofbytes > filesize:
+				break # a truncated record at the end of the file
+			records.append((offset, recordidentifier & 0x003FFFFF, sizeofdata, haschecksum))
+			offset += numberofbytes
+		return np.array(records, dtype=RECORDDTYPE)
+
+	def buildindex(self, start=0, recover=False):
+		'''
+		scan the file once and make a table of record offset, type, size and time.  Only the record and time headers are read, so this is fast.
+		set start to the offset of a record to index from there to the end of the file.  set recover to index a damaged file with recoverrecords, skipping over the damage
+		'''
+		if recover:
+			scan, skipped = self.recoverrecords(start)
+			for first, last in skipped:
+				print ("skipped %d damaged bytes from offset %d to %d" % (last - first, first, last))
+		else:
+			scan = self.scanrecords(start)
+		index = np.zeros(len(scan), dtype=INDEXDTYPE)
+		index['offset'] = scan['offset']
+		index['recordidentifier'] = scan['recordidentifier']
+		index['hdrlen'] = np.where(scan['haschecksum'], self.hdrlen + 4, self.hdrlen)
+		index['numberofbytes'] = scan['sizeofdata'] + index['hdrlen']
+		index['time'] = math.nan
+
+		# every record other than the file header starts with a seconds, nanoseconds timestamp
+		timed = (scan['recordidentifier'] != HEADER) & (scan['sizeofdata'] >= 8)
+		positions = (index['offset'][timed] + index['hdrlen'][timed]).astype(np.int64)[:, np.newaxis] + np.arange(8)
+		times = gatherbytes(self.fileptr, positions).view('>i4').astype(np.float64)
+		index['time'][timed] = times[:, 0] + times[:, 1] / 1000000000.0
+		return index
+
+	def verifychecksums(self, chunksize=67108864):
+		'''
+		compute the checksum of every record which has one, and return the records where it does not match the checksum stored in the file (see CHECKSUMDTYPE).
+		the gsf checksum is the sum of the bytes after the checksum to the end of the record, modulo 2^32.  We sum chunksize bytes of records at a time with numpy, so this runs close to the speed we can read the file
+		'''
+		scan = self.scanrecords()
+		scan = scan[scan['haschecksum']]
+		starts = scan['offset'].astype(np.int64) + self.hdrlen + 4
+		ends = starts + scan['sizeofdata']
+		stored = gatherbytes(self.fileptr, (scan['offset'].astype(np.int64) + self.hdrlen)[:, np.newaxis] + np.arange(4)).view('>u4').ravel()
+		computed = np.zeros(len(scan), dtype=np.uint64)
+
+		i = 0
+		while i < len(scan):
+			base = int(starts[i])
+			j = max(i + 1, int(np.searchsorted(ends, base + chunksize, side='right')))
+			window = readwindow(self.fileptr, base, int(ends[j-1]) - base)
+			# sum the bytes between each start and end, ignoring the headers between the records.  An empty record sums to zero
+			nonempty = np.flatnonzero(ends[i:j] > starts[i:j])
+			bounds = np.column_stack((starts[i:j][nonempty], ends[i:j][nonempty])).ravel() - base
+			if len(bounds) > 0:
+				computed[i + nonempty] = np.add.reduceat(window, bounds[:-1], dtype=np.uint64)[::2]
+			del window
+			i = j
+
+		computed = (computed & 0xFFFFFFFF).astype(np.uint32)
+		bad = np.flatnonzero(computed != stored)
+		result = np.zeros(len(bad), dtype=CHECKSUMDTYPE)
+		result['offset'] = scan['offset'][bad]
+		result['recordidentifier'] = scan['recordidentifier'][bad]
+		result['stored'] = stored[bad]
+		result['computed'] = computed[bad]
+		return result
+
+	def recoverrecords(self, start=0, maxrecordsize=67108864, searchsize=1048576):
+		'''
+		walk the record headers like scanrecords, but when a header is not plausible, search forward for the next one which is and carry on from there, so we can read what is left of a damaged file.
+		a header is plausible if it has a known record type, no reserved bits, and a 4 byte aligned size no larger than maxrecordsize which fits in the file.  A header found by searching must also be followed by another plausible header or the end of the file, and if it is a ping it must not go back in time.
+		the previous record may have had a bad size which took us past the damage, so the search starts just after the start of the previous record, and drops it if the search finds a record inside it.
+		the search screens searchsize bytes at a time for candidate headers with numpy, so a whole damaged file takes seconds.
+		returns the records (see RECORDDTYPE), and a list of the (start, end) byte ranges which were skipped
+		'''
+		self.advise(MADV_SEQUENTIAL)
+		readheader = headerreader(self.fileptr, self.hdrfmt)
+		readtime = headerreader(self.fileptr, '>l')
+		records = []
+		skipped = []
+		lastpingtime = None
+		offset = start
+		while offset + self.hdrlen <= self.fileSize:
+			numberofbytes = self.plausiblerecord(readheader, offset, maxrecordsize, False)
+			if numberofbytes == 0:
+				previous = int(records[-1][0]) if len(records) > 0 else offset
+				resync = self.resynchronise(readheader, readtime, previous + 1, lastpingtime, maxrecordsize, searchsize)
+				if resync < offset:
+					records.pop()
+					offset = previous
+				skipped.append((offset, resync))
+				offset = resync
+				continue
+			sizeofdata, recordidentifier = readheader(offset)
+			haschecksum = recordidentifier & 0x80000000
+			recordidentifier = recordidentifier & 0x003FFFFF
 			if recordidentifier == SWATH_BATHYMETRY:
-				numpings += 1
+				lastpingtime = readtime(offset + numberofbytes - sizeofdata)[0]
+			records.append((offset, recordidentifier, sizeofdata, haschecksum))
+			offset += numberofbytes
+		if offset < self.fileSize:
+			skipped.append((offset, self.fileSize))
+		return np.array(records, dtype=RECORDDTYPE), skipped
+
+	def plausiblerecord(self, readheader, offset, maxrecordsize, lookahead=True):
+		'''
+		return the number of bytes in the record at offset if its header is plausible (see recoverrecords), or 0 if it is not
+		'''
+		sizeofdata, recordidentifier = readheader(offset)
+		if recordidentifier & 0x7FC00000 or (recordidentifier & 0x003FFFFF) not in RECORDTYPES or sizeofdata % 4 or sizeofdata > maxrecordsize:
+			return 0
+		if (recordidentifier & 0x003FFFFF) == SWATH_BATHYMETRY and sizeofdata < PINGHEADERRAWDTYPE.itemsize:
+			return 0
+		numberofbytes = sizeofdata + self.hdrlen + 4 if recordidentifier & 0x80000000 else sizeofdata + self.hdrlen
+		if offset + numberofbytes > self.fileSize:
+			return 0
+		if lookahead and offset + numberofbytes + self.hdrlen <= self.fileSize and self.plausiblerecord(readheader, offset + numberofbytes, maxrecordsize, False) == 0:
+			return 0
+		return numberofbytes
+
+	def resynchronise(self, readheader, readtime, offset, lastpingtime, maxrecordsize, searchsize):
+		'''
+		search forward from offset for the next plausible record header (see recoverrecords) and return its offset, or the end of the file if there is none.
+		each block of the file is screened with numpy for the byte patterns a record header can have, and only those candidates are checked in full
+		'''
+		validtypes = np.zeros(256, dtype=bool)
+		validtypes[list(RECORDTYPES)] = True
+		while offset + self.hdrlen <= self.fileSize:
+			count = min(searchsize, self.fileSize - offset)
+			block = readwindow(self.fileptr, offset, count)
+			n = count - self.hdrlen + 1
+			# a big endian size which is a multiple of 4 and no larger than maxrecordsize, then a checksum flag, no reserved bits and a known record type
+			size = (block[0:n].astype(np.uint32) << 24) | (block[1:n+1].astype(np.uint32) << 16) | (block[2:n+2].astype(np.uint32) << 8) | block[3:n+3]
+			candidates = (size % 4 == 0) & (size <= maxrecordsize) & ((block[4:n+4] & 0x7F) == 0) & (block[5:n+5] == 0) & (block[6:n+6] == 0) & validtypes[block[7:n+7]]
+			for candidate in np.flatnonzero(candidates) + offset:
+				candidate = int(candidate)
+				numberofbytes = self.plausiblerecord(readheader, candidate, maxrecordsize)
+				if numberofbytes == 0:
+					continue
+				sizeofdata, recordidentifier = readheader(candidate)
+				if (recordidentifier & 0x003FFFFF) == SWATH_BATHYMETRY and lastpingtime is not None and readtime(candidate + numberofbytes - sizeofdata)[0] < lastpingtime:
+					continue
+				return candidate
+			offset += n
+		return self.fileSize
+
+	def records(self, types=None):
+		'''
+		generator which yields (numberofbytes, recordidentifier, datagram) for every record from the current position to the end of the file, in the same way as readDatagram.
+		set types to a record identifier, or a set of them, and any other records are skipped using just the record header, so we do not pay for making a datagram we do not want
+		'''
+		for numberofbytes, recordidentifier, hdrlen in self.recordheaders(types):
+			yield self.createdatagram(numberofbytes, recordidentifier, hdrlen)
+
+	def pings(self, headeronly=False, lazy=False, reuse=False):
+		'''
+		generator which decodes and yields every ping from the current position to the end of the file.  All other records are skipped using just the record header
+		set reuse to decode every ping into the same ping object, and with numpyarrays into the same numpy buffers.  This saves making and collecting a ping per record on long runs, but each ping is only valid until the next one is read, so copy anything you need to keep
+		'''
+		ping = None
+		for numberofbytes, recordidentifier, hdrlen in self.recordheaders(SWATH_BATHYMETRY):
+			if ping is None or not reuse:
+				ping = self.createdatagram(numberofbytes, recordidentifier, hdrlen)[2]
+				ping.reuse = reuse
+			else:
+				ping.reset(self.fileptr, numberofbytes, recordidentifier, hdrlen)
+				ping.scalefactors = self.scalefactors
+				ping.numpyarrays = self.numpyarrays
+			ping.read(headeronly, lazy)
+			yield ping
+
+	def recordheaders(self, types=None):
+		'''
+		generator which walks the record headers from the current position, and yields (numberofbytes, recordidentifier, hdrlen) with the file pointer at the start of each record in types.
+		stops at a truncated record at the end of the file, leaving the file pointer at its start
+		'''
+		if isinstance(types, int):
+			types = {types}
+		self.advise(MADV_SEQUENTIAL)
+		readheader = headerreader(self.fileptr, self.hdrfmt)
+		offset = self.fileptr.tell()
+		while self.fileSize - offset >= self.hdrlen:
+			sizeofdata, recordidentifier = readheader(offset)
+			hdrlen = self.hdrlen + 4 if recordidentifier & 0x80000000 else self.hdrlen
+			recordidentifier = recordidentifier & 0x003FFFFF
+			numberofbytes = sizeofdata + hdrlen
+			if offset + numberofbytes > self.fileSize:
+				break
+			if types is None or recordidentifier in types:
+				# the caller may move the file pointer while decoding, so always start from the record we found
+				self.fileptr.seek(offset, 0)
+				yield numberofbytes, recordidentifier, hdrlen
+			offset += numberofbytes
+		self.fileptr.seek(min(offset, self.fileSize), 0)
 
-		self.fileptr.seek(curr, 0)
-		return numpings
-		
 	def readDatagram(self):
 		# read the datagram header.  This permits us to skip datagrams we do not support
 		numberofbytes, recordidentifier, haschecksumnumberofbytes, hdrlen = self.sniffDatagramHeader()
-		
+		return self.createdatagram(numberofbytes, recordidentifier, hdrlen)
+
+	def createdatagram(self, numberofbytes, recordidentifier, hdrlen):
+		'''
+		create the class for the record at the file pointer, and move the file pointer to the end of the record.  The record is only decoded when the user calls read()
+		'''
 		if recordidentifier == HEADER:
 			# create a class for this datagram, but only decode if the resulting class if called by the user.  This makes it much faster
 			dg = GSFHEADER(self.fileptr, numberofbytes, recordidentifier, hdrlen)
 			return numberofbytes, recordidentifier, dg
 		
 		elif recordidentifier == SWATH_BATHYMETRY:
-			dg = SWATH_BATHYMETRY_PING(self.fileptr, numberofbytes, recordidentifier, hdrlen)
-			dg.scalefactors = self.scalefactors
+			dg = SWATH_BATHYMETRY_PING(self.fileptr, numberofbytes, recordidentifier, hdrlen, self.scalefactors)
+			dg.numpyarrays = self.numpyarrays
 			return numberofbytes, recordidentifier, dg 
 		
-		# elif recordidentifier == 3: # SOUND_VELOCITY_PROFILE
-			# dg = SOUND_VELOCITY_PROFILE(self.fileptr, numberofbytes)
-			# return dg.recordidentifier, dg 
-		
+		elif recordidentifier in RECORDCLASSES:
+			dg = RECORDCLASSES[recordidentifier](self.fileptr, numberofbytes, recordidentifier, hdrlen)
+			return numberofbytes, recordidentifier, dg
+
 		else:
 			dg = UNKNOWN_RECORD(self.fileptr, numberofbytes, recordidentifier, hdrlen)
 			# self.fileptr.seek(numberofbytes, 1) # set the file ptr to the end of the record			
@@ -875,11 +1841,6 @@ class GSFREADER:
 
 		recordidentifier = (recordidentifier & 0x003FFFFF)
 
-		if haschecksum:
-			# read the checksum of 4 bytes if required
-			chksum = self.fileptr.read(4)
-			return (sizeofdata + self.hdrlen + 4, recordidentifier, haschecksum)
-		
 		# now reset file pointer to the start of the record
 		self.fileptr.seek(curr, 0)
 		
@@ -889,6 +1850,437 @@ class GSFREADER:
 			return (sizeofdata + self.hdrlen, recordidentifier, haschecksum, self.hdrlen )
 
 
+###############################################################################
+class GSFSTREAMREADER:
+	def __init__(self, source, numpyarrays=False, buffersize=1048576, maxrecordsize=67108864):
+		'''
+		class to read generic sensor format records in order from a stream which cannot seek, e.g. a gzip, bz2 or xz compressed file, stdin or a socket, so we can convert without first decompressing to disc.
+		source is a filename ("-" for stdin) or a binary file object, e.g. socket.makefile('rb').  compressed sources are recognised from their first few bytes.
+		only the current record is held in memory, on top of a read ahead buffer of buffersize bytes.  A record larger than maxrecordsize means the stream is corrupt, so we stop rather than try to hold it
+		'''
+		self.fileName = source if isinstance(source, str) else getattr(source, 'name', '')
+		self.stream = openstream(source, buffersize)
+		self.fileptr = io.BytesIO()		# the current record, so the datagram classes decode it just as they would from a file
+		self.hdrfmt = ">LL"
+		self.hdrlen = struct.calcsize(self.hdrfmt)
+		self.maxrecordsize = maxrecordsize
+		self.scalefactors = SCALEFACTORTABLE()
+		self.numpyarrays = numpyarrays
+		self.position = 0
+
+	# records are made exactly as GSFREADER makes them, from self.fileptr
+	createdatagram = GSFREADER.createdatagram
+
+	def moreData(self):
+		'''return the number of bytes we can see ahead in the stream, which is 0 at the end'''
+		return len(self.stream.peek(1))
+
+	def currentPtr(self):
+		'''the number of bytes read from the stream so far'''
+		return self.position
+
+	def close(self):
+		'''
+		close the stream
+		'''
+		self.stream.close()
+
+	def __str__(self):
+		'''
+		pretty print this class
+		'''
+		return pprint.pformat(vars(self))
+
+	def loadscalefactors(self):
+		'''
+		a stream cannot rewind, so the scale factors are loaded from the pings as they are read.  return the table they are loaded into
+		'''
+		return self.scalefactors
+
+	def recordheaders(self, types=None):
+		'''
+		generator which reads the records from the stream, and yields (numberofbytes, recordidentifier, hdrlen) with self.fileptr holding each record in types.  Other records are read past without being kept.
+		stops at the end of the stream or at a truncated record
+		'''
+		if isinstance(types, int):
+			types = {types}
+		while True:
+			data = readexactly(self.stream, self.hdrlen)
+			if len(data) < self.hdrlen:
+				return
+			sizeofdata, recordidentifier = struct.unpack(self.hdrfmt, data)
+			hdrlen = self.hdrlen + 4 if recordidentifier & 0x80000000 else self.hdrlen
+			recordidentifier = recordidentifier & 0x003FFFFF
+			numberofbytes = sizeofdata + hdrlen
+			if numberofbytes > self.maxrecordsize:
+				raise ValueError("record of %d bytes at stream offset %d is larger than maxrecordsize, the stream is probably corrupt" % (numberofbytes, self.position))
+			if types is None or recordidentifier in types:
+				payload = readexactly(self.stream, numberofbytes - self.hdrlen)
+				if len(payload) < numberofbytes - self.hdrlen:
+					return
+				self.position += numberofbytes
+				self.fileptr = io.BytesIO(data + payload)
+				yield numberofbytes, recordidentifier, hdrlen
+			else:
+				if skipbytes(self.stream, numberofbytes - self.hdrlen) < numberofbytes - self.hdrlen:
+					return
+				self.position += numberofbytes
+
+	def records(self, types=None):
+		'''
+		generator which yields (numberofbytes, recordidentifier, datagram) for every record in the stream, in the same way as GSFREADER.records.  Each datagram holds its own record, so the offsets are relative to the record rather than the stream
+		'''
+		for numberofbytes, recordidentifier, hdrlen in self.recordheaders(types):
+			yield self.createdatagram(numberofbytes, recordidentifier, hdrlen)
+
+	def pings(self, headeronly=False, lazy=False, reuse=False):
+		'''
+		generator which decodes and yields every ping in the stream, in the same way as GSFREADER.pings
+		'''
+		ping = None
+		for numberofbytes, recordidentifier, hdrlen in self.recordheaders(SWATH_BATHYMETRY):
+			if ping is None or not reuse:
+				ping = self.createdatagram(numberofbytes, recordidentifier, hdrlen)[2]
+				ping.reuse = reuse
+			else:
+				ping.reset(self.fileptr, numberofbytes, recordidentifier, hdrlen)
+				ping.scalefactors = self.scalefactors
+				ping.numpyarrays = self.numpyarrays
+			ping.read(headeronly, lazy)
+			yield ping
+
+	def readDatagram(self):
+		'''
+		read the next record from the stream and return (numberofbytes, recordidentifier, datagram), or (0, 0, None) at the end of the stream
+		'''
+		for numberofbytes, recordidentifier, hdrlen in self.recordheaders():
+			return self.createdatagram(numberofbytes, recordidentifier, hdrlen)
+		return 0, 0, None
+
+###############################################################################
+def openstream(source, buffersize=1048576):
+	'''
+	open source for reading as a buffered binary stream we can peek into.  source is a filename, "-" for stdin, or a binary file object.  gzip, bz2 and xz/lzma data is recognised from its first few bytes and decompressed as it is read
+	'''
+	if isinstance(source, str):
+		stream = sys.stdin.buffer if source == "-" else open(source, 'rb', buffering=buffersize)
+	else:
+		stream = source
+	if not hasattr(stream, 'peek'):
+		stream = io.BufferedReader(stream, buffersize)
+	magic = stream.peek(6)[:6]
+	if magic.startswith(b'\x1f\x8b'):
+		return io.BufferedReader(gzip.GzipFile(fileobj=stream, mode='rb'), buffersize)
+	if magic.startswith(b'BZh'):
+		return io.BufferedReader(bz2.BZ2File(stream, mode='rb'), buffersize)
+	if magic.startswith(b'\xfd7zXZ\x00') or magic.startswith(b'\x5d\x00\x00'):
+		return io.BufferedReader(lzma.LZMAFile(stream, mode='rb'), buffersize)
+	return stream
+
+###############################################################################
+def readexactly(stream, count):
+	'''
+	read count bytes from the stream.  pipes and sockets can return less than we ask for, so keep reading until we have them all or reach the end of the stream
+	'''
+	data = stream.read(count)
+	if len(data) == count or len(data) == 0:
+		return data
+	chunks = [data]
+	remaining = count - len(data)
+	while remaining > 0:
+		chunk = stream.read(remaining)
+		if len(chunk) == 0:
+			break
+		chunks.append(chunk)
+		remaining -= len(chunk)
+	return b''.join(chunks)
+
+###############################################################################
+def skipbytes(stream, count):
+	'''
+	read past count bytes of the stream in blocks, so we do not hold a large record we do not want.  returns the number of bytes skipped
+	'''
+	skipped = 0
+	while skipped < count:
+		chunk = stream.read(min(count - skipped, 1048576))
+		if len(chunk) == 0:
+			break
+		skipped += len(chunk)
+	return skipped
+
+###############################################################################
+def backscatteradjustmentarray(S1_angle, S1_twtt, S1_range, S1_Magnitude, H0_TxPower, H0_SoundSpeed, H0_RxAbsorption, H0_TxBeamWidthVert, H0_TxBeamWidthHoriz, H0_TxPulseWidth, H0_RxSpreading, H0_RxGain, H0_VTX_Offset):
+	'''
+	numpy version of SWATH_BATHYMETRY_PING.backscatteradjustment, the R2Sonic backscatter correction from Norm Campbell at CSIRO.
+	the beam arguments are arrays and the sonar settings may be scalars or arrays which broadcast against them, so a batch of pings can be corrected with the beams as a 2D array and the settings as a column per ping.
+	beams with a range of zero or no magnitude return 0
+	'''
+	one_rad = 57.29577951308232
+	S1_angle = np.asarray(S1_angle, dtype=np.float64)
+	S1_Magnitude = np.asarray(S1_Magnitude, dtype=np.float64)
+	S1_angle_rad = S1_angle / one_rad
+	z_one_way_travel_secs = np.asarray(S1_twtt, dtype=np.float64) / 2.0
+	z_range_m = z_one_way_travel_secs * H0_SoundSpeed
+
+	valid = (z_range_m != 0) & (S1_Magnitude > 0)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		###### TRANSMISSION LOSS CORRECTION ##########################################
+		z_received_level = 20.0 * np.log10(S1_Magnitude)
+		z_source_level = H0_TxPower
+		z_transmission_loss_t1 = 2.0 * H0_RxAbsorption * z_range_m / 1000.0
+		z_transmission_loss_t2 = 40.0 * np.log10(z_range_m)
+		z_transmission_loss = z_transmission_loss_t1 + z_transmission_loss_t2
+
+		###### INSONIFICATION AREA CORRECTION ##########################################
+		# normal incidence for angles under 0.001 degrees, otherwise the smaller of the normal and oblique footprints
+		sin_S1_angle = np.sin(np.abs(S1_angle_rad))
+		z_area_of_insonification_nml = H0_TxBeamWidthVert * H0_TxBeamWidthHoriz * z_range_m **2
+		z_area_of_insonification_obl = 0.5 * H0_SoundSpeed * H0_TxPulseWidth * H0_TxBeamWidthVert * z_range_m / sin_S1_angle
+		z_area_of_insonification = np.where(np.abs(S1_angle) < 0.001, z_area_of_insonification_nml, np.minimum(z_area_of_insonification_nml, z_area_of_insonification_obl))
+
+		###### TIME VARIED GAIN CORRECTION ##########################################
+		TVG_1 = 2.0 * z_range_m * H0_RxAbsorption / 1000.
+		TVG_2 = H0_RxSpreading * np.log10(z_range_m)
+		TVG = TVG_1 + TVG_2 + H0_RxGain
+		# as per email from Beaudoin, clip the TVG between 4 and 83 dB
+		TVG = np.minimum(np.maximum(4, TVG), 83)
+
+		###### NOW COMPUTE THE CORRECTED BACKSCATTER ##########################################
+		backscatter_dB_m = z_received_level - z_source_level + z_transmission_loss - (10.0 * np.log10(z_area_of_insonification)) - TVG - H0_VTX_Offset + 100.0
+
+	return np.where(valid, backscatter_dB_m, 0.0)
+
+###############################################################################
+def scaledatatype(ID, bytes_per_value):
+	'''the struct datatype used to store the values of a beam array subrecord, from the number of bytes per value'''
+	if bytes_per_value == 1:
+		datatype = 'B' 			#unsigned values
+	elif bytes_per_value == 2:
+		datatype = 'H'			#unsigned values
+		if ID == 2:				#ACROSS_TRACK_ARRAY array
+			datatype = 'h'		#signed values
+		if ID == 3:				#ALONG_TRACK_ARRAY array
+			datatype = 'h'		#signed values
+		if ID == 5:				#beam angle array
+			datatype = 'h'		#signed values
+	elif bytes_per_value == 4:
+		datatype = 'L'			#unsigned values
+		if ID == 2:				#ACROSS_TRACK_ARRAY array
+			datatype = 'l'		#signed values
+		if ID == 5:				#beam angle array
+			datatype = 'l'		#signed values
+	else:
+		datatype = 'L'			#unsigned values not sure about this one.  needs test data
+	return datatype
+
+###############################################################################
+class ATTITUDESTORE:
+	'''
+	the high rate attitude of a file, held as numpy arrays sorted on time so we can interpolate the motion at any time, e.g. the transmit and receive time of every beam, in one vectorised call.
+	make it from the measurements of every attitude record with ATTITUDESTORE(r.loadattitude())
+	'''
+	def __init__(self, attitude):
+		order = np.argsort(attitude['time'], kind='stable')
+		self.time = attitude['time'][order]
+		self.pitch = attitude['pitch'][order]
+		self.roll = attitude['roll'][order]
+		self.heave = attitude['heave'][order]
+		self.heading = attitude['heading'][order]
+
+	def __len__(self):
+		return len(self.time)
+
+	def __str__(self):
+		'''
+		pretty print this class
+		'''
+		return pprint.pformat(vars(self))
+
+	def interpolate(self, times, maxgap=None):
+		'''
+		linearly interpolate the attitude at each of times, which can be an array of any shape, e.g. the ping times plus the travel time of every beam from read_pings.
+		heading is interpolated the short way round through north.  times outside the attitude, NaN times, and with maxgap set, times between measurements more than maxgap seconds apart, are NaN.
+		returns a structured array (see ATTITUDEDTYPE) the same shape as times
+		'''
+		times = np.asarray(times, dtype=np.float64)
+		result = np.zeros(times.shape, dtype=ATTITUDEDTYPE)
+		result['time'] = times
+		n = len(self.time)
+		if n == 0:
+			for name in ['pitch', 'roll', 'heave', 'heading']:
+				result[name] = np.nan
+			return result
+
+		# bracket each time between measurements i and j, and weight them by how close it is to each
+		i = np.clip(np.searchsorted(self.time, times, side='right') - 1, 0, max(n - 2, 0))
+		j = np.minimum(i + 1, n - 1)
+		span = self.time[j] - self.time[i]
+		weight = np.where(span > 0, (times - self.time[i]) / np.where(span > 0, span, 1), 0.0)
+		valid = (times >= self.time[0]) & (times <= self.time[-1])
+		if maxgap is not None:
+			valid &= span <= maxgap
+
+		for name in ['pitch', 'roll', 'heave']:
+			values = getattr(self, name)
+			result[name] = np.where(valid, values[i] + weight * (values[j] - values[i]), np.nan)
+		turn = (self.heading[j] - self.heading[i] + 180) % 360 - 180
+		result['heading'] = np.where(valid, (self.heading[i] + weight * turn) % 360, np.nan)
+		return result
+
+###############################################################################
+def scaleattitude(raw, basetime):
+	'''
+	scale raw attitude measurements (see ATTITUDERAWDTYPE) into a structured array of ATTITUDEDTYPE, with the time offsets added to the base time of their record
+	'''
+	attitude = np.zeros(len(raw), dtype=ATTITUDEDTYPE)
+	attitude['time'] = basetime + raw['time'] / 1000
+	for name in ['pitch', 'roll', 'heave', 'heading']:
+		attitude[name] = raw[name] / 100
+	return attitude
+
+###############################################################################
+def readpingschunk(filename, offsets, hdrlens, scalefactors, scalefactoroffset, fields):
+	'''
+	worker process entry point for GSFREADER.read_pings_parallel.  decode the pings at offsets with a reader of our own.
+	scalefactors flags the pings which carry scale factors, and scalefactoroffset is the ping holding the scale factors in effect at the first ping (or None), so the reader does not need to index the file
+	'''
+	r = GSFREADER(filename, useindex=False)
+	first = 0
+	if scalefactoroffset is not None and not scalefactors[0]:
+		# put the ping holding the scale factors in effect at the start of our range in front of it, so the pings before the first carrier in our range find it
+		offsets = np.concatenate(([scalefactoroffset], offsets))
+		hdrlens = np.concatenate((hdrlens[:1], hdrlens))	# only the headers of our own range are gathered, so the carrier header length is not used
+		scalefactors = np.concatenate(([True], scalefactors))
+		first = 1
+	r.pingoffsets = offsets
+	r.pinghdrlens = hdrlens
+	r.pingscalefactors = scalefactors
+	r.pingscalecarriers = scalecarriers(scalefactors)
+	result = r.read_pings(first, len(offsets) - first, fields)
+	r.close()
+	return result
+
+###############################################################################
+def scalecarriers(scalefactors):
+	'''
+	given flags for the pings which carry a scale factor subrecord, return the ping number of the most recent carrier at or before each ping, or -1 if there is none
+	'''
+	if len(scalefactors) == 0:
+		return np.zeros(0, dtype=np.int64)
+	return np.maximum.accumulate(np.where(scalefactors, np.arange(len(scalefactors)), -1))
+
+###############################################################################
+class PREADFILE:
+	'''
+	a read only file which reads through a block cache with os.pread, as an alternative to a memory map.  Page faults on a memory map can perform badly on network file systems, where fewer, larger reads are much faster.
+	it provides the seek, tell, read and close methods the reader uses on a memory map
+	'''
+	def __init__(self, filename, blocksize=1048576):
+		self.fd = os.open(filename, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+		self.size = os.fstat(self.fd).st_size
+		self.blocksize = blocksize
+		self.block = b''
+		self.blockoffset = 0
+		self.position = 0
+		self.closed = False
+
+	def pread(self, count, offset):
+		'''read count bytes from offset.  windows does not have os.pread, so fall back to a seek and read'''
+		if hasattr(os, 'pread'):
+			return os.pread(self.fd, count, offset)
+		os.lseek(self.fd, offset, os.SEEK_SET)
+		return os.read(self.fd, count)
+
+	def window(self, offset, count):
+		'''return a buffer holding count bytes from offset, and the file offset of the start of that buffer.  Reads are served from the cached block where possible'''
+		if offset < self.blockoffset or offset + count > self.blockoffset + len(self.block):
+			self.block = self.pread(max(count, self.blocksize), offset)
+			self.blockoffset = offset
+		return self.block, self.blockoffset
+
+	def read(self, count=-1):
+		if count < 0 or self.position + count > self.size:
+			count = max(self.size - self.position, 0)
+		if count > self.blocksize:
+			data = self.pread(count, self.position)
+		else:
+			block, base = self.window(self.position, count)
+			data = block[self.position - base:self.position - base + count]
+		self.position += len(data)
+		return data
+
+	def seek(self, offset, whence=0):
+		if whence == 1:
+			offset += self.position
+		elif whence == 2:
+			offset += self.size
+		self.position = offset
+		return self.position
+
+	def tell(self):
+		return self.position
+
+	def close(self):
+		if not self.closed:
+			os.close(self.fd)
+			self.closed = True
+
+###############################################################################
+def headerreader(fileptr, fmt):
+	'''
+	return a function which unpacks the fmt struct at a file offset without moving the file pointer.  memory maps are unpacked in place, and other files through their block cache
+	'''
+	unpack_from = struct.Struct(fmt).unpack_from
+	if isinstance(fileptr, mmap.mmap):
+		return lambda offset: unpack_from(fileptr, offset)
+	size = struct.calcsize(fmt)
+	def readheader(offset):
+		block, base = fileptr.window(offset, size)
+		return unpack_from(block, offset - base)
+	return readheader
+
+###############################################################################
+def gatherbytes(fileptr, positions):
+	'''
+	return the bytes at each of the positions (a 2D array with a row of consecutive positions per item) as a uint8 array of the same shape.
+	memory maps are gathered in one vectorised step, and other files with a read per row
+	'''
+	if isinstance(fileptr, mmap.mmap):
+		buf = np.frombuffer(fileptr, dtype=np.uint8)
+		result = buf[positions]
+		del buf
+		return result
+	result = np.zeros(positions.shape, dtype=np.uint8)
+	for i, row in enumerate(positions):
+		if len(row) > 0:
+			block, base = fileptr.window(int(row[0]), len(row))
+			result[i] = np.frombuffer(block, dtype=np.uint8, count=len(row), offset=int(row[0]) - base)
+	return result
+
+###############################################################################
+def readwindow(fileptr, offset, count):
+	'''
+	return count bytes from offset as a uint8 array without moving the file pointer.  memory maps are returned as a view, so delete it when done so the map can be closed
+	'''
+	if isinstance(fileptr, mmap.mmap):
+		return np.frombuffer(fileptr, dtype=np.uint8, count=count, offset=offset)
+	return np.frombuffer(fileptr.pread(count, offset), dtype=np.uint8)
+
+###############################################################################
+def bufferarray(fileptr, offset, dtype, count):
+	'''
+	return count values of dtype from the file at offset without moving the file pointer.
+	memory mapped files are decoded in place with np.frombuffer, so there is no intermediate copy of the bytes
+	'''
+	if isinstance(fileptr, mmap.mmap):
+		return np.frombuffer(fileptr, dtype=dtype, count=count, offset=offset)
+	curr = fileptr.tell()
+	fileptr.seek(offset, 0)
+	data = fileptr.read(np.dtype(dtype).itemsize * count)
+	fileptr.seek(curr, 0)
+	return np.frombuffer(data, dtype=dtype, count=count)
+
+###############################################################################
 def isBitSet(int_type, offset):
 	'''testBit() returns a nonzero result, 2**offset, if the bit at 'offset' is one.'''
 	mask = 1 << offset
@@ -917,6 +2309,40 @@ def createOutputFileName(path):
 
 	return os.path.join(dir, candidate)
 
+###############################################################################
+def runjobs(function, jobs, workers=1, title="Processed"):
+	'''
+	run function(*job) for each job tuple and return the results in the same order as the jobs, so callers can reduce them deterministically.
+	with workers > 1 the jobs are fanned out to a pool of worker processes, and 0 uses all cores.  progress is reported as each job completes.
+	'''
+	jobs = list(jobs)
+	if workers == 0:
+		workers = os.cpu_count() or 1
+	results = [None] * len(jobs)
+	if workers == 1 or len(jobs) < 2:
+		for i, job in enumerate(jobs):
+			results[i] = function(*job)
+			update_progress("%s: %s (%d/%d)" % (title, job[0], i + 1, len(jobs)), (i + 1) / len(jobs))
+		return results
+
+	with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+		futures = {executor.submit(function, *job): i for i, job in enumerate(jobs)}
+		for completed, future in enumerate(as_completed(futures)):
+			i = futures[future]
+			results[i] = future.result()
+			update_progress("%s: %s (%d/%d)" % (title, jobs[i][0], completed + 1, len(jobs)), (completed + 1) / len(jobs))
+	return results
+
+###############################################################################
+def update_progress(job_title, progress):
+	'''print a progress bar on one line.  This is shared by the command line tools'''
+	length = 20 # modify this to change the length
+	block = int(round(length*progress))
+	msg = "\r{0}: [{1}] {2}%".format(job_title, "#"*block + "-"*(length-block), round(progress*100, 2))
+	if progress >= 1: msg += " DONE\r\n"
+	sys.stdout.write(msg)
+	sys.stdout.flush()
+
 ###############################################################################
 class cBeam:
 	def __init__(self, beamDetail, angle):
@@ -938,6 +2364,30 @@ class cBeam:
 		'''
 		return pprint.pformat(vars(self))
 
+###############################################################################
+def createARC(startAngle=-90):
+	'''
+	make an angular response curve with a one degree bucket per take off angle.  each bucket holds a beam per frequency in ARCIdx, so we can analyse all frequencies at the same time
+	'''
+	beamdetail = [0,0,0,0]
+	return [[cBeam(beamdetail, i), cBeam(beamdetail, i), cBeam(beamdetail, i)] for i in range(startAngle, -startAngle)]
+
+###############################################################################
+def mergeARC(ARC, other):
+	'''
+	accumulate the sums and counts of another angular response curve, such as one extracted by a worker process, into ARC.
+	a slot keeps the sector of the first curve with samples in it, so merging the worker results in job order always gives the same sector.  sampleMin and sampleMax are not merged as extractARC does not update them
+	'''
+	for record, otherrecord in zip(ARC, other):
+		for beam, otherbeam in zip(record, otherrecord):
+			if otherbeam.numberOfSamplesPerBeam == 0:
+				continue
+			if beam.numberOfSamplesPerBeam == 0:
+				beam.sector = otherbeam.sector
+			beam.sampleSum += otherbeam.sampleSum
+			beam.numberOfSamplesPerBeam += otherbeam.numberOfSamplesPerBeam
+	return ARC
+
 ###############################################################################
 if __name__ == "__main__":
 	main()
@@ -4,14 +4,13 @@ from datetime import datetime
 import geodetic
 from glob import glob
 import math
-# import numpy as np
+import numpy as np
 import pygsf
+import georeference
 import time
 import os.path
 import warnings
 import pylasfile
-# import geopy
-from geopy.distance import VincentyDistance
 
 # ignore numpy NaN warnings when applying a mask to the images.
 warnings.filterwarnings('ignore')
@@ -23,6 +22,8 @@ def main():
 	parser.add_argument('-intensitysource', dest='intensitysource', action='store', default="100000", help='Specify a frequency of multibeam you wish to populate into the intensity field of the las file. e.g. -intensitysource 100000')
 	parser.add_argument('-odir', dest='odir', action='store', default="", help='Specify a relative output folder e.g. -odir conditioned')
 	parser.add_argument('-r', action='store_true', default=False, dest='recursive', help='Search recursively from the current folder.  [Default: False]')
+	parser.add_argument('-j', dest='jobs', action='store', default="1", help='Number of files to process in parallel, 0 uses all cores. e.g. -j 8 [Default: 1]')
+	parser.add_argument('-ellipsoidal', action='store_true', default=False, dest='ellipsoidal', help='Position the soundings using the local wgs84 earth radius at each ping rather than the mean earth radius.  [Default: False]')
 
 	if len(sys.argv)==1:
 		parser.print_help()
@@ -46,17 +47,23 @@ def main():
 	print (matches)
 
 	# # print ("processing with settings: ", args)
+	# assign the point source ID up front so each file gets the same ID however many workers are used
+	jobs = []
 	pointsourceID = 1
 	for filename in matches:
-		if not filename.endswith('.gsf'):
-			print ("File %s is not a .gsf file, skipping..." % (filename))
+		if not filename.endswith('.gsf') and not filename.endswith(tuple('.gsf' + ext for ext in pygsf.STREAMEXTENSIONS)):
+			print ("File %s is not a .gsf file or a compressed .gsf file, skipping..." % (filename))
 			continue
-		convert(filename, args.odir, pointsourceID, float(args.intensitysource))
+		jobs.append((filename, args.odir, pointsourceID, float(args.intensitysource), args.ellipsoidal))
 		pointsourceID += 1
+	pygsf.runjobs(convert, jobs, int(args.jobs), "Converted")
 
-def convert(filename, odir, pointsourceID = 1, intensitysource=100000):	
+def convert(filename, odir, pointsourceID = 1, intensitysource=100000, ellipsoidal=False):	
 	recCount = 0
-	outFileName = os.path.join(os.path.dirname(os.path.abspath(filename)), odir, os.path.splitext(os.path.basename(filename))[0] + ".las")
+	basename = os.path.basename(filename)
+	if basename.endswith(pygsf.STREAMEXTENSIONS):
+		basename = os.path.splitext(basename)[0]
+	outFileName = os.path.join(os.path.dirname(os.path.abspath(filename)), odir, os.path.splitext(basename)[0] + ".las")
 	outFileName = createOutputFileName(outFileName)
 	print("outputfile %s" % outFileName)
 	writer = pylasfile.laswriter(outFileName, 1.4)
@@ -66,7 +73,11 @@ def convert(filename, odir, pointsourceID = 1, intensitysource=100000):
 	writer.writeVLR_WGS84()
 	writer.hdr.PointDataRecordFormat = 2
 
-	r = pygsf.GSFREADER(filename)
+	if filename.endswith(pygsf.STREAMEXTENSIONS):
+		# decompress as we read, rather than to disc first
+		r = pygsf.GSFSTREAMREADER(filename)
+	else:
+		r = pygsf.GSFREADER(filename)
 	scalefactors = r.loadscalefactors()
 	start_time = time.time() # time the process
 
@@ -79,20 +90,16 @@ def convert(filename, odir, pointsourceID = 1, intensitysource=100000):
 	sample_UL = 0
 	conv_01_99 = 5 # ( gray_UL - gray_LL ) / ( sample_UL - sample_LL )
 
-	while r.moreData():
-		numberofbytes, TypeOfDatagram, datagram = r.readDatagram()
-		if TypeOfDatagram !=  pygsf.SWATH_BATHYMETRY:
-			continue
+	for numberofbytes, TypeOfDatagram, datagram in r.records(pygsf.SWATH_BATHYMETRY):
 		# compute the local point scale factor for the computation of the point locations
 
-		datagram.read()
+		datagram.read(lazy=True)
 		# recDate = datagram.currentRecordDateTime()
-		localradius = calculateradiusFromLatitude(datagram.latitude)
 
 		datagram.scalefactors = scalefactors
 		datagram.perbeam = True
 		datagram.snippettype = pygsf.SNIPPET_NONE
-		datagram.read()
+		datagram.read(lazy=True)
 		datagram.cliptwtt(0)
 		datagram.clipintensity(0)
 		datagram.clippolar(-60,60)
@@ -115,25 +122,20 @@ def convert(filename, odir, pointsourceID = 1, intensitysource=100000):
 			if len(red) == 0 or len(green) == 0:
 				continue
 		
-			# for each beam in the ping, compute the real world position
-			for i in range(len(datagram.DEPTH_ARRAY)):
-				if datagram.BEAM_FLAGS_ARRAY[i] < 0:
-					continue #skip rejected records
-
-				writer.red.append(red[i])
-				writer.green.append(green[i])
-				writer.blue.append(blue[i])
-				writer.intensity.append(intensity[i])
-				# given the Dx,Dy soundings, compute a range, bearing so we can correccttly map out the soundings
-				brg = (90 - (180 / math.pi) * math.atan2(datagram.ALONG_TRACK_ARRAY[i], datagram.ACROSS_TRACK_ARRAY[i]) )
-				rng = math.sqrt( (datagram.ACROSS_TRACK_ARRAY[i]**2) + (datagram.ALONG_TRACK_ARRAY[i]**2) )
-				x,y = destinationPoint(datagram.latitude, datagram.longitude, rng, brg + datagram.heading, localradius)
-				writer.x.append(x)
-				writer.y.append(y)
-				writer.z.append(datagram.DEPTH_ARRAY[i])
-				writer.scanangle.append(int(datagram.BEAM_ANGLE_ARRAY[i]))
-				writer.pointsourceid.append(pointsourceID)
-				writer.gpstime.append(datagram.time)
+			# compute the real world position of every beam in the ping in one step, and skip the rejected beams
+			x, y = georeference.georeference(datagram.latitude, datagram.longitude, datagram.heading, datagram.ACROSS_TRACK_ARRAY, datagram.ALONG_TRACK_ARRAY, ellipsoidal)
+			keep = np.flatnonzero(np.asarray(datagram.BEAM_FLAGS_ARRAY) >= 0)
+
+			writer.red.extend(np.asarray(red)[keep].tolist())
+			writer.green.extend(np.asarray(green)[keep].tolist())
+			writer.blue.extend(np.asarray(blue)[keep].tolist())
+			writer.intensity.extend(np.asarray(intensity)[keep].tolist())
+			writer.x.extend(x[keep].tolist())
+			writer.y.extend(y[keep].tolist())
+			writer.z.extend(np.asarray(datagram.DEPTH_ARRAY)[keep].tolist())
+			writer.scanangle.extend(np.trunc(np.asarray(datagram.BEAM_ANGLE_ARRAY)[keep]).astype(int).tolist())
+			writer.pointsourceid.extend([pointsourceID] * len(keep))
+			writer.gpstime.extend([datagram.time] * len(keep))
 			recCount = recCount + 1
 			# if recCount == 1:
 			# 	break
@@ -214,14 +216,6 @@ def calculateradiusFromLatitude(lat):
 	R = math.sqrt(R)
 	return R * 1000
 
-def update_progress(job_title, progress):
-	length = 20 # modify this to change the length
-	block = int(round(length*progress))
-	msg = "\r{0}: [{1}] {2}%".format(job_title, "#"*block + "-"*(length-block), round(progress*100, 2))
-	if progress >= 1: msg += " DONE\r\n"
-	sys.stdout.write(msg)
-	sys.stdout.flush()
-
 ###############################################################################
 def createOutputFileName(path):
 	'''Create a valid output filename. if the name of the file already exists the file name is auto-incremented.'''
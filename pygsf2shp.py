@@ -19,6 +19,7 @@ def main():
 	parser.add_argument('-o', dest='outputFile', action='store', default='track.shp', help='-o <SHPfilename.shp> : output filename to create. e.g. trackplot.shp [Default: track.shp]')
 	parser.add_argument('-s', dest='step', action='store', default='1', help='step size in seconds.  Useful to reduce the complexity of the feature, which keeps ArcMap fastt. [Default: 1]')
 	parser.add_argument('-r', action='store_true', default=False, dest='recursive', help='-r : search recursively.  [Default: False]')
+	parser.add_argument('-j', dest='jobs', action='store', default='1', help='-j <workers> : number of files to process in parallel, 0 uses all cores. [Default: 1]')
 	if len(sys.argv)==1:
 		parser.print_help()
 		sys.exit(1)
@@ -30,7 +31,6 @@ def main():
 	if not fileOut.lower().endswith('.shp'):
 		fileOut += '.shp'
 
-	fileCounter=0
 	matches = []
 	lastTimeStamp = 0
 	trackRecordCount = 0
@@ -74,37 +74,16 @@ def main():
 		w.field("UNIXTime", "N")
 		w.field("SurveyDate", "D")
 		
-	for filename in matches:
-		# print ("processing file: %s" % filename)
-		line_parts = []
-		line = []
-		
-		r = pygsf.GSFREADER(filename)
-		start_time = time.time() # time  the process
-		navigation = r.loadnavigation()
-		for update in navigation:
-			if update[0] - lastTimeStamp > stepSize:
-				line.append([float(update[1]),float(update[2])])
-				trackRecordCount += 1
-				lastTimeStamp = update[0]
-		# now add the very last update
-		line.append([float(navigation[-1][1]),float(navigation[-1][2])])
-			
-		line_parts.append(line)
-		w.line(parts=line_parts)
+	start_time = time.time() # time  the process
+	# the tracks are extracted in parallel, then added to the shape file in the original file order
+	tracks = pygsf.runjobs(extracttrack, [(filename, stepSize) for filename in matches], int(args.jobs))
+	for filename, (line, firstTimeStamp, updateCount) in zip(matches, tracks):
+		w.line(parts=[line])
 		# now add to the shape file.
-		recTimeStamp = from_timestamp(navigation[0][0]).strftime("%Y/%m/%d %H:%M:%S")
-		recDate = from_timestamp(navigation[0][0]).strftime("%Y%m%d")
-		# depth = 1111.123
-		w.record(os.path.basename(filename), int(navigation[0][0]), recDate) 
-		# w.record(os.path.basename(filename), depth, navigation[0][0], recDate) 
+		recDate = from_timestamp(firstTimeStamp).strftime("%Y%m%d")
+		w.record(os.path.basename(filename), int(firstTimeStamp), recDate) 
+		trackRecordCount += updateCount
 
-		update_progress("Processed: %s (%d/%d)" % (filename, fileCounter, len(matches)), (fileCounter/len(matches)))
-		lastTimeStamp = update[0]
-		fileCounter +=1
-		r.close()
-		
-	update_progress("Process Complete: ", (fileCounter/len(matches)))
 	print ("Saving shapefile: %s position updates added %d" % (fileOut, trackRecordCount))		
 	w.save(fileOut)
 
@@ -115,17 +94,28 @@ def main():
 	print("Duration %.3fs" % (time.time() - start_time )) # time the process
 
 
+def extracttrack(filename, stepSize):
+	'''
+	read the navigation from a file and thin it to one position per step.  returns the line, the first timestamp and the number of position updates
+	'''
+	line = []
+	lastTimeStamp = 0
+	trackRecordCount = 0
+	r = pygsf.GSFREADER(filename)
+	navigation = r.loadnavigation()
+	r.close()
+	for update in navigation:
+		if update[0] - lastTimeStamp > stepSize:
+			line.append([float(update[1]),float(update[2])])
+			trackRecordCount += 1
+			lastTimeStamp = update[0]
+	# now add the very last update
+	line.append([float(navigation[-1][1]),float(navigation[-1][2])])
+	return line, navigation[0][0], trackRecordCount
+
 def from_timestamp(unixtime):
 	return datetime(1970, 1 ,1) + timedelta(seconds=unixtime)
 
-def update_progress(job_title, progress):
-	length = 20 # modify this to change the length
-	block = int(round(length*progress))
-	msg = "\r{0}: [{1}] {2}%".format(job_title, "#"*block + "-"*(length-block), round(progress*100, 2))
-	if progress >= 1: msg += " DONE\r\n"
-	sys.stdout.write(msg)
-	sys.stdout.flush()
-
 if __name__ == "__main__":
 	main()
 
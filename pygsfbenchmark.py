@@ -0,0 +1,84 @@
+#name:			pygsfbenchmark
+#created:		October 2026
+#description:	python module to measure the read throughput of the gsf reader backends on a file
+#				See readme.md for more details
+
+import sys
+import time
+import os
+from argparse import ArgumentParser
+from argparse import RawTextHelpFormatter
+from glob import glob
+import pygsf
+
+###############################################################################
+def main():
+	parser = ArgumentParser(description='Read a gsf file with each reader backend and report the throughput.',
+			epilog='Example: \n To benchmark a single file use -i c:/temp/myfile.gsf \n To benchmark only the pread backend on a network share use -i z:/survey/*.gsf -backend pread\n', formatter_class=RawTextHelpFormatter)
+	parser.add_argument('-i', dest='inputFile', action='store', help='Input gsf filename. It can also be a wildcard, e.g. *.gsf')
+	parser.add_argument('-backend', dest='backend', action='store', default="mmap,pread", help='The backends to benchmark. e.g. -backend pread [Default: mmap,pread]')
+	parser.add_argument('-n', dest='repeats', action='store', default="3", help='Run each benchmark this many times and report the fastest, so we measure the reader rather than the first read from disc. [Default: 3]')
+
+	if len(sys.argv)==1:
+		parser.print_help()
+		sys.exit(1)
+
+	args = parser.parse_args()
+	matches = glob(args.inputFile)
+	if len(matches) == 0:
+		print ("Nothing found in %s to benchmark, quitting" % args.inputFile)
+		exit()
+
+	print ("File, Backend, Benchmark, Seconds, MB/s, Records/s")
+	for filename in matches:
+		for backend in args.backend.split(","):
+			for name, seconds, records in benchmark(filename, backend, int(args.repeats)):
+				megabytes = os.path.getsize(filename) / 1048576
+				print ("%s, %s, %s, %.3f, %.1f, %.0f" % (os.path.basename(filename), backend, name, seconds, megabytes / seconds, records / seconds))
+
+###############################################################################
+def benchmark(filename, backend, repeats=3):
+	'''
+	time the common ways of reading a file with one backend.  returns a list of (benchmark name, fastest time in seconds, records processed)
+	'''
+	results = []
+	for name, function in [("scanrecords", scanrecords), ("pingheaders", pingheaders), ("pings", pings), ("read_pings", read_pings)]:
+		fastest = None
+		for i in range(repeats):
+			r = pygsf.GSFREADER(filename, useindex=False, backend=backend)
+			start_time = time.perf_counter()
+			records = function(r)
+			duration = time.perf_counter() - start_time
+			r.close()
+			fastest = duration if fastest is None else min(fastest, duration)
+		results.append((name, max(fastest, 1e-9), records))
+	return results
+
+###############################################################################
+def scanrecords(r):
+	'''walk every record header'''
+	return len(r.scanrecords())
+
+###############################################################################
+def pingheaders(r):
+	'''build the index and gather the ping headers, the random access pattern'''
+	r.index = r.buildindex()
+	return len(r.ping_headers())
+
+###############################################################################
+def pings(r):
+	'''decode every ping into python lists, the streaming pattern'''
+	count = 0
+	for ping in r.pings():
+		count += 1
+	return count
+
+###############################################################################
+def read_pings(r):
+	'''decode every ping into numpy arrays'''
+	r.index = r.buildindex()
+	return len(r.read_pings()["time"])
+
+###############################################################################
+if __name__ == "__main__":
+	main()
@@ -15,6 +15,7 @@ from argparse import RawTextHelpFormatter
 from datetime import datetime
 from datetime import timedelta
 from glob import glob
+import numpy as np
 import pygsf
 import struct
 
@@ -26,10 +27,12 @@ def main():
 	parser.add_argument('-dump', action='store_true', default=False, dest='dump', help='Ascii Dump of GSF file ping headers. [Default: False]')
 	parser.add_argument('-dp', action='store_true', default=False, dest='dp', help='Ascii Dump of GSF file record types. [Default: False]')
 	parser.add_argument('-extractbs', action='store_true', default=False, dest='extractbs', help='Extract backscatter from snippet so we can analyse. [Default: False]')
+	parser.add_argument('-correctbs', action='store_true', default=False, dest='correctbs', help='Apply the R2Sonic TVG, gain and footprint correction to the backscatter before extracting it with -extractbs. [Default: False]')
 	parser.add_argument('-i', dest='inputFile', action='store', help='Input gsf filename. It can also be a wildcard, e.g. *.gsf')
 	parser.add_argument('-o', dest='outputFile', action='store', help='Output gsf filename. If not supplied, a filename is auto generated. [Default = ""')
 	parser.add_argument('-odir', dest='odir', action='store', default="", help='Specify a relative output folder e.g. -odir conditioned')
 	parser.add_argument('-r', action='store_true', default=False, dest='recursive', help='Search recursively from the current folder.  [Default: False]')
+	parser.add_argument('-j', dest='jobs', action='store', default="1", help='Number of files to process in parallel, 0 uses all cores. e.g. -j 8 [Default: 1]')
 
 	if len(sys.argv)==1:
 		parser.print_help()
@@ -37,7 +40,6 @@ def main():
 		
 	args = parser.parse_args()
 
-	fileCounter=0
 	matches = []
 	extractBackscatter = False
 	writeConditionedFile = False
@@ -78,36 +80,34 @@ def main():
 	if args.extractbs:
 		extractBackscatter = True
 		writeConditionedFile= False #we do not need to write out a .gsf file
-		# we need a generic set of beams into which we can insert individual ping data.  Thhis will be the angular respnse curve
-		# make an arc which supports triple frequency.  we can then analyse all frequencies at the same time
-		beamdetail = [0,0,0,0]
-		startAngle = -90
-		ARC = [[pygsf.cBeam(beamdetail, i), pygsf.cBeam(beamdetail, i), pygsf.cBeam(beamdetail, i)] for i in range(startAngle, -startAngle)]
-		# use a dictionary so we can easily find the correct array by frequency
-		beamPointingAngles = []
-		transmitSector = []
-
-	for filename in matches:
-		if dump:
-			dumpfile(filename, str(args.odir))
-		if dp:
-			dumppacket(filename, str(args.odir))
+		outFileName = os.path.join(os.path.dirname(os.path.abspath(matches[0])), args.odir, "AngularResponseCurve_.csv")
+		outFileName = createOutputFileName(outFileName)
 
-		if writeConditionedFile:
-			createsubsetfile(filename, str(args.odir), exclude)
-		if extractBackscatter:
-			outFileName = os.path.join(os.path.dirname(os.path.abspath(matches[0])), args.odir, "AngularResponseCurve_.csv")
-			outFileName = createOutputFileName(outFileName)
-			ARC = extractARC(filename, ARC, pygsf.ARCIdx, beamPointingAngles, transmitSector)
-			# ARC, beamPointingAngles, transmitSector = extractARC(filename, ARC, ARCIdx, beamPointingAngles, transmitSector)
-
-		update_progress("Processed: %s (%d/%d)" % (filename, fileCounter, len(matches)), (fileCounter/len(matches)))
-		fileCounter +=1
+	# each worker extracts an angular response curve for its own file, and we merge them in file order
+	jobs = [(filename, str(args.odir), dump, dp, exclude, writeConditionedFile, extractBackscatter, args.correctbs) for filename in matches]
+	results = pygsf.runjobs(conditionfile, jobs, int(args.jobs))
 
 	if extractBackscatter:
+		ARC = pygsf.createARC()
+		for fileARC in results:
+			pygsf.mergeARC(ARC, fileARC)
 		saveARC(outFileName, ARC)
 
-		update_progress("Process Complete: ", (fileCounter/len(matches)))
+###############################################################################
+def conditionfile(filename, odir, dump, dp, exclude, writeConditionedFile, extractBackscatter, correctBackscatter=False):
+	'''process a single file, returning its angular response curve if we are extracting backscatter'''
+	if dump:
+		dumpfile(filename, odir)
+	if dp:
+		dumppacket(filename, odir)
+	if writeConditionedFile:
+		createsubsetfile(filename, odir, exclude)
+	if extractBackscatter:
+		# make an arc which supports triple frequency.  we can then analyse all frequencies at the same time
+		beamPointingAngles = []
+		transmitSector = []
+		return extractARC(filename, pygsf.createARC(), pygsf.ARCIdx, beamPointingAngles, transmitSector, correctBackscatter)
+	return None
 
 ###############################################################################
 def saveARC(outFileName, ARC):
@@ -148,16 +148,10 @@ def	dumpfile(filename, odir):
 	counter = 0
 
 	outFilePtr.write ("PingNumber, Latitude(Deg), Longitude(Deg), Frequency(Hz), SerialNumber, Heading(Deg), DepthCorrector(m), GPSTideCorrector(m), TideCorrector(m) \n")
-	while r.moreData():
-		# read a datagram.  If we support it, return the datagram type and aclass for that datagram
-		numberofbytes, recordidentifier, datagram = r.readDatagram()
-		# read the bytes into a buffer 
-		rawBytes = r.readDatagramBytes(datagram.offset, numberofbytes)
-		# the user has opted to skip this datagram, so continue
-		if recordidentifier == pygsf.SWATH_BATHYMETRY:
-			datagram.read()
-			outFilePtr.write ("%d, %s, %.8f, %.8f, %d, %s, %.3f, %.3f, %.3f, %.3f\n" % (datagram.pingnumber, datagram.currentRecordDateTime(), datagram.latitude, datagram.longitude, datagram.frequency, datagram.serialnumber, datagram.heading, datagram.depthcorrector, datagram.gpstidecorrector, datagram.tidecorrector))
-	
+	for numberofbytes, recordidentifier, datagram in r.records(pygsf.SWATH_BATHYMETRY):
+		datagram.read(lazy=True)
+		outFilePtr.write ("%d, %s, %.8f, %.8f, %d, %s, %.3f, %.3f, %.3f, %.3f\n" % (datagram.pingnumber, datagram.currentRecordDateTime(), datagram.latitude, datagram.longitude, datagram.frequency, datagram.serialnumber, datagram.heading, datagram.depthcorrector, datagram.gpstidecorrector, datagram.tidecorrector))
+
 	outFilePtr.close()
 	r.close()
 	print ("Saving dump to: %s" % outFileName)		
@@ -197,50 +191,43 @@ def	createsubsetfile(filename, odir, exclude):
 	outFilePtr = open(outFileName, 'wb')
 	print ("writing subset to file: %s" % outFileName)
 
-	r = pygsf.GSFREADER(filename)
-	counter = 0
-
-	while r.moreData():
-		# read a datagram.  If we support it, return the datagram type and aclass for that datagram
-		numberofbytes, recordidentifier, datagram = r.readDatagram()
-		# read the bytes into a buffer 
-		rawBytes = r.readDatagramBytes(datagram.offset, numberofbytes)
-		# the user has opted to skip this datagram, so continue
-		if recordidentifier in exclude:
-			continue
-		outFilePtr.write(rawBytes)
+	r = pygsf.GSFREADER(filename, useindex=False)
+	records = r.scanrecords()
+	ends = records['offset'] + records['sizeofdata'] + np.where(records['haschecksum'], r.hdrlen + 4, r.hdrlen)
+	# the user has opted to skip these datagrams, so copy the runs of records we keep in as few writes as possible
+	keep = ~np.isin(records['recordidentifier'], exclude)
+	edges = np.flatnonzero(np.diff(np.concatenate(([False], keep, [False])).astype(np.int8)))
+	for first, last in zip(edges[0::2], edges[1::2]):
+		outFilePtr.write(r.readDatagramBytes(int(records['offset'][first]), int(ends[last - 1] - records['offset'][first])))
 	r.close()
 	print ("Saving conditioned file to: %s" % outFileName)		
 	outFilePtr.close()
 	return
 
 ###############################################################################
-def extractARC(filename, ARC, ARCIdx, beamPointingAngles, transmitSector):
+def extractARC(filename, ARC, ARCIdx, beamPointingAngles, transmitSector, correct=False):
+	'''accumulate the backscatter of every beam in a file into its angular response curve slot.  set correct to apply the R2Sonic backscatter correction first'''
 	r = pygsf.GSFREADER(filename, True)
 
-	while r.moreData():
-		# read a datagram.  If we support it, return the datagram type and a class for that datagram
-		numberofbytes, recordidentifier, datagram = r.readDatagram()
-
-		'''to extract backscatter angular response curve we need to keep a count and sum of gsf samples in a per degree sector'''
-		'''to do this, we need to take into account the take off angle of each beam'''
-		if recordidentifier == pygsf.SWATH_BATHYMETRY:
-			datagram.scalefactors = r.scalefactors
-			datagram.perbeam = True
-			datagram.snippettype = pygsf.SNIPPET_NONE  #define the snippet algorithm here.
-			datagram.read()
-
-			# we have an R2 system, so we can apply a backscatter correction algorithm
-			samplearray = datagram.R2Soniccorrection()
-			idx = pygsf.ARCIdx[datagram.frequency]
-			for i in range(datagram.numbeams):
-				# now place the results into the correct bucket based on frequency
-				arcIndex = round(datagram.BEAM_ANGLE_ARRAY[i]- ARC[0][idx].takeOffAngle) # efficiently find the correct slot for the data
-				# ARC[arcIndex][idx].sampleMin = min(samplearray[i])
-				# ARC[arcIndex][idx].sampleMax = max(samplearray[i])
-				ARC[arcIndex][idx].sampleSum += samplearray[i]
-				ARC[arcIndex][idx].numberOfSamplesPerBeam += 1
-				ARC[arcIndex][idx].sector = datagram.SECTOR_NUMBER_ARRAY[i]
+	# to extract backscatter angular response curve we need to keep a count and sum of gsf samples in a per degree sector
+	# to do this, we need to take into account the take off angle of each beam
+	for numberofbytes, recordidentifier, datagram in r.records(pygsf.SWATH_BATHYMETRY):
+		datagram.scalefactors = r.scalefactors
+		datagram.perbeam = True
+		datagram.snippettype = pygsf.SNIPPET_NONE  #define the snippet algorithm here.
+		datagram.read(lazy=True)
+
+		# we have an R2 system, so we can apply a backscatter correction algorithm
+		samplearray = datagram.R2Soniccorrection(correct)
+		idx = pygsf.ARCIdx[datagram.frequency]
+		for i in range(datagram.numbeams):
+			# now place the results into the correct bucket based on frequency
+			arcIndex = round(datagram.BEAM_ANGLE_ARRAY[i]- ARC[0][idx].takeOffAngle) # efficiently find the correct slot for the data
+			# ARC[arcIndex][idx].sampleMin = min(samplearray[i])
+			# ARC[arcIndex][idx].sampleMax = max(samplearray[i])
+			ARC[arcIndex][idx].sampleSum += samplearray[i]
+			ARC[arcIndex][idx].numberOfSamplesPerBeam += 1
+			ARC[arcIndex][idx].sector = datagram.SECTOR_NUMBER_ARRAY[i]
 	return ARC
 
 ###############################################################################
@@ -256,15 +243,6 @@ def decdeg2dms(dd):
    degrees = degrees if is_positive else -degrees
    return (degrees,minutes,seconds)
 ###############################################################################
-def update_progress(job_title, progress):
-	length = 20 # modify this to change the length
-	block = int(round(length*progress))
-	msg = "\r{0}: [{1}] {2}%".format(job_title, "#"*block + "-"*(length-block), round(progress*100, 2))
-	if progress >= 1: msg += " DONE\r\n"
-	sys.stdout.write(msg)
-	sys.stdout.flush()
-
-###############################################################################
 def createOutputFileName(path):
 	'''Create a valid output filename. if the name of the file already exists the file name is auto-incremented.'''
 	path	  = os.path.expanduser(path)
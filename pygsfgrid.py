@@ -0,0 +1,373 @@
+#name:			pygsfgrid
+#created:		October 2026
+#description:	python module to grid the soundings in one or more gsf files into a bathymetric surface, streaming the pings through tiles on disc so a whole survey grids in bounded memory
+#				See readme.md for more details
+
+import sys
+import os
+import math
+import shutil
+import tempfile
+from collections import OrderedDict
+from argparse import ArgumentParser
+from argparse import RawTextHelpFormatter
+from glob import glob
+import numpy as np
+import pygsf
+import georeference
+
+# the per cell statistics held in each tile.  M2 is the weighted sum of squared differences from the mean, from which we compute the variance (Welford).  the weight is the number of soundings, or the sum of the TPU weights in a TPU weighted grid
+# W2V is the sum of the squared weight times the vertical variance of each sounding in a TPU weighted grid, from which we propagate the uncertainty of the weighted mean
+TILECOUNT = 0
+TILEWEIGHT = 1
+TILEMEAN = 2
+TILEM2 = 3
+TILEMIN = 4
+TILEMAX = 5
+TILEW2V = 6
+TILELAYERS = 7
+
+# the statistics we can write out of a grid.  uncertainty is only available from a TPU weighted grid
+GRIDSTATISTICS = ['count', 'mean', 'min', 'max', 'variance', 'stddev', 'uncertainty']
+
+# the width of a TPU footprint kernel in standard deviations of the horizontal error
+KERNELSIGMAS = 3.0
+
+# the value written into empty cells of a .flt raster.  .npy rasters use NaN
+NODATA = -9999.0
+
+# the coordinate reference system of the grid, written alongside .flt rasters
+WGS84WKT = 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]]'
+
+###############################################################################
+def main():
+	parser = ArgumentParser(description='Grid the soundings in one or more gsf files into a bathymetric surface.',
+			epilog='Example: \n To grid a single file at 5m use -i c:/temp/myfile.gsf -r 5 -o c:/temp/surface \n To grid a survey and write the mean and standard deviation use -i c:/survey/*.gsf -r 2 -o c:/temp/survey -statistic mean,stddev\n', formatter_class=RawTextHelpFormatter)
+	parser.add_argument('-i', dest='inputFile', action='store', help='Input gsf filename. It can also be a wildcard, e.g. *.gsf')
+	parser.add_argument('-r', dest='resolution', action='store', default="5", help='The grid resolution in metres. e.g. -r 2 [Default: 5]')
+	parser.add_argument('-o', dest='outputFile', action='store', default="surface", help='The output raster name.  A .flt raster with a .hdr header is written for each statistic, or a .npy array if the name ends in .npy [Default: surface]')
+	parser.add_argument('-statistic', dest='statistic', action='store', default="mean", help='The statistics to write, from %s. e.g. -statistic mean,stddev [Default: mean]' % ",".join(GRIDSTATISTICS))
+	parser.add_argument('-odir', dest='odir', action='store', default=None, help='The folder for the tiles while gridding, which needs room for the whole grid.  [Default: a temporary folder]')
+	parser.add_argument('-tpu', action='store_true', default=False, dest='tpu', help='Weight each sounding by its vertical error and spread it over the cells within its horizontal error, using the error arrays in the pings.  Soundings without a vertical error are skipped.  [Default: False]')
+	parser.add_argument('-ellipsoidal', action='store_true', default=False, dest='ellipsoidal', help='Position the soundings using the local wgs84 earth radius at each ping rather than the mean earth radius.  [Default: False]')
+
+	if len(sys.argv)==1:
+		parser.print_help()
+		sys.exit(1)
+
+	args = parser.parse_args()
+	matches = glob(args.inputFile)
+	if len(matches) == 0:
+		print ("Nothing found in %s to grid, quitting" % args.inputFile)
+		exit()
+
+	grid = GRID(float(args.resolution), args.odir, weighted=args.tpu)
+	for i, filename in enumerate(matches):
+		gridfile(filename, grid, ellipsoidal=args.ellipsoidal)
+		pygsf.update_progress("Gridded: %s (%d/%d)" % (filename, i + 1, len(matches)), (i + 1) / len(matches))
+
+	if grid.extent() is None:
+		print ("No soundings were gridded%s, quitting" % (", a TPU weighted grid needs the vertical error arrays" if args.tpu else ""))
+		grid.close()
+		exit()
+
+	root, ext = os.path.splitext(args.outputFile)
+	for statistic in args.statistic.split(","):
+		outFileName = "%s_%s%s" % (root, statistic, ext if ext == ".npy" else ".flt")
+		grid.save(outFileName, statistic)
+		print ("Written %s" % outFileName)
+	grid.close()
+
+###############################################################################
+def gridfile(filename, grid, batchsize=200, ellipsoidal=False):
+	'''
+	georeference the pings in a gsf file and add the soundings to the grid, batchsize pings at a time, so memory does not grow with the size of the file.  rejected beams are skipped.
+	a TPU weighted grid is given the vertical and horizontal error of each sounding as well
+	'''
+	fields = ['DEPTH_ARRAY', 'ACROSS_TRACK_ARRAY', 'ALONG_TRACK_ARRAY', 'BEAM_FLAGS_ARRAY']
+	if grid.weighted:
+		fields += ['VERTICAL_ERROR_ARRAY', 'HORIZONTAL_ERROR_ARRAY']
+	r = pygsf.GSFREADER(filename)
+	r.loadpingtable()
+	for start in range(0, len(r.pingoffsets), batchsize):
+		pings = r.read_pings(start, batchsize, fields=fields)
+		longitude, latitude = georeference.georeference(pings['latitude'], pings['longitude'], pings['heading'], pings['ACROSS_TRACK_ARRAY'], pings['ALONG_TRACK_ARRAY'], ellipsoidal)
+		good = ~(pings['BEAM_FLAGS_ARRAY'] < 0)
+		if grid.weighted:
+			grid.add(longitude[good], latitude[good], pings['DEPTH_ARRAY'][good], pings['VERTICAL_ERROR_ARRAY'][good], pings['HORIZONTAL_ERROR_ARRAY'][good])
+		else:
+			grid.add(longitude[good], latitude[good], pings['DEPTH_ARRAY'][good])
+	r.close()
+
+###############################################################################
+class GRID:
+	def __init__(self, resolution, folder=None, tilesize=512, maxtiles=16, weighted=False, maxkernel=3):
+		'''
+		class to grid soundings into a geographic surface of resolution metres.  The count, mean, minimum, maximum and variance of each cell are accumulated a batch of soundings at a time.
+		the grid is held in square tiles of tilesize cells, made as the soundings reach them, so the extent does not need to be known in advance.  Each tile is a memory mapped file in folder (a temporary folder by default), and only maxtiles are kept open at once, so memory stays bounded however large the survey.
+		set weighted for a TPU weighted grid, where each sounding is given with its vertical and horizontal error (1 sigma, metres), and spread over a footprint of up to maxkernel cells either side of its own cell (see footprints)
+		'''
+		self.resolution = resolution
+		self.weighted = weighted
+		self.maxkernel = maxkernel
+		self.tilesize = tilesize
+		self.maxtiles = maxtiles
+		self.removefolder = folder is None
+		self.folder = tempfile.mkdtemp(prefix="pygsfgrid") if folder is None else folder
+		os.makedirs(self.folder, exist_ok=True)
+		self.originlongitude = None
+		self.originlatitude = None
+		self.xdim = None
+		self.ydim = None
+		self.tiles = OrderedDict()		# the open tiles, least recently used first
+		self.tilekeys = set()			# every tile made so far
+
+	def __str__(self):
+		'''
+		pretty print this class
+		'''
+		return "GRID %.3fm, %d tiles of %d cells in %s" % (self.resolution, len(self.tilekeys), self.tilesize, self.folder)
+
+	def setorigin(self, longitude, latitude):
+		'''
+		fix the cell size in degrees for the resolution in metres at this latitude, and snap the origin of the grid to it.  This is done from the first sounding, so all the cells are the same size in degrees
+		'''
+		metresperdegree = georeference.radiusfromlatitude(latitude) * math.pi / 180
+		self.ydim = self.resolution / metresperdegree
+		self.xdim = self.resolution / (metresperdegree * math.cos(math.radians(latitude)))
+		self.originlongitude = math.floor(longitude / self.xdim) * self.xdim
+		self.originlatitude = math.floor(latitude / self.ydim) * self.ydim
+
+	def cells(self, longitude, latitude):
+		'''return the (column, row) of the cell holding each position.  rows count north from the origin'''
+		column = np.floor((longitude - self.originlongitude) / self.xdim).astype(np.int64)
+		row = np.floor((latitude - self.originlatitude) / self.ydim).astype(np.int64)
+		return column, row
+
+	def tilefilename(self, key):
+		return os.path.join(self.folder, "tile_%d_%d.dat" % key)
+
+	def tile(self, key):
+		'''
+		return the (TILELAYERS, tilesize, tilesize) memory mapped array of the tile at key = (tile column, tile row), opening or making it as needed, and closing the least recently used tile if too many are open
+		'''
+		if key in self.tiles:
+			self.tiles.move_to_end(key)
+			return self.tiles[key]
+		shape = (TILELAYERS, self.tilesize, self.tilesize)
+		if key in self.tilekeys:
+			tile = np.memmap(self.tilefilename(key), dtype=np.float64, mode='r+', shape=shape)
+		else:
+			tile = np.memmap(self.tilefilename(key), dtype=np.float64, mode='w+', shape=shape)
+			tile[TILEMIN] = np.inf
+			tile[TILEMAX] = -np.inf
+			self.tilekeys.add(key)
+		self.tiles[key] = tile
+		while len(self.tiles) > self.maxtiles:
+			oldkey, oldtile = self.tiles.popitem(last=False)
+			oldtile.flush()
+		return tile
+
+	def add(self, longitude, latitude, depth, verticalerror=None, horizontalerror=None):
+		'''
+		add a batch of soundings to the grid.  the inputs are arrays of any shape, and soundings with a NaN position or depth are skipped.
+		a TPU weighted grid needs the vertical error of each sounding, and skips those without a positive vertical error.  The horizontal error is optional, and without it each sounding only reaches its own cell
+		'''
+		longitude = np.asarray(longitude, dtype=np.float64).ravel()
+		latitude = np.asarray(latitude, dtype=np.float64).ravel()
+		depth = np.asarray(depth, dtype=np.float64).ravel()
+		good = np.isfinite(longitude) & np.isfinite(latitude) & np.isfinite(depth)
+		if self.weighted:
+			if verticalerror is None:
+				raise ValueError("a TPU weighted grid needs the vertical error of each sounding")
+			verticalerror = np.broadcast_to(np.asarray(verticalerror, dtype=np.float64), depth.shape).ravel()
+			horizontalerror = np.zeros(len(depth)) if horizontalerror is None else np.broadcast_to(np.asarray(horizontalerror, dtype=np.float64), depth.shape).ravel()
+			good &= verticalerror > 0
+			verticalerror, horizontalerror = verticalerror[good], horizontalerror[good]
+		longitude, latitude, depth = longitude[good], latitude[good], depth[good]
+		if len(depth) == 0:
+			return
+		if self.originlongitude is None:
+			self.setorigin(longitude[0], latitude[0])
+
+		column, row = self.cells(longitude, latitude)
+		weights = None
+		variances = None
+		if self.weighted:
+			column, row, depth, weights, variances = self.footprints(longitude, latitude, column, row, depth, verticalerror, horizontalerror)
+		tilecolumn = column // self.tilesize
+		tilerow = row // self.tilesize
+		keys, inverse = np.unique(np.column_stack((tilecolumn, tilerow)), axis=0, return_inverse=True)
+		inverse = inverse.ravel()
+		order = np.argsort(inverse, kind='stable')
+		bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+		for i, key in enumerate(keys):
+			selected = order[bounds[i]:bounds[i+1]]
+			tx, ty = int(key[0]), int(key[1])
+			cells = (row[selected] - ty * self.tilesize) * self.tilesize + (column[selected] - tx * self.tilesize)
+			self.accumulate(self.tile((tx, ty)), cells, depth[selected], None if weights is None else weights[selected], None if variances is None else variances[selected])
+
+	def footprints(self, longitude, latitude, column, row, depth, verticalerror, horizontalerror):
+		'''
+		spread each sounding over the cells within KERNELSIGMAS of its horizontal error, up to maxkernel cells either side of its own cell.  The weight in each cell is a gaussian of the distance from the sounding to the nearest edge of the cell, scaled by the inverse of the vertical variance, so the sounding has its full weight in its own cell.
+		the kernels of the whole batch are made at once as a (soundings, kernel cells) block, and the cells outside each footprint masked out.
+		returns the (column, row, depth, weight, vertical variance) of every cell each sounding reaches
+		'''
+		radius = np.where(horizontalerror > 0, KERNELSIGMAS * horizontalerror, 0.0)
+		cellradius = np.minimum(np.ceil(radius / self.resolution), self.maxkernel).astype(np.int64)
+		size = int(cellradius.max())
+		offsets = np.arange(-size, size + 1)
+		columnoffset, rowoffset = [o.ravel() for o in np.meshgrid(offsets, offsets)]
+
+		# the distance in metres from each sounding to the nearest edge of each cell in its kernel
+		x = (longitude - self.originlongitude) / self.xdim - column - 0.5
+		y = (latitude - self.originlatitude) / self.ydim - row - 0.5
+		dx = np.maximum(np.abs(columnoffset - x[:, np.newaxis]) - 0.5, 0.0) * self.resolution
+		dy = np.maximum(np.abs(rowoffset - y[:, np.newaxis]) - 0.5, 0.0) * self.resolution
+		distance = np.hypot(dx, dy)
+
+		inside = (np.abs(columnoffset) <= cellradius[:, np.newaxis]) & (np.abs(rowoffset) <= cellradius[:, np.newaxis]) & (distance <= radius[:, np.newaxis])
+		inside[:, len(offsets) * size + size] = True	# every sounding reaches its own cell
+		sounding, kernelcell = np.nonzero(inside)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			falloff = np.where(distance[sounding, kernelcell] > 0, np.exp(-0.5 * (distance[sounding, kernelcell] / horizontalerror[sounding]) ** 2), 1.0)
+		variances = verticalerror[sounding] ** 2
+		weights = falloff / variances
+		return column[sounding] + columnoffset[kernelcell], row[sounding] + rowoffset[kernelcell], depth[sounding], weights, variances
+
+	def accumulate(self, tile, cells, values, weights=None, variances=None):
+		'''
+		merge a batch of values into the cells of a tile.  The count, weight, mean and M2 of the batch in each cell are made with bincount, and combined with those already in the tile using the weighted parallel form of Welford's algorithm, so the variance stays accurate over any number of batches.
+		without weights every value has a weight of 1.  with the variance of each value, the sum of the squared weight times the variance is added to W2V
+		'''
+		if weights is None:
+			weights = np.ones(len(values))
+		used, inverse = np.unique(cells, return_inverse=True)
+		inverse = inverse.ravel()
+		count = np.bincount(inverse).astype(np.float64)
+		weight = np.bincount(inverse, weights=weights)
+		mean = np.bincount(inverse, weights=weights * values) / weight
+		m2 = np.bincount(inverse, weights=weights * (values - mean[inverse]) ** 2)
+		minimum = np.full(len(used), np.inf)
+		maximum = np.full(len(used), -np.inf)
+		np.minimum.at(minimum, inverse, values)
+		np.maximum.at(maximum, inverse, values)
+
+		layers = tile.reshape(TILELAYERS, -1)
+		oldweight = layers[TILEWEIGHT, used]
+		total = oldweight + weight
+		delta = mean - layers[TILEMEAN, used]
+		layers[TILEMEAN, used] += delta * weight / total
+		layers[TILEM2, used] += m2 + delta ** 2 * oldweight * weight / total
+		layers[TILEWEIGHT, used] = total
+		layers[TILECOUNT, used] += count
+		layers[TILEMIN, used] = np.minimum(layers[TILEMIN, used], minimum)
+		layers[TILEMAX, used] = np.maximum(layers[TILEMAX, used], maximum)
+		if variances is not None:
+			layers[TILEW2V, used] += np.bincount(inverse, weights=weights ** 2 * variances)
+
+	def statistic(self, tile, name):
+		'''
+		return the statistic name (see GRIDSTATISTICS) for every cell of a tile, with NaN in empty cells.  the variance is the sample variance, so it needs at least 2 soundings in a cell.  In a TPU weighted grid it is the weighted variance, with the same correction for the number of soundings.
+		the uncertainty of a TPU weighted grid is the propagated 1 sigma uncertainty of the weighted mean depth, sqrt(sum(w^2 sigma^2)) / sum(w), treating the soundings as independent.  A sounding alone in a cell keeps its own vertical error, however far the footprint weight has fallen off
+		'''
+		count = tile[TILECOUNT]
+		if name == 'uncertainty' and not self.weighted:
+			raise ValueError("uncertainty is only available from a TPU weighted grid")
+		with np.errstate(divide='ignore', invalid='ignore'):
+			variance = np.where(count > 1, tile[TILEM2] / tile[TILEWEIGHT] * count / (count - 1), np.nan)
+			if name == 'count':
+				return count.copy()
+			if name == 'mean':
+				values = tile[TILEMEAN].copy()
+			elif name == 'min':
+				values = tile[TILEMIN].copy()
+			elif name == 'max':
+				values = tile[TILEMAX].copy()
+			elif name == 'variance':
+				values = variance
+			elif name == 'stddev':
+				values = np.sqrt(variance)
+			elif name == 'uncertainty':
+				values = np.sqrt(tile[TILEW2V]) / tile[TILEWEIGHT]
+			else:
+				raise ValueError("unknown statistic %s, use one of %s" % (name, ",".join(GRIDSTATISTICS)))
+		values[count == 0] = np.nan
+		return values
+
+	def extent(self):
+		'''
+		return the (first column, first row, number of columns, number of rows) of the cells holding soundings, or None if the grid is empty
+		'''
+		columns = []
+		rows = []
+		for key in sorted(self.tilekeys):
+			occupied = self.tile(key)[TILECOUNT] > 0
+			r = np.flatnonzero(occupied.any(axis=1))
+			c = np.flatnonzero(occupied.any(axis=0))
+			if len(r) > 0:
+				rows.extend([key[1] * self.tilesize + r[0], key[1] * self.tilesize + r[-1]])
+				columns.extend([key[0] * self.tilesize + c[0], key[0] * self.tilesize + c[-1]])
+		if len(rows) == 0:
+			return None
+		return int(min(columns)), int(min(rows)), int(max(columns) - min(columns) + 1), int(max(rows) - min(rows) + 1)
+
+	def save(self, filename, statistic='mean'):
+		'''
+		write a statistic of the grid as a north up raster, cropped to the cells holding soundings.  a name ending in .npy writes a numpy array with NaN in empty cells, and any other name writes a float32 .flt raster with an ESRI .hdr header and .prj which GDAL can read as a GeoTIFF source.
+		the raster is written a tile at a time through a memory map, so it never needs to fit in memory
+		'''
+		extent = self.extent()
+		if extent is None:
+			print ("grid is empty, nothing to write to %s" % filename)
+			return
+		firstcolumn, firstrow, ncols, nrows = extent
+		if filename.endswith(".npy"):
+			raster = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=(nrows, ncols))
+			nodata = np.nan
+		else:
+			raster = np.memmap(os.path.splitext(filename)[0] + ".flt", dtype='<f4', mode='w+', shape=(nrows, ncols))
+			nodata = NODATA
+		# cells outside every tile are empty too
+		raster[:] = nodata
+
+		for key in sorted(self.tilekeys):
+			tx, ty = key
+			# the cells of this tile which fall inside the raster
+			c0 = max(tx * self.tilesize, firstcolumn)
+			c1 = min((tx + 1) * self.tilesize, firstcolumn + ncols)
+			r0 = max(ty * self.tilesize, firstrow)
+			r1 = min((ty + 1) * self.tilesize, firstrow + nrows)
+			if c0 >= c1 or r0 >= r1:
+				continue
+			values = self.statistic(self.tile(key), statistic)[r0 - ty * self.tilesize:r1 - ty * self.tilesize, c0 - tx * self.tilesize:c1 - tx * self.tilesize]
+			values = np.where(np.isnan(values), nodata, values)
+			# rows count north from the origin, but rasters are written north up
+			top = firstrow + nrows - r1
+			raster[top:top + (r1 - r0), c0 - firstcolumn:c1 - firstcolumn] = values[::-1]
+		raster.flush()
+		del raster
+
+		if not filename.endswith(".npy"):
+			root = os.path.splitext(filename)[0]
+			with open(root + ".hdr", 'w') as f:
+				f.write("NROWS %d\nNCOLS %d\nNBANDS 1\nNBITS 32\nPIXELTYPE FLOAT\nBYTEORDER I\nLAYOUT BIL\n" % (nrows, ncols))
+				# the map position is the centre of the top left cell
+				f.write("ULXMAP %.12f\nULYMAP %.12f\n" % (self.originlongitude + (firstcolumn + 0.5) * self.xdim, self.originlatitude + (firstrow + nrows - 0.5) * self.ydim))
+				f.write("XDIM %.12f\nYDIM %.12f\nNODATA %g\n" % (self.xdim, self.ydim, NODATA))
+			with open(root + ".prj", 'w') as f:
+				f.write(WGS84WKT)
+
+	def close(self):
+		'''
+		close the tiles, and remove them if they are in our temporary folder
+		'''
+		for tile in self.tiles.values():
+			tile.flush()
+		self.tiles.clear()
+		if self.removefolder:
+			shutil.rmtree(self.folder, ignore_errors=True)
+
+###############################################################################
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,55 @@
+#name:			pygsfverify
+#created:		October 2026
+#description:	python module to verify the checksums of the records in gsf files, e.g. as a gate when ingesting a survey
+#				See readme.md for more details
+
+import sys
+import os
+from argparse import ArgumentParser
+from argparse import RawTextHelpFormatter
+from glob import glob
+import pygsf
+
+###############################################################################
+def main():
+	parser = ArgumentParser(description='Verify the checksum of every record in one or more gsf files, and report the records which fail.',
+			epilog='Example: \n To verify a single file use -i c:/temp/myfile.gsf \n To verify a survey using all cores use -i c:/survey/*.gsf -j 0\n', formatter_class=RawTextHelpFormatter)
+	parser.add_argument('-i', dest='inputFile', action='store', help='Input gsf filename. It can also be a wildcard, e.g. *.gsf')
+	parser.add_argument('-j', dest='jobs', action='store', default="1", help='Number of files to verify in parallel, 0 uses all cores. e.g. -j 8 [Default: 1]')
+
+	if len(sys.argv)==1:
+		parser.print_help()
+		sys.exit(1)
+
+	args = parser.parse_args()
+	matches = glob(args.inputFile)
+	if len(matches) == 0:
+		print ("Nothing found in %s to verify, quitting" % args.inputFile)
+		exit()
+
+	results = pygsf.runjobs(verifyfile, [(filename,) for filename in matches], int(args.jobs), "Verified")
+
+	failures = 0
+	print ("File, Records, Checksummed, Failed")
+	for filename, records, checksummed, mismatches in results:
+		print ("%s, %d, %d, %d" % (os.path.basename(filename), records, checksummed, len(mismatches)))
+		for m in mismatches:
+			print ("  checksum failure at offset %d in record type %d: stored %08x computed %08x" % (m['offset'], m['recordidentifier'], m['stored'], m['computed']))
+		failures += len(mismatches)
+	# a non zero exit code lets an ingest script stop on a bad file
+	sys.exit(1 if failures > 0 else 0)
+
+###############################################################################
+def verifyfile(filename):
+	'''
+	verify one file.  returns (filename, number of records, number of records with a checksum, the records which failed)
+	'''
+	r = pygsf.GSFREADER(filename, useindex=False)
+	scan = r.scanrecords()
+	mismatches = r.verifychecksums()
+	r.close()
+	return filename, len(scan), int(scan['haschecksum'].sum()), mismatches
+
+###############################################################################
+if __name__ == "__main__":
+	main()
@@ -35,6 +35,7 @@ def main():
 	parser.add_argument('-z', dest='zoom', default = 0, action='store', help='Zoom scale factor. A larger number makes a larger image, and a smaller number (0.5) provides a smaller image, e.g -z 2 makes an image twice the native resolution. [Default: 0]')
 	parser.add_argument('-arc', dest='arc', action='store', default="", help='Apply an angular response curve to the data e.g. -arc c:\\arc.csv')
 	parser.add_argument('-autoarc', dest='autoarc', action='store_true', default=False, help='Compute then apply an angular response curve to the data. [Defaul: False]')
+	parser.add_argument('-j', dest='jobs', action='store', default="1", help='Number of files to process in parallel, 0 uses all cores. e.g. -j 8 [Default: 1]')
 
 	if len(sys.argv)==1:
 		parser.print_help()
@@ -58,15 +59,14 @@ def main():
 		applyarc=True
 		print ("Loading angular response curve:", args.arc)
 		# make an arc which supports triple frequency.  we can then analyse all frequencies at the same time
-		beamdetail = [0,0,0,0]
-		startAngle = -90
-		ARC = [[pygsf.cBeam(beamdetail, i), pygsf.cBeam(beamdetail, i), pygsf.cBeam(beamdetail, i)] for i in range(startAngle, -startAngle)]
+		ARC = pygsf.createARC()
 		# ARC = extractARC(filename, ARC, pygsf.ARCIdx, beamPointingAngles, transmitSector)
 # !!!		outFileName = os.path.join(os.path.dirname(os.path.abspath(matches[0])), args.odir, "AngularResponseCurve_.csv")
 		# outFileName = createOutputFileName(outFileName)
 		# saveARC(outFileName, ARC)
 
 	print ("processing with settings: ", args)
+	jobs = []
 	for filename in glob(args.inputFile):
 		if not filename.endswith('.gsf'):
 			print ("File %s is not a .all file, skipping..." % (filename))
@@ -74,30 +74,35 @@ def main():
 		if not os.path.isfile(filename):
 			print ("file not found:", filename)
 			exit()
+		jobs.append((filename, args, applyarc, arc))
+	pygsf.runjobs(processfile, jobs, int(args.jobs))
 
-		xResolution, yResolution, beamCount, leftExtent, rightExtent, distanceTravelled, navigation = computeXYResolution(filename)
-		print("xRes %.2f yRes %.2f  leftExtent %.2f, rightExtent %.2f, distanceTravelled %.2f" % (xResolution, yResolution, leftExtent, rightExtent, distanceTravelled)) 
-		# pkpk tmp
-		# beamCount = 256
-		# xResolution = 1.77
-		# yResolution = 0.258
-		# leftExtent = -98.68
-		# rightExtent = 97.6
-		# distanceTravelled = 2243
-		navigation = []
-		# pkpk tmp
-		if beamCount == 0:
-			print ("No data to process, skipping empty file")
-			continue
-		zoom = float(args.zoom)
-		if (zoom ==0):
-			zoom = 1
-			# swathWidth = abs(leftExtent)+abs(rightExtent)
-			bc = beamCount
-			while (bc < 300):
-				zoom *= 2
-				bc *= zoom 
-		createWaterfall(filename, args.odir, args.color, beamCount, zoom, float(args.clip), float(args.minz), float(args.maxz), args.invert, args.annotate, xResolution, yResolution, args.rotate, leftExtent, rightExtent, distanceTravelled, navigation, applyarc, arc)
+###############################################################################
+def processfile(filename, args, applyarc, arc):
+	'''compute the resolution of a file and create its waterfall images'''
+	xResolution, yResolution, beamCount, leftExtent, rightExtent, distanceTravelled, navigation = computeXYResolution(filename)
+	print("xRes %.2f yRes %.2f  leftExtent %.2f, rightExtent %.2f, distanceTravelled %.2f" % (xResolution, yResolution, leftExtent, rightExtent, distanceTravelled)) 
+	# pkpk tmp
+	# beamCount = 256
+	# xResolution = 1.77
+	# yResolution = 0.258
+	# leftExtent = -98.68
+	# rightExtent = 97.6
+	# distanceTravelled = 2243
+	navigation = []
+	# pkpk tmp
+	if beamCount == 0:
+		print ("No data to process, skipping empty file")
+		return
+	zoom = float(args.zoom)
+	if (zoom ==0):
+		zoom = 1
+		# swathWidth = abs(leftExtent)+abs(rightExtent)
+		bc = beamCount
+		while (bc < 300):
+			zoom *= 2
+			bc *= zoom 
+	createWaterfall(filename, args.odir, args.color, beamCount, zoom, float(args.clip), float(args.minz), float(args.maxz), args.invert, args.annotate, xResolution, yResolution, args.rotate, leftExtent, rightExtent, distanceTravelled, navigation, applyarc, arc)
 
 ###############################################################################
 def createWaterfall(filename, odir, colorScale, beamCount, zoom=1.0, clip=1, minz=0, maxz=100, invert=True, annotate=True, xResolution=1, yResolution=1, rotate=False, leftExtent=-100, rightExtent=100, distanceTravelled=0, navigation=[], applyarc=False, arc=[]):
@@ -117,62 +122,60 @@ def createWaterfall(filename, odir, colorScale, beamCount, zoom=1.0, clip=1, min
 	scalefactors = r.loadscalefactors()
 	totalrecords = r.getrecordcount()
 
-	while r.moreData():
-		numberofbytes, recordidentifier, datagram = r.readDatagram()
-		if recordidentifier == 2: #SWATH_BATHYMETRY_PING
-			datagram.scalefactors = scalefactors
-			datagram.perbeam = True
-			datagram.snippettype = pygsf.SNIPPET_NONE
-			datagram.read()
-			datagram.cliptwtt(0)
-			datagram.clipintensity(0)
-			datagram.clippolar(-60,60)
-			
-			samplearray = datagram.R2Soniccorrection()
-			idx = pygsf.ARCIdx[datagram.frequency]
-
-			# we need to stretch the data to make it isometric, so lets use numpy interp routing to do that for Us
-			s2 = []
-			xt = []
-			for i, x in enumerate(datagram.ACROSS_TRACK_ARRAY):
-				if datagram.BEAM_FLAGS_ARRAY[i] < 0: #skip rejected records
-					continue
-				# ignore small cross track offsets.  some GSF files have -0.01 for the outer beams where there is no observation. This screws up the numpy inter routine
-				if abs(x) > 0.1:
-					xt.append(x)
-					if applyarc:
-						# angle = datagram.BEAM_ANGLE_ARRAY[i]
-						arcIndex = round(datagram.BEAM_ANGLE_ARRAY[i] + datagram.roll) + 90 + 1  # efficiently find the correct slot for the data.  we have a CSV from -90 to +90 and a header line
-						# arcIndex = round(datagram.BEAM_ANGLE_ARRAY[i]) - int(arc[0][3]) # efficiently find the correct slot for the data
-						s2.append(samplearray[i] - arc[arcIndex][idx])
-					else:
-						s2.append(samplearray[i])
-
-			# we need to mask the zero's out or we get strange images.
-			# xt = ma.masked_equal(xt, 0.0)
-			xp = np.array(xt) #the x distance for the beams of a ping.  we could possibly use the real values here instead todo
-			fp = np.array(s2) #the Backscatter list as a numpy array
-			# fp = ma.masked_equal(fp, 0.0)
-			x = np.linspace(leftExtent, rightExtent, outputResolution) #the required samples needs to be about the same as the original number of samples, spread across the across track range
-			newBackscatters = np.interp(x, xp, fp, left=0.0, right=0.0)
-			
-			if datagram.frequency == 100000:
-				waterfall100.append(np.asarray(newBackscatters))			
-				# print ("xt %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f" %(samplearray[0], samplearray[10], samplearray[20], samplearray[30], samplearray[40], samplearray[50], samplearray[60], samplearray[70], samplearray[80], samplearray[90], samplearray[100], samplearray[110], samplearray[120], samplearray[130], samplearray[140], samplearray[150], samplearray[160], samplearray[170], samplearray[180], samplearray[190],))
-			if datagram.frequency == 200000:
-				waterfall200.append(np.asarray(newBackscatters))			
-			if datagram.frequency == 400000:
-				waterfall400.append(np.asarray(newBackscatters))			
-
-			recCount += 1
-			# temp to make things faster
-			# if recCount == 200:
-			# 	break
-
-			if datagram.currentRecordDateTime().timestamp() % 30 == 0:
-				percentageRead = (recCount / totalrecords) 
-				update_progress("Decoding .gsf file", percentageRead)
-	update_progress("Decoding .gsf file", 1)
+	for numberofbytes, recordidentifier, datagram in r.records(pygsf.SWATH_BATHYMETRY):
+		datagram.scalefactors = scalefactors
+		datagram.perbeam = True
+		datagram.snippettype = pygsf.SNIPPET_NONE
+		datagram.read(lazy=True)
+		datagram.cliptwtt(0)
+		datagram.clipintensity(0)
+		datagram.clippolar(-60,60)
+		
+		samplearray = datagram.R2Soniccorrection()
+		idx = pygsf.ARCIdx[datagram.frequency]
+
+		# we need to stretch the data to make it isometric, so lets use numpy interp routing to do that for Us
+		s2 = []
+		xt = []
+		for i, x in enumerate(datagram.ACROSS_TRACK_ARRAY):
+			if datagram.BEAM_FLAGS_ARRAY[i] < 0: #skip rejected records
+				continue
+			# ignore small cross track offsets.  some GSF files have -0.01 for the outer beams where there is no observation. This screws up the numpy inter routine
+			if abs(x) > 0.1:
+				xt.append(x)
+				if applyarc:
+					# angle = datagram.BEAM_ANGLE_ARRAY[i]
+					arcIndex = round(datagram.BEAM_ANGLE_ARRAY[i] + datagram.roll) + 90 + 1  # efficiently find the correct slot for the data.  we have a CSV from -90 to +90 and a header line
+					# arcIndex = round(datagram.BEAM_ANGLE_ARRAY[i]) - int(arc[0][3]) # efficiently find the correct slot for the data
+					s2.append(samplearray[i] - arc[arcIndex][idx])
+				else:
+					s2.append(samplearray[i])
+
+		# we need to mask the zero's out or we get strange images.
+		# xt = ma.masked_equal(xt, 0.0)
+		xp = np.array(xt) #the x distance for the beams of a ping.  we could possibly use the real values here instead todo
+		fp = np.array(s2) #the Backscatter list as a numpy array
+		# fp = ma.masked_equal(fp, 0.0)
+		x = np.linspace(leftExtent, rightExtent, outputResolution) #the required samples needs to be about the same as the original number of samples, spread across the across track range
+		newBackscatters = np.interp(x, xp, fp, left=0.0, right=0.0)
+		
+		if datagram.frequency == 100000:
+			waterfall100.append(np.asarray(newBackscatters))			
+			# print ("xt %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f %.3f" %(samplearray[0], samplearray[10], samplearray[20], samplearray[30], samplearray[40], samplearray[50], samplearray[60], samplearray[70], samplearray[80], samplearray[90], samplearray[100], samplearray[110], samplearray[120], samplearray[130], samplearray[140], samplearray[150], samplearray[160], samplearray[170], samplearray[180], samplearray[190],))
+		if datagram.frequency == 200000:
+			waterfall200.append(np.asarray(newBackscatters))			
+		if datagram.frequency == 400000:
+			waterfall400.append(np.asarray(newBackscatters))			
+
+		recCount += 1
+		# temp to make things faster
+		# if recCount == 200:
+		# 	break
+
+		if datagram.currentRecordDateTime().timestamp() % 30 == 0:
+			percentageRead = (recCount / totalrecords) 
+			pygsf.update_progress("Decoding .gsf file", percentageRead)
+	pygsf.update_progress("Decoding .gsf file", 1)
 	r.close()	
 
 	if len(waterfall100) > 0:
@@ -385,8 +388,8 @@ def computeXYResolution(fileName):
 	'''we compute the alongtracks by computing the linear length between all nav updates and dividing this by the number of pings'''
 	xResolution = 1
 	YResolution = 1
-	prevLong = 0 
-	prevLat = 0
+	latitudes = []
+	longitudes = []
 	recCount = 0
 	acrossMeans = np.array([])
 	alongIntervals = np.array([])
@@ -401,30 +404,26 @@ def computeXYResolution(fileName):
 	r = pygsf.GSFREADER(fileName)
 	scalefactors = r.loadscalefactors()
 
-	while r.moreData():
-		numberofbytes, recordidentifier, datagram = r.readDatagram()
-		if recordidentifier == 2: #SWATH_BATHYMETRY_PING
-			datagram.scalefactors = scalefactors	
-			datagram.read()
-			if prevLat == 0:
-				prevLat =  datagram.latitude
-				prevLong =  datagram.longitude
-			range,bearing1, bearing2  = geodetic.calculateRangeBearingFromGeographicals(prevLong, prevLat, datagram.longitude, datagram.latitude)
-			# print (range,bearing1)
-			distanceTravelled += range
-			navigation.append([recCount, datagram.currentRecordDateTime(), datagram.latitude, datagram.longitude])
-			prevLat =  datagram.latitude
-			prevLong =  datagram.longitude
-			if datagram.numbeams > 1:
-				datagram.ACROSS_TRACK_ARRAY = [x for x in datagram.ACROSS_TRACK_ARRAY if x != 0.0]
-				if (len(datagram.ACROSS_TRACK_ARRAY) > 0):
-					acrossMeans = np.append(acrossMeans, np.average(abs(np.diff(np.asarray(datagram.ACROSS_TRACK_ARRAY)))))
-					leftExtents = np.append(leftExtents, min(datagram.ACROSS_TRACK_ARRAY))
-					rightExtents = np.append(rightExtents, max(datagram.ACROSS_TRACK_ARRAY))
-					recCount = recCount + 1
-					beamCount = max(beamCount, len(datagram.MEAN_REL_AMPLITUDE_ARRAY)) 
-			
+	for numberofbytes, recordidentifier, datagram in r.records(pygsf.SWATH_BATHYMETRY):
+		datagram.scalefactors = scalefactors	
+		datagram.read(lazy=True)
+		navigation.append([recCount, datagram.currentRecordDateTime(), datagram.latitude, datagram.longitude])
+		latitudes.append(datagram.latitude)
+		longitudes.append(datagram.longitude)
+		if datagram.numbeams > 1:
+			datagram.ACROSS_TRACK_ARRAY = [x for x in datagram.ACROSS_TRACK_ARRAY if x != 0.0]
+			if (len(datagram.ACROSS_TRACK_ARRAY) > 0):
+				acrossMeans = np.append(acrossMeans, np.average(abs(np.diff(np.asarray(datagram.ACROSS_TRACK_ARRAY)))))
+				leftExtents = np.append(leftExtents, min(datagram.ACROSS_TRACK_ARRAY))
+				rightExtents = np.append(rightExtents, max(datagram.ACROSS_TRACK_ARRAY))
+				recCount = recCount + 1
+				beamCount = max(beamCount, len(datagram.MEAN_REL_AMPLITUDE_ARRAY)) 
+		
 	r.close()
+	# sum the distance between every pair of pings along the track in one call
+	if len(latitudes) > 1:
+		ranges, bearings1, bearings2 = geodetic.calculateRangeBearingFromGeographicalsArray(longitudes[:-1], latitudes[:-1], longitudes[1:], latitudes[1:])
+		distanceTravelled = float(np.sum(ranges))
 	if recCount == 0:
 		return 0,0,0,0,0,[] 
 	xResolution = np.average(acrossMeans)
@@ -457,14 +456,6 @@ def writeLabel(img, y, label):
 	# img.paste( ImageOps.colorize(txt, (0,0,0), (0,0,255)), (x, y),  txt)
 	return img
 
-def update_progress(job_title, progress):
-	length = 20 # modify this to change the length
-	block = int(round(length*progress))
-	msg = "\r{0}: [{1}] {2}%".format(job_title, "#"*block + "-"*(length-block), round(progress*100, 2))
-	if progress >= 1: msg += " DONE\r\n"
-	sys.stdout.write(msg)
-	sys.stdout.flush()
-
 def spliceImages(img1, img2):
 	# images = map(Image.open, ['Test1.jpg', 'Test2.jpg', 'Test3.jpg'])
 	images = [img1, img2]
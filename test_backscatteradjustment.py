@@ -1,6 +1,7 @@
 import pytest
 import pygsf
 import os
+import numpy as np
 
 def test_backscatteradjustment():
 	'''
@@ -28,6 +29,50 @@ def test_backscatteradjustment():
 	requiredresult = -38.6
 	assert corrected == requiredresult
 
+def test_backscatteradjustmentarray(tmp_path):
+	'''
+	the numpy backscatter adjustment must match the scalar port beam for beam, including for a batch of pings
+	'''
+	f = open(str(tmp_path / "tmp.tmp"), 'a')
+	ping = pygsf.SWATH_BATHYMETRY_PING(f, 0, 0, 0)
+	angles = np.array([-75.0, -58.0, -30.0, -24.9, -0.0005, 0.0, 0.5, 10.0, 25.0, 45.0, 70.0])
+	twtts = np.linspace(0.01, 0.4, len(angles))
+	magnitudes = np.array([470, 1, 65535, 12, 300, 800, 5, 2000, 470, 90, 33])
+	# sound speed, absorption, gain and vtx offset vary by ping
+	settings = [(197.0, 1468.59, 80.0, 0.0174533, 0.0087266, 0.000275, 35.0, 16.0, -0.21), (191.0, 1500.0, 20.0, 0.0349066, 0.0174533, 0.000015, 30.0, 4.0, 0.0)]
+
+	expected = [[ping.backscatteradjustment(a, t, 0, m, *setting) for a, t, m in zip(angles, twtts, magnitudes)] for setting in settings]
+	columns = [np.array(column)[:, np.newaxis] for column in zip(*settings)]
+	corrected = pygsf.backscatteradjustmentarray(np.tile(angles, (2, 1)), np.tile(twtts, (2, 1)), 0, np.tile(magnitudes, (2, 1)), *columns)
+	assert corrected.shape == (2, len(angles))
+	np.testing.assert_array_equal(corrected, expected)
+
+	# invalid beams are zeroed rather than raising
+	corrected = pygsf.backscatteradjustmentarray([-58.0, -58.0], [0.0, 0.20588], 0, [470, 0], *settings[0])
+	np.testing.assert_array_equal(corrected, [0, 0])
+	f.close()
+
+def test_R2Soniccorrection(tmp_path):
+	'''
+	a ping without beam flags is corrected as if every beam was accepted, and a ping without samples gives no samples
+	'''
+	f = open(str(tmp_path / "tmp.tmp"), 'a')
+	ping = pygsf.SWATH_BATHYMETRY_PING(f, 0, 0, 0)
+	ping.numpyarrays = True
+	ping.BEAM_ANGLE_ARRAY = np.array([-58.0, -30.0, 10.0])
+	ping.TRAVEL_TIME_ARRAY = np.array([0.20588, 0.1, 0.05])
+	ping.ACROSS_TRACK_ARRAY = np.array([-140.0, -60.0, 7.0])
+	ping.ALONG_TRACK_ARRAY = np.array([1.0, 0.5, 0.0])
+	ping.transmitsourcelevel, ping.soundspeed, ping.absorptioncoefficient, ping.beamwidthvertical, ping.beamwidthhorizontal, ping.pulsewidth, ping.receiverspreadingloss, ping.receivergain, ping.vtxoffset = 197.0, 1468.59, 80.0, 0.0174533, 0.0087266, 0.000275, 35.0, 16.0, -0.21
+	assert len(ping.R2Soniccorrection(correct=True)) == 0
+
+	ping.MEAN_REL_AMPLITUDE_ARRAY = np.array([470.0, 0.0, 90.0])
+	unflagged = ping.R2Soniccorrection(correct=True)
+	ping.BEAM_FLAGS_ARRAY = np.zeros(3)
+	np.testing.assert_array_equal(unflagged, ping.R2Soniccorrection(correct=True))
+	assert unflagged[1] == 0 and unflagged[0] != 470
+	f.close()
+
 if __name__ == "__main__":
 	test_backscatteradjustment()
 
@@ -0,0 +1,73 @@
+import os
+import math
+import numpy as np
+import pygsf
+import pygsf2cloud
+import georeference
+import geodetic
+
+SAMPLEFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generic-sensor-format-master", "data", "surveys", "0175_20150322_232639_EX1502L2_MB.gsf.mb121")
+
+def test_georeference():
+	'''
+	a batch of pings is georeferenced in one call to within a fraction of a millimetre of the scalar path in pygsf2cloud
+	'''
+	r = pygsf.GSFREADER(SAMPLEFILE, useindex=False)
+	r.index = r.buildindex()
+	pings = r.read_pings(fields=['ACROSS_TRACK_ARRAY', 'ALONG_TRACK_ARRAY'])
+	r.close()
+	x, y = georeference.georeference(pings['latitude'], pings['longitude'], pings['heading'], pings['ACROSS_TRACK_ARRAY'], pings['ALONG_TRACK_ARRAY'])
+	assert x.shape == pings['ACROSS_TRACK_ARRAY'].shape
+
+	for p in range(len(pings['time'])):
+		across = pings['ACROSS_TRACK_ARRAY'][p]
+		along = pings['ALONG_TRACK_ARRAY'][p]
+		for i in range(pings['numbeams'][p]):
+			brg = (90 - (180 / math.pi) * math.atan2(along[i], across[i]) )
+			rng = math.sqrt( (across[i]**2) + (along[i]**2) )
+			x1, y1 = pygsf2cloud.destinationPoint(pings['latitude'][p], pings['longitude'][p], rng, brg + pings['heading'][p], 0)
+			# a billionth of a degree is about a tenth of a millimetre
+			assert abs(y[p, i] - y1) < 1e-9
+			assert abs(x[p, i] - x1) * math.cos(math.radians(y1)) < 1e-9
+
+	# a single ping, and the ellipsoidal option using the local wgs84 radius
+	ping = 1
+	x, y = georeference.georeference(pings['latitude'][ping], pings['longitude'][ping], pings['heading'][ping], pings['ACROSS_TRACK_ARRAY'][ping], pings['ALONG_TRACK_ARRAY'][ping], ellipsoidal=True)
+	assert georeference.radiusfromlatitude(pings['latitude'][ping]) == pygsf2cloud.calculateradiusFromLatitude(pings['latitude'][ping])
+	i = pings['numbeams'][ping] // 3
+	brg = 90 - math.degrees(math.atan2(pings['ALONG_TRACK_ARRAY'][ping][i], pings['ACROSS_TRACK_ARRAY'][ping][i])) + pings['heading'][ping]
+	rng = math.hypot(pings['ACROSS_TRACK_ARRAY'][ping][i], pings['ALONG_TRACK_ARRAY'][ping][i])
+	x1, y1 = georeference.destinationpoints(pings['latitude'][ping], pings['longitude'][ping], rng, brg, pygsf2cloud.calculateradiusFromLatitude(pings['latitude'][ping]))
+	assert abs(x[i] - x1) < 1e-12 and abs(y[i] - y1) < 1e-12
+	assert np.isnan(x[pings['numbeams'][ping]:]).all()
+
+def test_vincenty():
+	'''
+	the array versions of vincenty's formulae match the scalar wrappers and the published Flinders Peak to Buninyong sample, and the direct formula inverts the inverse
+	'''
+	latitude1 = -(( 3.7203 / 60. + 57) / 60. + 37 )
+	longitude1 = ( 29.5244 / 60. + 25) / 60. + 144
+	latitude2 = -(( 10.1561 / 60. + 39) / 60. + 37 )
+	longitude2 = ( 35.3839 / 60. + 55) / 60. + 143
+	s, alpha1Tp2, alpha21 = geodetic.calculateRangeBearingFromGeographicals(longitude1, latitude1, longitude2, latitude2)
+	assert abs(s - 54972.271) < 0.001
+	assert abs(alpha1Tp2 - (( 5.37 / 60. + 52) / 60. + 306)) < 1e-5
+	assert abs(alpha21 - (( 25.07 / 60. + 10) / 60. + 127)) < 1e-5
+	x, y, alpha = geodetic.calculateGeographicalPositionFromRangeBearing(latitude1, longitude1, alpha1Tp2, s)
+	assert abs(x - longitude2) < 1e-9 and abs(y - latitude2) < 1e-9
+
+	# a track of points, including a repeated point and a line along the equator
+	rng = np.random.default_rng(1)
+	lat1 = np.append(rng.uniform(-70, 70, 500), [10, 0])
+	lon1 = np.append(rng.uniform(-170, 170, 500), [20, 0])
+	lat2 = np.append(lat1[:-2] + rng.uniform(-1, 1, 500), [10, 0])
+	lon2 = np.append(lon1[:-2] + rng.uniform(-1, 1, 500), [20, 5])
+	s, alpha1Tp2, alpha21 = geodetic.calculateRangeBearingFromGeographicalsArray(lon1, lat1, lon2, lat2)
+	for i in [0, 250, 500, 501]:
+		np.testing.assert_allclose(geodetic.calculateRangeBearingFromGeographicals(lon1[i], lat1[i], lon2[i], lat2[i]), (s[i], alpha1Tp2[i], alpha21[i]))
+	assert s[500] == 0
+	assert abs(s[501] - 556597.454) < 0.001
+	x, y, alpha = geodetic.calculateGeographicalPositionFromRangeBearingArray(lat1[:500], lon1[:500], alpha1Tp2[:500], s[:500])
+	np.testing.assert_allclose(x, lon2[:500], atol=1e-9)
+	np.testing.assert_allclose(y, lat2[:500], atol=1e-9)
+	np.testing.assert_allclose(alpha, alpha21[:500], atol=1e-6)
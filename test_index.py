@@ -0,0 +1,180 @@
+import os
+import math
+import struct
+import pytest
+import numpy as np
+import pygsf
+from gsffixtures import samplefile, makeping, readpings
+
+def test_recordindex(samplefile, monkeypatch):
+	'''
+	the record index is saved alongside the file, reloaded on the next open and rebuilt when the file changes
+	'''
+	r = pygsf.GSFREADER(samplefile)
+	assert os.path.isfile(samplefile + pygsf.INDEXEXTENSION)
+	assert len(r.index) == 45
+	assert r.getrecordcount() == 4
+	assert r.index['offset'][0] == 0
+	assert r.index['recordidentifier'][0] == pygsf.HEADER
+	assert np.all(r.index['offset'][1:] == r.index['offset'][:-1] + r.index['numberofbytes'][:-1])
+	pings = r.index[r.index['recordidentifier'] == pygsf.SWATH_BATHYMETRY]
+	assert pings['time'][0] == pytest.approx(1427066793.17, abs=0.01)
+	assert np.all(np.diff(pings['time']) > 0)
+	r.close()
+
+	# a second open loads the sidecar rather than scanning the file
+	def failbuildindex(self):
+		raise AssertionError("the index should have been loaded from the sidecar")
+	with monkeypatch.context() as m:
+		m.setattr(pygsf.GSFREADER, "buildindex", failbuildindex)
+		r = pygsf.GSFREADER(samplefile)
+		assert r.getrecordcount() == 4
+		r.close()
+
+	# appending a record invalidates the index
+	with open(samplefile, 'ab') as f:
+		f.write(b'\x00\x00\x00\x04\x00\x00\x00\x06\x00\x00\x00\x00')
+	r = pygsf.GSFREADER(samplefile)
+	assert len(r.index) == 46
+	r.close()
+
+	# a partly written sidecar is rebuilt, and the rebuilt index replaces it without leaving a temporary file behind
+	indexfile = samplefile + pygsf.INDEXEXTENSION
+	with open(indexfile, 'r+b') as f:
+		f.truncate(os.path.getsize(indexfile) - 10)
+	r = pygsf.GSFREADER(samplefile)
+	assert len(r.index) == 46
+	r.close()
+	assert os.path.getsize(indexfile) == struct.calcsize(pygsf.INDEXHEADERFMT) + 46 * pygsf.INDEXDTYPE.itemsize
+	assert [name for name in os.listdir(os.path.dirname(indexfile)) if name.endswith(".tmp")] == []
+
+def test_indexroundtrip(samplefile):
+	'''
+	the record index of the sample survey, saved to the sidecar and loaded back, matches the records found by the readDatagram loop, and every ping decoded through it matches the reference decode
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile, useindex=False)
+	records = []
+	while r.moreData():
+		offset = r.currentPtr()
+		numberofbytes, recordidentifier, datagram = r.readDatagram()
+		pingtime = math.nan
+		if recordidentifier == pygsf.SWATH_BATHYMETRY:
+			datagram.read(headeronly=True)
+			pingtime = datagram.time + datagram.pingnanotime / 1000000000.0
+		records.append((offset, recordidentifier, datagram.hdrlen, numberofbytes, pingtime))
+	r.close()
+
+	pygsf.GSFREADER(samplefile).close()
+	with open(samplefile + pygsf.INDEXEXTENSION, 'rb') as f:
+		sidecar = f.read()
+	r = pygsf.GSFREADER(samplefile)
+	index = r.index
+	assert [tuple(row[:4]) for row in records] == [tuple(row)[:4] for row in index.tolist()]
+	pings = index['recordidentifier'] == pygsf.SWATH_BATHYMETRY
+	np.testing.assert_array_equal(index['time'][pings], [row[4] for row in records if row[1] == pygsf.SWATH_BATHYMETRY])
+	for i, l in enumerate(listpings):
+		assert r.ping(i).DEPTH_ARRAY == l.DEPTH_ARRAY
+	r.close()
+
+	# the sidecar rebuilt from scratch is the same, byte for byte
+	os.remove(samplefile + pygsf.INDEXEXTENSION)
+	pygsf.GSFREADER(samplefile).close()
+	with open(samplefile + pygsf.INDEXEXTENSION, 'rb') as f:
+		assert f.read() == sidecar
+
+def test_randomaccess(samplefile):
+	'''
+	pings can be decoded directly by ping number and by time
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile)
+	assert r.ping(2).time == listpings[2].time
+	assert r.ping(-1).DEPTH_ARRAY == listpings[-1].DEPTH_ARRAY
+	with pytest.raises(IndexError):
+		r.ping(4)
+
+	times = r.pingtimes
+	assert r.ping_at_time(times[1] + 0.01).DEPTH_ARRAY == listpings[1].DEPTH_ARRAY
+	assert r.ping_at_time(times[0] - 100).time == listpings[0].time
+	assert r.ping_at_time(pygsf.datetime(2030, 1, 1)).time == listpings[-1].time
+
+	between = list(r.pings_between(times[1], times[2]))
+	assert len(between) == 2
+	assert between[0].DEPTH_ARRAY == listpings[1].DEPTH_ARRAY
+	assert between[1].DEPTH_ARRAY == listpings[2].DEPTH_ARRAY
+	# the reader can still stream from where it was
+	assert r.currentPtr() == 0
+	r.close()
+
+def test_randomaccessscalefactors(tmp_path):
+	'''
+	random access decodes each ping with the scale factors in effect at that ping, whatever was read before it
+	'''
+	filename = str(tmp_path / "scalefactors.gsf")
+	with open(filename, 'wb') as f:
+		f.write(makeping([100, 200], 1500000000, 100))
+		f.write(makeping([300, 400], 1500000001))
+		f.write(makeping([500, 600], 1500000002, 10))
+		f.write(makeping([700, 800], 1500000003))
+	r = pygsf.GSFREADER(filename)
+	assert r.ping(3).DEPTH_ARRAY == [70, 80]
+	assert r.ping(1).DEPTH_ARRAY == [3, 4]
+	assert r.ping(3).DEPTH_ARRAY == [70, 80]
+	assert r.ping_at_time(1500000001).DEPTH_ARRAY == [3, 4]
+	assert [ping.DEPTH_ARRAY for ping in r.pings_between(1500000001, 1500000003)] == [[3, 4], [50, 60], [70, 80]]
+	assert [ping.DEPTH_ARRAY for ping in r.pings_between(1500000000, 1500000001)] == [[1, 2], [3, 4]]
+	r.close()
+
+	# a ping before the first scale factor subrecord is not decoded with the scale factors of a later ping
+	filename = str(tmp_path / "latescalefactors.gsf")
+	with open(filename, 'wb') as f:
+		f.write(makeping([100, 200], 1500000000))
+		f.write(makeping([300, 400], 1500000001, 10))
+	r = pygsf.GSFREADER(filename)
+	assert r.ping(1).DEPTH_ARRAY == [30, 40]
+	assert r.ping(0).DEPTH_ARRAY == [100, 200]
+	assert r.ping(1).DEPTH_ARRAY == [30, 40]
+	r.close()
+
+def test_scalefactortable(samplefile):
+	'''
+	the scale factor table is filled once per file and replaced entry by entry when another scale factor subrecord is decoded
+	'''
+	r = pygsf.GSFREADER(samplefile, loadscalefactors=True)
+	table = r.scalefactors
+	assert isinstance(table, pygsf.SCALEFACTORTABLE)
+	ids = [sf.subrecordID for sf in table]
+	assert len(table) == len(ids) and 1 in ids and 100 not in ids
+	assert table.lookup(99, 2) == (1, 0, 0, 'h')
+	assert table.lookup(2, 2)[3] == 'h' and table.lookup(1, 2)[3] == 'H' and table.lookup(2, 4)[3] == 'l'
+
+	# decoding a ping refreshes the table in place rather than growing it
+	ping = r.ping(1)
+	assert ping.scalefactors is table
+	assert len(table) == len(ids)
+	sf = pygsf.SCALEFACTOR()
+	sf.subrecordID = 1
+	sf.multiplier = 1000
+	table.update(sf)
+	assert len(table) == len(ids)
+	assert table.lookup(1, 2)[0] == 1000
+	r.close()
+
+def test_pingheaders(samplefile):
+	'''
+	the header table matches the headers decoded ping by ping, with full precision time
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile)
+	headers = r.ping_headers()
+	assert len(headers) == 4
+	for h, p in zip(headers, listpings):
+		assert h['time'] == p.time + p.pingnanotime / 1000000000.0
+		assert h['time'] != p.time
+		for name in ['longitude', 'latitude', 'numbeams', 'heading', 'pitch', 'roll', 'heave', 'speed', 'tidecorrector', 'height']:
+			assert h[name] == getattr(p, name)
+	np.testing.assert_array_equal(headers['time'], r.index['time'][r.index['recordidentifier'] == pygsf.SWATH_BATHYMETRY])
+	navigation = r.loadnavigation()
+	assert navigation[3] == [headers['time'][3], headers['longitude'][3], headers['latitude'][3]]
+	r.close()
@@ -0,0 +1,73 @@
+import struct
+import pytest
+import numpy as np
+import pygsf
+from gsffixtures import samplefile, makeping, readpings
+
+def test_lazyread(samplefile, tmp_path):
+	'''
+	a lazy read only decodes the beam arrays which are accessed
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile)
+	ping = r.ping(0, lazy=True)
+	assert sorted(ping.subrecords) == [1, 2, 3, 4, 5, 6, 16, 18, 100, 131]
+	assert "DEPTH_ARRAY" in ping.pendingarrays
+	assert ping.DEPTH_ARRAY == listpings[0].DEPTH_ARRAY
+	assert "DEPTH_ARRAY" not in ping.pendingarrays
+	assert "ACROSS_TRACK_ARRAY" in ping.pendingarrays
+	assert ping.MEAN_REL_AMPLITUDE_ARRAY == []
+	# reading a ping twice does not duplicate the beams
+	ping.read()
+	assert len(ping.DEPTH_ARRAY) == ping.numbeams
+	r.close()
+
+	# a lazy ping decodes with the scale factors it was read with, even after a later ping changes them
+	filename = str(tmp_path / "scalefactors.gsf")
+	with open(filename, 'wb') as f:
+		f.write(makeping([100, 200], 1500000000, 100))
+		f.write(makeping([500, 600], 1500000001, 10))
+	r = pygsf.GSFREADER(filename)
+	ping = r.ping(0, lazy=True)
+	assert r.ping(1).DEPTH_ARRAY == [50, 60]
+	assert ping.DEPTH_ARRAY == [1, 2]
+	r.close()
+
+	# an array with more than one subrecord in the ping decodes each subrecord from its own offset, as an eager read does
+	payload = makeping([1, 2], 1500000000)[8:]
+	payload += struct.pack('>L', (1 << 24) | 4) + struct.pack('>2H', 3, 4)
+	filename = str(tmp_path / "repeated.gsf")
+	with open(filename, 'wb') as f:
+		f.write(struct.pack('>LL', len(payload), pygsf.SWATH_BATHYMETRY) + payload)
+	for numpyarrays in [False, True]:
+		r = pygsf.GSFREADER(filename, numpyarrays=numpyarrays)
+		eager = r.ping(0)
+		ping = r.ping(0, lazy=True)
+		assert len(ping.pendingarrays["DEPTH_ARRAY"]) == 2
+		assert list(ping.DEPTH_ARRAY) == list(eager.DEPTH_ARRAY)
+		r.close()
+
+	# a lazy ping which outlives its reader fails clearly on every access, rather than returning an empty array
+	r = pygsf.GSFREADER(samplefile)
+	ping = r.ping(0, lazy=True)
+	r.close()
+	for attempt in range(2):
+		with pytest.raises(ValueError, match="outlived its reader"):
+			ping.DEPTH_ARRAY
+	assert "DEPTH_ARRAY" in ping.pendingarrays
+
+def test_lazyroundtrip(samplefile):
+	'''
+	every beam array of the sample survey streamed lazily, and only decoded once the whole file has been read, matches the eager decode, without moving the reader
+	'''
+	for numpyarrays in [False, True]:
+		eager = readpings(samplefile, numpyarrays)
+		r = pygsf.GSFREADER(samplefile, numpyarrays=numpyarrays)
+		pings = list(r.pings(lazy=True))
+		assert r.currentPtr() == r.fileSize
+		for ping, e in reversed(list(zip(pings, eager))):
+			for name in pygsf.PINGARRAYS:
+				np.testing.assert_array_equal(getattr(ping, name), getattr(e, name))
+			assert ping.pendingarrays == {}
+		assert r.currentPtr() == r.fileSize
+		r.close()
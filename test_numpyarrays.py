@@ -0,0 +1,129 @@
+import struct
+import pytest
+import numpy as np
+import pygsf
+from gsffixtures import samplefile, makeR2Sonicping, makeping, readpings
+
+def test_numpyarrays(samplefile):
+	'''
+	the numpy decode must return the same values as the list based decode
+	'''
+	listpings = readpings(samplefile, False)
+	numpypings = readpings(samplefile, True)
+	assert len(listpings) == 4
+	assert len(numpypings) == len(listpings)
+	for l, n in zip(listpings, numpypings):
+		for name in ["DEPTH_ARRAY", "ACROSS_TRACK_ARRAY", "ALONG_TRACK_ARRAY", "TRAVEL_TIME_ARRAY", "BEAM_ANGLE_ARRAY", "MEAN_CAL_AMPLITUDE_ARRAY", "BEAM_FLAGS_ARRAY", "BEAM_ANGLE_FORWARD_ARRAY"]:
+			assert isinstance(getattr(n, name), np.ndarray)
+			assert getattr(n, name).dtype == np.float64
+			assert len(getattr(l, name)) == l.numbeams
+			np.testing.assert_array_equal(getattr(n, name), np.array(getattr(l, name)))
+
+def test_numpyroundtrip(samplefile):
+	'''
+	every numpy beam array of the sample survey scales back to the raw values stored in its subrecord
+	'''
+	r = pygsf.GSFREADER(samplefile, numpyarrays=True)
+	with open(samplefile, 'rb') as f:
+		data = f.read()
+	arrays = 0
+	for ping in r.pings():
+		for subrecord_id, (offset, subrecord_size) in ping.subrecords.items():
+			if subrecord_id not in pygsf.PINGSUBRECORDS or subrecord_id == 21:
+				continue
+			scale, scaleoffset, compressionFlag, datatype = ping.scalefactors.lookup(subrecord_id, subrecord_size // ping.numbeams)
+			raw = struct.unpack_from('>%d%s' % (ping.numbeams, datatype), data, offset)
+			values = getattr(ping, pygsf.PINGSUBRECORDS[subrecord_id])
+			np.testing.assert_array_equal(np.round((values - scaleoffset) * scale), raw)
+			arrays += 1
+	assert arrays == 4 * 8
+	r.close()
+
+def test_numpysnippets(tmp_path):
+	'''
+	the vectorised snippet decode matches the beam by beam decode for every snippet type
+	'''
+	beams = [([100, 200, 0, 300], 2), ([], 0), ([0, 0], 1), ([1000, 1, 2, 3000, 25, 30], 3), ([7], 5), ([65535, 10], 0)]
+	filename = str(tmp_path / "r2sonic.gsf")
+	with open(filename, 'wb') as f:
+		f.write(makeR2Sonicping(beams))
+
+	for snippettype in [pygsf.SNIPPET_NONE, pygsf.SNIPPET_MEAN, pygsf.SNIPPET_MAX, pygsf.SNIPPET_DETECT, pygsf.SNIPPET_MEAN5DB]:
+		decoded = []
+		for numpyarrays in [False, True]:
+			r = pygsf.GSFREADER(filename, numpyarrays=numpyarrays)
+			numberofbytes, recordidentifier, datagram = r.readDatagram()
+			datagram.snippettype = snippettype
+			datagram.read()
+			assert datagram.frequency == 400000
+			assert r.currentPtr() == r.fileSize
+			r.close()
+			decoded.append(datagram)
+		assert len(decoded[0].SNIPPET_SERIES_ARRAY) == len(beams)
+		np.testing.assert_allclose(decoded[1].SNIPPET_SERIES_ARRAY, decoded[0].SNIPPET_SERIES_ARRAY, rtol=1e-12)
+
+	np.testing.assert_array_equal(datagram.SNIPPET_LENGTHS, [4, 0, 2, 6, 1, 2])
+	np.testing.assert_array_equal(datagram.SNIPPET_OFFSETS, [0, 4, 4, 6, 12, 13])
+	np.testing.assert_array_equal(datagram.SNIPPET_SAMPLES, [s for samples, detect in beams for s in samples])
+	assert datagram.SNIPPET_SAMPLES.dtype == np.uint16
+
+def test_reusepings(samplefile, tmp_path):
+	'''
+	a slotted ping can be reused for every ping in a file, decoding into the same numpy buffers
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile, numpyarrays=True)
+	ping = pygsf.SWATH_BATHYMETRY_PING(r.fileptr, 0, pygsf.SWATH_BATHYMETRY, 8)
+	assert not hasattr(ping, '__dict__')
+	# a missing array is empty, with the same type as a decoded array
+	ping.numpyarrays = True
+	assert isinstance(ping.DEPTH_ARRAY, np.ndarray) and ping.DEPTH_ARRAY.dtype == np.float64 and len(ping.DEPTH_ARRAY) == 0
+	with pytest.raises(AttributeError):
+		ping.unknownattribute = 1
+
+	seen = set()
+	buffers = set()
+	for ping, l in zip(r.pings(reuse=True), listpings):
+		seen.add(id(ping))
+		buffers.add(ping.DEPTH_ARRAY.__array_interface__['data'][0])
+		np.testing.assert_array_equal(ping.DEPTH_ARRAY, l.DEPTH_ARRAY)
+		np.testing.assert_array_equal(ping.ACROSS_TRACK_ARRAY, l.ACROSS_TRACK_ARRAY)
+		assert ping.time == l.time
+	assert len(seen) == 1
+	assert len(buffers) == 1
+
+	# printing a lazily read ping does not decode its beam arrays
+	ping = r.ping(0, lazy=True)
+	assert "numbeams" in str(ping)
+	assert "DEPTH_ARRAY" in ping.pendingarrays
+	r.close()
+
+	# a reused ping shares the reader scale factors, and forgets the arrays of the last ping which the next one does not have
+	filename = str(tmp_path / "mixed.gsf")
+	with open(filename, 'wb') as f:
+		f.write(makeping([100, 200], 1500000000, 100))
+		f.write(makeR2Sonicping([([100, 200], 1), ([300], 0)]))
+	r = pygsf.GSFREADER(filename, numpyarrays=True)
+	pings = r.pings(reuse=True)
+	ping = next(pings)
+	assert ping.scalefactors is r.scalefactors
+	np.testing.assert_array_equal(ping.DEPTH_ARRAY, [1, 2])
+	assert next(pings) is ping
+	assert isinstance(ping.DEPTH_ARRAY, np.ndarray) and len(ping.DEPTH_ARRAY) == 0
+	assert len(ping.SNIPPET_SERIES_ARRAY) == 2
+	assert len(ping.SNIPPET_SAMPLES) == 3
+	r.close()
+
+	# the gathered snippet samples of the last ping are forgotten when the next ping has no snippets
+	with open(filename, 'wb') as f:
+		f.write(makeR2Sonicping([([100, 200], 1), ([300], 0)]))
+		f.write(makeping([100, 200], 1500000000, 100))
+	r = pygsf.GSFREADER(filename, numpyarrays=True)
+	pings = r.pings(reuse=True)
+	ping = next(pings)
+	assert len(ping.SNIPPET_SAMPLES) == 3
+	assert next(pings) is ping
+	for name in ['SNIPPET_SAMPLES', 'SNIPPET_OFFSETS', 'SNIPPET_LENGTHS', 'SNIPPET_DETECTS']:
+		assert not hasattr(ping, name)
+	assert isinstance(ping.SNIPPET_SERIES_ARRAY, np.ndarray) and len(ping.SNIPPET_SERIES_ARRAY) == 0
+	r.close()
@@ -0,0 +1,100 @@
+import pytest
+import numpy as np
+import pygsf
+import pygsfgrid
+import georeference
+from gsffixtures import samplefile
+
+def test_grid(samplefile, tmp_path):
+	'''
+	a survey gridded a few pings at a time through small tiles, most of them closed to disc along the way, matches the statistics of every cell computed in one go
+	'''
+	filename = samplefile
+	grid = pygsfgrid.GRID(20.0, str(tmp_path / "tiles"), tilesize=8, maxtiles=2)
+	pygsfgrid.gridfile(filename, grid, batchsize=1)
+	assert len(grid.tilekeys) > grid.maxtiles
+
+	r = pygsf.GSFREADER(filename)
+	pings = r.read_pings(fields=['DEPTH_ARRAY', 'ACROSS_TRACK_ARRAY', 'ALONG_TRACK_ARRAY', 'BEAM_FLAGS_ARRAY'])
+	r.close()
+	x, y = georeference.georeference(pings['latitude'], pings['longitude'], pings['heading'], pings['ACROSS_TRACK_ARRAY'], pings['ALONG_TRACK_ARRAY'])
+	good = ~(pings['BEAM_FLAGS_ARRAY'] < 0) & np.isfinite(pings['DEPTH_ARRAY'])
+	x, y, z = x[good], y[good], pings['DEPTH_ARRAY'][good]
+	column, row = grid.cells(x, y)
+
+	grid.save(str(tmp_path / "mean.npy"), 'mean')
+	grid.save(str(tmp_path / "stddev.npy"), 'stddev')
+	grid.save(str(tmp_path / "count.flt"), 'count')
+	mean = np.load(str(tmp_path / "mean.npy"))
+	stddev = np.load(str(tmp_path / "stddev.npy"))
+	firstcolumn, firstrow, ncols, nrows = grid.extent()
+	assert (firstcolumn, firstrow) == (column.min(), row.min())
+	assert mean.shape == (row.max() - row.min() + 1, column.max() - column.min() + 1)
+
+	# rasters are north up, so the first row is the most northerly
+	cells = {}
+	for c, rw, value in zip(column, row, z):
+		cells.setdefault((c, rw), []).append(value)
+	for (c, rw), values in cells.items():
+		i, j = firstrow + nrows - 1 - rw, c - firstcolumn
+		assert abs(mean[i, j] - np.mean(values)) < 1e-3
+		if len(values) > 1:
+			assert abs(stddev[i, j] - np.std(values, ddof=1)) < 1e-3
+	assert np.isnan(mean).sum() == mean.size - len(cells)
+
+	header = dict(line.split() for line in open(str(tmp_path / "count.hdr")))
+	assert (int(header['NROWS']), int(header['NCOLS'])) == (nrows, ncols)
+	count = np.fromfile(str(tmp_path / "count.flt"), dtype='<f4').reshape(nrows, ncols)
+	assert count[count != pygsfgrid.NODATA].sum() == len(z)
+	grid.close()
+
+def test_tpugrid(tmp_path):
+	'''
+	a TPU weighted grid averages soundings by their inverse vertical variance, and spreads a sounding with a large horizontal error over the neighbouring cells with less weight
+	'''
+	assert pygsf.PINGSUBRECORDS[19] == 'VERTICAL_ERROR_ARRAY'
+	assert pygsf.PINGSUBRECORDS[20] == 'HORIZONTAL_ERROR_ARRAY'
+
+	grid = pygsfgrid.GRID(10.0, str(tmp_path / "tiles"), tilesize=4, maxtiles=2, weighted=True)
+	grid.setorigin(0.0, 0.0)
+	# two soundings in the middle of the same cell, with no horizontal error, so they reach only that cell
+	longitude = np.array([0.5, 0.5]) * grid.xdim
+	latitude = np.array([0.5, 0.5]) * grid.ydim
+	grid.add(longitude, latitude, [10.0, 20.0], [1.0, 2.0], [0.0, np.nan])
+	# a sounding without a vertical error is skipped
+	grid.add(longitude[:1], latitude[:1], [1000.0], [np.nan], [0.0])
+	grid.save(str(tmp_path / "mean.npy"), 'mean')
+	grid.save(str(tmp_path / "uncertainty.npy"), 'uncertainty')
+	mean = np.load(str(tmp_path / "mean.npy"))
+	uncertainty = np.load(str(tmp_path / "uncertainty.npy"))
+	assert mean.shape == (1, 1)
+	assert abs(mean[0, 0] - (10.0 + 20.0 / 4) / 1.25) < 1e-5
+	assert abs(uncertainty[0, 0] - 1 / np.sqrt(1.25)) < 1e-6
+
+	# a 10m horizontal error reaches 3 cells either side, with the full weight in its own cell
+	grid.add([5.5 * grid.xdim], [5.5 * grid.ydim], [50.0], [1.0], [10.0])
+	grid.save(str(tmp_path / "count.npy"), 'count')
+	grid.save(str(tmp_path / "uncertainty.npy"), 'uncertainty')
+	count = np.load(str(tmp_path / "count.npy"))
+	uncertainty = np.load(str(tmp_path / "uncertainty.npy"))
+	firstcolumn, firstrow, ncols, nrows = grid.extent()
+	assert (firstcolumn, firstrow, ncols, nrows) == (0, 0, 9, 9)
+	assert count[8 - 5, 5] == 1 and abs(uncertainty[8 - 5, 5] - 1.0) < 1e-6
+	# the footprint falloff lowers the weight of a sounding in the neighbouring cells, but alone in a cell it keeps its own vertical error
+	assert np.allclose(uncertainty[8 - 5, 6:], 1.0)
+	assert np.all(np.isnan(uncertainty[0, [0, 8]]))
+
+	# with a second sounding in the neighbouring cell, the uncertainty is propagated through the weights, sqrt(sum(w^2 sigma^2)) / sum(w)
+	grid.add([6.5 * grid.xdim], [5.5 * grid.ydim], [60.0], [2.0], [0.0])
+	grid.save(str(tmp_path / "uncertainty.npy"), 'uncertainty')
+	uncertainty = np.load(str(tmp_path / "uncertainty.npy"))
+	falloff = np.exp(-0.5 * (0.5 * grid.resolution / 10.0) ** 2)
+	weights = np.array([falloff / 1.0 ** 2, 1 / 2.0 ** 2])
+	expected = np.sqrt(np.sum(weights ** 2 * np.array([1.0, 2.0]) ** 2)) / weights.sum()
+	assert abs(uncertainty[8 - 5, 6] - expected) < 1e-6
+	grid.close()
+
+	plain = pygsfgrid.GRID(10.0, str(tmp_path / "plain"))
+	with pytest.raises(ValueError):
+		plain.statistic(np.zeros((pygsfgrid.TILELAYERS, 1, 1)), 'uncertainty')
+	plain.close()
@@ -0,0 +1,114 @@
+import os
+import numpy as np
+import pygsf
+from gsffixtures import samplefile, makeping, readpings
+
+def test_readpings(samplefile):
+	'''
+	a batch of pings decodes into 1-D header arrays and 2-D beam arrays
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile)
+	pings = r.read_pings(1, 2, fields=["DEPTH_ARRAY", "ACROSS_TRACK_ARRAY", "MEAN_REL_AMPLITUDE_ARRAY"])
+	assert pings["DEPTH_ARRAY"].shape == (2, 432)
+	np.testing.assert_array_equal(pings["DEPTH_ARRAY"][0], listpings[1].DEPTH_ARRAY)
+	np.testing.assert_array_equal(pings["ACROSS_TRACK_ARRAY"][1], listpings[2].ACROSS_TRACK_ARRAY)
+	# this sensor does not record relative amplitudes
+	assert np.all(np.isnan(pings["MEAN_REL_AMPLITUDE_ARRAY"]))
+	np.testing.assert_array_equal(pings["numbeams"], [432, 432])
+	np.testing.assert_array_equal(pings["latitude"], [listpings[1].latitude, listpings[2].latitude])
+	assert "VERTICAL_ERROR_ARRAY" not in pings
+
+	pings = r.read_pings(masked=True)
+	assert pings["DEPTH_ARRAY"].shape == (4, 432)
+	assert isinstance(pings["DEPTH_ARRAY"], np.ma.MaskedArray)
+	assert pings["MEAN_REL_AMPLITUDE_ARRAY"].mask.all()
+	r.close()
+
+def test_readpingsroundtrip(samplefile):
+	'''
+	every header field and beam array of the sample survey read as a batch matches the reference decode ping by ping, with the arrays a ping does not have left as NaN
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile)
+	pings = r.read_pings()
+	r.close()
+	assert set(pings) == set(pygsf.PINGHEADERFIELDS) | set(name for name in pygsf.PINGSUBRECORDS.values() if name != 'SNIPPET_SERIES_ARRAY')
+	for i, l in enumerate(listpings):
+		assert pings['time'][i] == l.time + l.pingnanotime / 1000000000.0
+		for name in pygsf.PINGHEADERFIELDS[1:]:
+			assert pings[name][i] == getattr(l, name)
+		for name in pings:
+			if name in pygsf.PINGHEADERFIELDS:
+				continue
+			expected = np.full(pings[name].shape[1], np.nan)
+			expected[:len(getattr(l, name))] = getattr(l, name)
+			np.testing.assert_array_equal(pings[name][i], expected)
+
+def test_runjobs():
+	'''
+	jobs run in a pool of workers return their results in job order, and angular response curves merge across workers
+	'''
+	jobs = [(2, i) for i in range(10)]
+	assert pygsf.runjobs(pow, jobs, 3) == [2 ** i for i in range(10)]
+	assert pygsf.runjobs(pow, jobs) == pygsf.runjobs(pow, jobs, 0)
+
+	ARC = pygsf.createARC()
+	other = pygsf.createARC()
+	ARC[90][1].sampleSum = -20.0
+	ARC[90][1].numberOfSamplesPerBeam = 2
+	ARC[90][1].sector = 2
+	other[90][1].sampleSum = -30.0
+	other[90][1].numberOfSamplesPerBeam = 1
+	other[90][1].sector = 3
+	other[91][1].numberOfSamplesPerBeam = 1
+	other[91][1].sector = 4
+	pygsf.mergeARC(ARC, other)
+	assert ARC[90][1].sampleSum == -50.0
+	assert ARC[90][1].numberOfSamplesPerBeam == 3
+	# a slot keeps the sector of the first curve with samples in it, and an empty slot takes the sector of the other curve
+	assert ARC[90][1].sector == 2
+	assert ARC[91][1].sector == 4
+	assert ARC[0][0].numberOfSamplesPerBeam == 0
+
+def test_parallelreadpings(samplefile, tmp_path):
+	'''
+	pings decoded in parallel ranges match a serial decode, including when the scale factors change part way through the file
+	'''
+	r = pygsf.GSFREADER(samplefile)
+	serial = r.read_pings()
+	parallel = r.read_pings(workers=3)
+	assert r.pingscalefactors.all()
+	r.close()
+	for name in serial:
+		np.testing.assert_array_equal(parallel[name], serial[name])
+
+	filename = str(tmp_path / "scalefactors.gsf")
+	with open(filename, 'wb') as f:
+		f.write(makeping([100, 200], 1500000000, 100))
+		f.write(makeping([300, 400], 1500000001))
+		f.write(makeping([500, 600], 1500000002, 10))
+		f.write(makeping([700, 800, 900], 1500000003))
+	expected = [[1, 2, np.nan], [3, 4, np.nan], [50, 60, np.nan], [70, 80, 90]]
+	r = pygsf.GSFREADER(filename)
+	assert r.pingscalefactors is None
+	np.testing.assert_array_equal(r.loadpingscalefactors(), [True, False, True, False])
+	np.testing.assert_array_equal(r.read_pings(fields=["DEPTH_ARRAY"])["DEPTH_ARRAY"], expected)
+	np.testing.assert_array_equal(r.read_pings(3, fields=["DEPTH_ARRAY"])["DEPTH_ARRAY"], expected[3:])
+	pings = r.read_pings(fields=["DEPTH_ARRAY"], workers=4, masked=True)
+	np.testing.assert_array_equal(pings["DEPTH_ARRAY"].filled(np.nan), expected)
+	np.testing.assert_array_equal(pings["DEPTH_ARRAY"].mask[:, 2], [True, True, True, False])
+	np.testing.assert_array_equal(pings["time"], [1500000000, 1500000001, 1500000002, 1500000003])
+	r.close()
+
+	# the workers are given the ping offsets, so they neither index the file nor write the index sidecar
+	r = pygsf.GSFREADER(filename, useindex=False)
+	pings = r.read_pings(1, 3, fields=["DEPTH_ARRAY"], workers=3)
+	np.testing.assert_array_equal(pings["DEPTH_ARRAY"], [row[:3] for row in expected[1:]])
+	r.close()
+	os.remove(filename + pygsf.INDEXEXTENSION)
+	r = pygsf.GSFREADER(filename, useindex=False)
+	r.index = r.buildindex()
+	r.read_pings(workers=2)
+	r.close()
+	assert not os.path.exists(filename + pygsf.INDEXEXTENSION)
@@ -0,0 +1,64 @@
+import struct
+import numpy as np
+import pygsf
+from gsffixtures import samplefile
+
+def test_otherrecords(samplefile):
+	'''
+	the attitude, sound velocity and processing parameter records are decoded, and the attitude for the whole file is gathered in one step
+	'''
+	r = pygsf.GSFREADER(samplefile)
+	attitude = []
+	for numberofbytes, recordidentifier, datagram in r.records({pygsf.ATTITUDE, pygsf.SOUND_VELOCITY_PROFILE, pygsf.PROCESSING_PARAMETERS}):
+		datagram.read()
+		if recordidentifier == pygsf.ATTITUDE:
+			assert isinstance(datagram, pygsf.ATTITUDE_RECORD)
+			r.fileptr.seek(datagram.offset + datagram.hdrlen + 10, 0)
+			raw = struct.unpack('>%dH' % (5 * datagram.numbermeasurements), r.fileptr.read(10 * datagram.numbermeasurements))
+			assert datagram.attitude['pitch'][0] == struct.unpack('>h', struct.pack('>H', raw[1]))[0] / 100
+			assert datagram.attitude['heading'][-1] == raw[-1] / 100
+			assert datagram.attitude['time'][-1] == datagram.time + raw[-5] / 1000
+			attitude.append(datagram.attitude)
+			r.fileptr.seek(datagram.offset + datagram.numbytes, 0)
+		elif recordidentifier == pygsf.SOUND_VELOCITY_PROFILE:
+			assert len(datagram.depth) == len(datagram.soundspeed) == datagram.numberpoints
+			assert 1400 < datagram.soundspeed.min() < datagram.soundspeed.max() < 1700
+			assert np.all(np.diff(datagram.depth) > 0)
+		else:
+			assert datagram.parameters['GEOID'] == 'WGS-84'
+	assert len(attitude) == 34
+	np.testing.assert_array_equal(r.loadattitude(), np.concatenate(attitude))
+	r.close()
+
+def test_attitudestore(samplefile):
+	'''
+	the attitude is interpolated at any array of times in one call, such as the receive time of every beam
+	'''
+	r = pygsf.GSFREADER(samplefile)
+	attitude = r.loadattitude()
+	store = pygsf.ATTITUDESTORE(attitude[::-1])
+	assert len(store) == len(attitude)
+	exact = store.interpolate(attitude['time'])
+	for name in ['pitch', 'roll', 'heave']:
+		np.testing.assert_allclose(exact[name], attitude[name])
+	# some headings in the sample file are just over 360
+	np.testing.assert_allclose(exact['heading'], attitude['heading'] % 360)
+	middle = store.interpolate((attitude['time'][:-1] + attitude['time'][1:]) / 2)
+	np.testing.assert_allclose(middle['roll'], (attitude['roll'][:-1] + attitude['roll'][1:]) / 2, atol=1e-6)
+
+	# the receive time of every beam, with the NaN padding beyond the last beam of a ping
+	pings = r.read_pings(fields=['TRAVEL_TIME_ARRAY'])
+	receivetimes = pings['time'][:, np.newaxis] + pings['TRAVEL_TIME_ARRAY']
+	motion = store.interpolate(receivetimes)
+	assert motion.shape == receivetimes.shape
+	np.testing.assert_array_equal(np.isnan(motion['roll']), np.isnan(receivetimes))
+	assert np.isnan(store.interpolate([attitude['time'][0] - 1, attitude['time'][-1] + 1])['pitch']).all()
+	r.close()
+
+	# heading goes the short way round through north, and gaps can be masked
+	a = np.zeros(3, dtype=pygsf.ATTITUDEDTYPE)
+	a['time'] = [0, 1, 10]
+	a['heading'] = [359, 1, 3]
+	store = pygsf.ATTITUDESTORE(a)
+	np.testing.assert_allclose(store.interpolate([0.5, 0.75, 5.5])['heading'], [0, 0.5, 2])
+	assert np.isnan(store.interpolate([0.5, 5.5], maxgap=2)['heading']).tolist() == [False, True]
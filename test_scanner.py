@@ -0,0 +1,157 @@
+import struct
+import numpy as np
+import pygsf
+from gsffixtures import SAMPLEFILE, samplefile, makeping, readpings
+
+def test_scanrecords(samplefile, tmp_path):
+	'''
+	the record scanner finds every record, including those with a checksum, which readDatagram can then step through
+	'''
+	r = pygsf.GSFREADER(samplefile)
+	scan = r.scanrecords()
+	np.testing.assert_array_equal(scan['offset'], r.index['offset'])
+	np.testing.assert_array_equal(scan['recordidentifier'], r.index['recordidentifier'])
+	np.testing.assert_array_equal(scan['sizeofdata'] + 8, r.index['numberofbytes'])
+	assert not scan['haschecksum'].any()
+	r.close()
+
+	ping = makeping([100, 200], 1500000000, 100)
+	payload = ping[8:]
+	checksum = struct.pack('>LLL', len(payload), pygsf.SWATH_BATHYMETRY | 0x80000000, sum(payload) & 0xFFFFFFFF) + payload
+	filename = str(tmp_path / "checksum.gsf")
+	with open(filename, 'wb') as f:
+		f.write(ping + checksum + ping[:20])
+	r = pygsf.GSFREADER(filename)
+	scan = r.scanrecords()
+	np.testing.assert_array_equal(scan['offset'], [0, len(ping)])
+	np.testing.assert_array_equal(scan['haschecksum'], [False, True])
+	np.testing.assert_array_equal(r.index['hdrlen'], [8, 12])
+	assert r.getrecordcount() == 2
+	r.rewind()
+	numberofbytes, recordidentifier, datagram = r.readDatagram()
+	numberofbytes, recordidentifier, datagram = r.readDatagram()
+	assert (numberofbytes, recordidentifier, datagram.hdrlen) == (len(checksum), pygsf.SWATH_BATHYMETRY, 12)
+	datagram.read()
+	assert datagram.DEPTH_ARRAY == [1, 2]
+	assert r.currentPtr() == len(ping) + len(checksum)
+	r.close()
+
+def test_scanroundtrip(samplefile, tmp_path):
+	'''
+	the records found by the scanner in the sample survey match the readDatagram loop, and copying them out one by one rebuilds the file byte for byte
+	'''
+	r = pygsf.GSFREADER(samplefile, useindex=False)
+	scan = r.scanrecords()
+	records = []
+	while r.moreData():
+		offset = r.currentPtr()
+		numberofbytes, recordidentifier, datagram = r.readDatagram()
+		records.append((offset, recordidentifier, numberofbytes - datagram.hdrlen))
+	assert [(int(o), int(i), int(s)) for o, i, s, c in scan] == records
+
+	filename = str(tmp_path / "copy.gsf")
+	with open(filename, 'wb') as f:
+		for offset, recordidentifier, sizeofdata, haschecksum in scan:
+			f.write(r.readDatagramBytes(int(offset), int(sizeofdata) + r.hdrlen))
+	r.close()
+	with open(samplefile, 'rb') as a, open(filename, 'rb') as b:
+		assert a.read() == b.read()
+
+def test_recoverrecords(samplefile):
+	'''
+	a damaged file is read by skipping over the damage to the next plausible record, and the skipped bytes are reported
+	'''
+	r = pygsf.GSFREADER(samplefile, useindex=False)
+	scan = r.scanrecords()
+	recovered, skipped = r.recoverrecords()
+	np.testing.assert_array_equal(recovered, scan)
+	assert skipped == []
+	with open(samplefile, 'rb') as f:
+		data = f.read()
+	r.close()
+
+	# corrupt the size of the first ping, and insert some junk after the second
+	first, second, third = [int(o) for o in scan['offset'][scan['recordidentifier'] == pygsf.SWATH_BATHYMETRY][:3]]
+	afterfirst = int(scan['offset'][scan['offset'] > first][0])
+	junk = bytes(range(256)) * 3 + b'\x00\x00\x00\x00'
+	damaged = data[:first] + struct.pack('>L', 0x00FFFFF0) + data[first+4:third] + junk + data[third:]
+	with open(samplefile, 'wb') as f:
+		f.write(damaged)
+
+	r = pygsf.GSFREADER(samplefile, useindex=False)
+	recovered, skipped = r.recoverrecords()
+	assert skipped == [(first, afterfirst), (third, third + len(junk))]
+	expected = scan[(scan['offset'] != first)]
+	assert recovered['recordidentifier'].tolist() == expected['recordidentifier'].tolist()
+	assert recovered['offset'][-1] == scan['offset'][-1] + len(junk)
+
+	r.index = r.buildindex(recover=True)
+	assert r.getrecordcount() == 3
+	assert r.ping(0).time == pygsf.GSFREADER(SAMPLEFILE, useindex=False).ping(1).time
+	r.close()
+
+def test_recoverroundtrip(samplefile, tmp_path):
+	'''
+	the records recovered from a damaged copy of the sample survey, written out to a new file, read back cleanly with the same pings as the undamaged file, less the damaged one
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile, useindex=False)
+	scan = r.scanrecords()
+	r.close()
+	with open(samplefile, 'rb') as f:
+		data = f.read()
+	first, second = [int(o) for o in scan['offset'][scan['recordidentifier'] == pygsf.SWATH_BATHYMETRY][:2]]
+	junk = bytes(range(256)) * 2
+	damaged = str(tmp_path / "damaged.gsf")
+	with open(damaged, 'wb') as f:
+		f.write(data[:first] + struct.pack('>L', 0x00FFFFF0) + data[first+4:second] + junk + data[second:])
+
+	r = pygsf.GSFREADER(damaged, useindex=False)
+	recovered, skipped = r.recoverrecords()
+	assert len(skipped) == 2
+	filename = str(tmp_path / "recovered.gsf")
+	with open(filename, 'wb') as f:
+		for offset, recordidentifier, sizeofdata, haschecksum in recovered:
+			f.write(r.readDatagramBytes(int(offset), int(sizeofdata) + r.hdrlen))
+	r.close()
+
+	r = pygsf.GSFREADER(filename, useindex=False)
+	assert r.recoverrecords()[1] == []
+	assert len(r.scanrecords()) == len(scan) - 1
+	r.close()
+	pings = readpings(filename, False)
+	assert len(pings) == len(listpings) - 1
+	for ping, l in zip(pings, listpings[1:]):
+		assert ping.time == l.time
+		assert ping.DEPTH_ARRAY == l.DEPTH_ARRAY
+
+def test_verifychecksums(samplefile, tmp_path):
+	'''
+	the checksums of every record are verified in chunks, and the records which fail are reported with their offsets
+	'''
+	r = pygsf.GSFREADER(samplefile, useindex=False)
+	scan = r.scanrecords()
+	assert len(r.verifychecksums()) == 0
+	with open(samplefile, 'rb') as f:
+		data = f.read()
+	r.close()
+
+	# rewrite every record with a checksum, including an empty one, and damage two of them
+	records = [struct.pack('>LLL', 0, pygsf.COMMENT | 0x80000000, 0)]
+	for offset, recordidentifier, sizeofdata, haschecksum in scan:
+		payload = data[offset + 8:offset + 8 + sizeofdata]
+		records.append(struct.pack('>LLL', sizeofdata, recordidentifier | 0x80000000, sum(payload) & 0xFFFFFFFF) + payload)
+	records[5] = records[5][:-1] + bytes([(records[5][-1] + 1) % 256])
+	records[-1] = records[-1][:8] + struct.pack('>L', 1) + records[-1][12:]
+	filename = str(tmp_path / "checksum.gsf")
+	with open(filename, 'wb') as f:
+		f.write(b''.join(records))
+
+	for backend in ("mmap", "pread"):
+		r = pygsf.GSFREADER(filename, useindex=False, backend=backend)
+		for chunksize in (1, 5000, 67108864):
+			mismatches = r.verifychecksums(chunksize)
+			np.testing.assert_array_equal(mismatches['offset'], [sum(len(x) for x in records[:5]), sum(len(x) for x in records[:-1])])
+			assert mismatches['stored'][1] == 1
+			assert int(mismatches['computed'][0]) - int(mismatches['stored'][0]) in (1, -255)
+		r.close()
@@ -0,0 +1,124 @@
+import io
+import gzip
+import bz2
+import lzma
+import pytest
+import numpy as np
+import pygsf
+from gsffixtures import samplefile, readpings
+
+def test_records(samplefile):
+	'''
+	the record generators match the readDatagram loop, and skip unwanted records without making a datagram for them
+	'''
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile)
+	records = [(numberofbytes, recordidentifier, datagram.offset) for numberofbytes, recordidentifier, datagram in r.records()]
+	assert len(records) == 45
+	assert r.currentPtr() == r.fileSize
+	assert [offset for numberofbytes, recordidentifier, offset in records] == list(r.index["offset"])
+
+	r.rewind()
+	created = []
+	original = r.createdatagram
+	r.createdatagram = lambda *args: created.append(args[1]) or original(*args)
+	attitude = [datagram for numberofbytes, recordidentifier, datagram in r.records({pygsf.ATTITUDE, pygsf.HEADER})]
+	assert len(attitude) == 35
+	assert set(created) == {pygsf.ATTITUDE, pygsf.HEADER}
+
+	r.rewind()
+	pings = list(r.pings())
+	assert len(pings) == 4
+	for p, l in zip(pings, listpings):
+		assert p.DEPTH_ARRAY == l.DEPTH_ARRAY
+	r.close()
+
+def test_backends(samplefile):
+	'''
+	the read only memory map and the pread backends decode the same records
+	'''
+	r = pygsf.GSFREADER(samplefile)
+	with pytest.raises(TypeError):
+		r.fileptr[0] = 0
+	expected = r.read_pings()
+	scan = r.scanrecords()
+	r.close()
+
+	listpings = readpings(samplefile, False)
+	r = pygsf.GSFREADER(samplefile, backend="pread", useindex=False)
+	r.fileptr.blocksize = 4096
+	np.testing.assert_array_equal(r.scanrecords(), scan)
+	r.index = r.buildindex()
+	for name, values in r.read_pings().items():
+		np.testing.assert_array_equal(values, expected[name])
+	np.testing.assert_array_equal(r.ping_headers()['time'], expected['time'])
+	for ping, l in zip(r.pings(), listpings):
+		assert ping.DEPTH_ARRAY == l.DEPTH_ARRAY
+	assert r.currentPtr() == r.fileSize
+	r.close()
+
+	with pytest.raises(ValueError):
+		pygsf.GSFREADER(samplefile, backend="unknown")
+
+def test_streamreader(samplefile):
+	'''
+	a compressed file read as a stream decodes the same pings as the file itself, with only the record headers of the other records read
+	'''
+	listpings = readpings(samplefile, False)
+	with open(samplefile, 'rb') as f:
+		data = f.read()
+	for module in (gzip, bz2, lzma):
+		compressed = samplefile + "." + module.__name__
+		with module.open(compressed, 'wb') as f:
+			f.write(data)
+		r = pygsf.GSFSTREAMREADER(compressed, numpyarrays=True, buffersize=4096)
+		pings = list(r.pings())
+		assert len(pings) == len(listpings)
+		for ping, l in zip(pings, listpings):
+			assert ping.time == l.time
+			np.testing.assert_array_equal(ping.DEPTH_ARRAY, l.DEPTH_ARRAY)
+			np.testing.assert_array_equal(ping.BEAM_FLAGS_ARRAY, l.BEAM_FLAGS_ARRAY)
+		assert r.currentPtr() == len(data)
+		assert not r.moreData()
+		r.close()
+
+	# an uncompressed stream which is cut short stops at the last complete record
+	r = pygsf.GSFSTREAMREADER(io.BytesIO(data[:-10]))
+	records = list(r.records())
+	assert len(records) == len(pygsf.GSFREADER(samplefile).scanrecords()) - 1
+	records[0][2].read()
+	assert records[0][2].version.startswith("GSF-v")
+
+def test_follow(samplefile, tmp_path):
+	'''
+	a file which is still being written is followed as it grows, with a partly written record left until it is complete and the index extended as we go
+	'''
+	with open(samplefile, 'rb') as f:
+		data = f.read()
+	expected = pygsf.GSFREADER(samplefile).index
+	for backend in ("mmap", "pread"):
+		filename = str(tmp_path / ("growing_%s.gsf" % backend))
+		open(filename, 'wb').close()
+		r = pygsf.GSFREADER(filename, backend=backend)
+		assert len(list(r.follow(timeout=0))) == 0
+
+		# append a little over half the file, which ends part way through a record
+		with open(filename, 'ab') as f:
+			f.write(data[:len(data) // 2])
+		first = [recordidentifier for numberofbytes, recordidentifier, datagram in r.follow(timeout=0)]
+		assert 0 < len(first) < len(expected)
+		oldfileptr = r.fileptr
+		with open(filename, 'ab') as f:
+			f.write(data[len(data) // 2:])
+		rest = [recordidentifier for numberofbytes, recordidentifier, datagram in r.follow(timeout=0)]
+		# the memory map is replaced by a larger one, and the old one is closed
+		assert backend == "pread" or (r.fileptr is not oldfileptr and oldfileptr.closed)
+		assert first + rest == expected['recordidentifier'].tolist()
+		for name in expected.dtype.names:
+			np.testing.assert_array_equal(r.index[name], expected[name])
+		r.rewind()
+		pings = [datagram for numberofbytes, recordidentifier, datagram in r.follow(pygsf.SWATH_BATHYMETRY, timeout=0)]
+		assert r.getrecordcount() == np.count_nonzero(expected['recordidentifier'] == pygsf.SWATH_BATHYMETRY)
+		pings[-1].read(headeronly=True)
+		assert r.ping(-1).time == pings[-1].time
+		r.close()